@@ -0,0 +1,271 @@
+import argparse
+import email
+import email.policy
+import itertools
+import json
+import threading
+import time
+import uuid
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+from urllib.request import Request, urlopen
+
+BOT_USER = {'id': 1000000, 'is_bot': True, 'first_name': 'FakeBot', 'username': 'fake_fs_bot'}
+
+
+class FakeBotAPI:
+    def __init__(self, token, host='127.0.0.1', port=0):
+        self.token = token
+        self.condition = threading.Condition()
+        self.updates = []
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.files = {}
+        self.sent = defaultdict(list)
+        self.calls = defaultdict(int)
+        self.webhook_url = None
+        self.server = ThreadingHTTPServer((host, port), self.handler_class())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handler_class(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def handle(self):
+                try:
+                    super(Handler, self).handle()
+                except ConnectionError:
+                    pass
+
+            def do_GET(self):
+                api.handle(self)
+
+            def do_POST(self):
+                api.handle(self)
+
+        return Handler
+
+    def handle(self, request):
+        path = unquote(urlsplit(request.path).path)
+        length = int(request.headers.get('Content-Length') or 0)
+        body = request.rfile.read(length) if length else b''
+
+        file_prefix = f"/file/bot{self.token}/"
+        if path.startswith(file_prefix):
+            return self.serve_file(request, path[len(file_prefix):])
+
+        method_prefix = f"/bot{self.token}/"
+        if not path.startswith(method_prefix):
+            return self.respond(request, 404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+
+        method = path[len(method_prefix):]
+        params, files = self.parse_body(request.headers.get('Content-Type', ''), body)
+        params.update(parse_qsl(urlsplit(request.path).query))
+        with self.condition:
+            self.calls[method] += 1
+        handler = getattr(self, f"api_{method.lower()}", None)
+        if handler is None:
+            return self.respond(request, 200, {'ok': True, 'result': True})
+        try:
+            result = handler(params, files)
+        except KeyError as e:
+            return self.respond(request, 400, {'ok': False, 'error_code': 400, 'description': f"Bad Request: {e}"})
+        self.respond(request, 200, {'ok': True, 'result': result})
+
+    def respond(self, request, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+    def serve_file(self, request, file_path):
+        data = self.files.get(file_path.rsplit('/', 1)[-1], {}).get('data')
+        if data is None:
+            request.send_response(404)
+            request.send_header('Content-Length', '0')
+            request.end_headers()
+            return
+        start = 0
+        range_header = request.headers.get('Range')
+        if range_header and range_header.startswith('bytes='):
+            start = int(range_header[6:].split('-')[0] or 0)
+        request.send_response(206 if start else 200)
+        request.send_header('Content-Length', str(len(data) - start))
+        request.end_headers()
+        request.wfile.write(data[start:])
+
+    def parse_body(self, content_type, body):
+        if not body:
+            return {}, {}
+        if content_type.startswith('application/json'):
+            return json.loads(body), {}
+        if content_type.startswith('multipart/form-data'):
+            message = email.message_from_bytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body,
+                                               policy=email.policy.HTTP)
+            params = {}
+            files = {}
+            for part in message.iter_parts():
+                name = part.get_param('name', header='content-disposition')
+                filename = part.get_filename()
+                payload = part.get_payload(decode=True)
+                if filename is not None:
+                    files[name] = (filename, payload)
+                else:
+                    params[name] = payload.decode('utf-8')
+            return params, files
+        return dict(parse_qsl(body.decode('utf-8'))), {}
+
+    def store_file(self, filename, data):
+        file_id = uuid.uuid4().hex
+        document = {'file_id': file_id, 'file_unique_id': file_id[:16], 'file_name': filename, 'file_size': len(data)}
+        self.files[file_id] = dict(document, data=data)
+        return document
+
+    def bot_message(self, chat_id, method, **fields):
+        message = {
+            'message_id': next(self.message_ids),
+            'date': int(time.time()),
+            'chat': {'id': int(chat_id), 'type': 'private'},
+            'from': BOT_USER,
+        }
+        message.update(fields)
+        with self.condition:
+            self.sent[int(chat_id)].append((time.monotonic(), method, message))
+            self.condition.notify_all()
+        return message
+
+    def document_field(self, params, files, name):
+        value = params.get(name)
+        if name in files:
+            return self.store_file(*files[name])
+        if isinstance(value, str) and value.startswith('attach://'):
+            return self.store_file(*files[value[len('attach://'):]])
+        stored = self.files[value]
+        return {key: stored[key] for key in ('file_id', 'file_unique_id', 'file_name', 'file_size')}
+
+    def api_getme(self, params, files):
+        return BOT_USER
+
+    def api_getupdates(self, params, files):
+        offset = int(params.get('offset') or 0)
+        deadline = time.monotonic() + float(params.get('timeout') or 0)
+        with self.condition:
+            self.updates = [update for update in self.updates if update['update_id'] >= offset]
+            while not self.updates and time.monotonic() < deadline:
+                self.condition.wait(deadline - time.monotonic())
+            return list(self.updates[:int(params.get('limit') or 100)])
+
+    def api_setwebhook(self, params, files):
+        self.webhook_url = params.get('url') or None
+        return True
+
+    def api_deletewebhook(self, params, files):
+        self.webhook_url = None
+        return True
+
+    def api_sendmessage(self, params, files):
+        return self.bot_message(params['chat_id'], 'sendMessage', text=params['text'])
+
+    def api_editmessagetext(self, params, files):
+        return self.bot_message(params['chat_id'], 'editMessageText', text=params['text'])
+
+    def api_senddocument(self, params, files):
+        return self.bot_message(params['chat_id'], 'sendDocument',
+                                document=self.document_field(params, files, 'document'),
+                                caption=params.get('caption'))
+
+    def api_sendmediagroup(self, params, files):
+        media = json.loads(params['media']) if isinstance(params['media'], str) else params['media']
+        return [self.bot_message(params['chat_id'], 'sendMediaGroup',
+                                 document=self.document_field(item, files, 'media'))
+                for item in media]
+
+    def api_getfile(self, params, files):
+        stored = self.files[params['file_id']]
+        return {'file_id': stored['file_id'], 'file_unique_id': stored['file_unique_id'],
+                'file_size': stored['file_size'], 'file_path': f"documents/{stored['file_id']}"}
+
+    def push(self, message):
+        update = {'update_id': next(self.update_ids), 'message': message}
+        if self.webhook_url:
+            request = Request(self.webhook_url, data=json.dumps(update).encode('utf-8'),
+                              headers={'Content-Type': 'application/json'})
+            threading.Thread(target=lambda: urlopen(request, timeout=10).close(), daemon=True).start()
+            return update
+        with self.condition:
+            self.updates.append(update)
+            self.condition.notify_all()
+        return update
+
+    def user_message(self, chat_id, text=None, document=None):
+        message = {
+            'message_id': next(self.message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private', 'first_name': f"user{chat_id}"},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': f"user{chat_id}"},
+        }
+        if text is not None:
+            message['text'] = text
+            if text.startswith('/'):
+                message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        if document is not None:
+            message['document'] = self.store_file(*document)
+        return self.push(message)
+
+    def mark(self, chat_id):
+        with self.condition:
+            return len(self.sent[chat_id])
+
+    def wait_for(self, chat_id, since, predicate, timeout):
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                for sent_at, method, message in self.sent[chat_id][since:]:
+                    if predicate(method, message):
+                        return sent_at, method, message
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the Telegram Bot API')
+    parser.add_argument('--token', default='123456:fake')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    args = parser.parse_args()
+
+    api = FakeBotAPI(args.token, args.host, args.port)
+    print(f"Fake Bot API listening on {api.base_url} (BOT_API_BASE_URL={api.base_url}, TOKEN={args.token})")
+    try:
+        api.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN = '123456:fake'
+DEFAULT_MIX = 'save=3,ls=4,get=3,cp=1,archget=1'
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(COMMANDS)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown commands: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def prepare_tree(workdir, chats, file_size):
+    mount_point = os.path.join(workdir, 'mount')
+    archives = os.path.join(workdir, 'archives')
+    os.makedirs(mount_point)
+    os.makedirs(archives)
+    payload = os.urandom(file_size)
+    for chat_id in chats:
+        directory = os.path.join(mount_point, f"chat{chat_id}")
+        os.makedirs(directory)
+        for i in range(5):
+            with open(os.path.join(directory, f"file{i}.bin"), 'wb') as f:
+                f.write(payload)
+
+    sample = os.path.join(workdir, 'sample.txt')
+    with open(sample, 'wb') as f:
+        f.write(payload)
+    with tarfile.open(os.path.join(archives, 'sample.tar'), 'w') as tar:
+        tar.add(sample, arcname='sample.txt')
+    with zipfile.ZipFile(os.path.join(archives, 'sample.zip'), 'w') as archive:
+        archive.write(sample, 'sample.txt')
+    return mount_point, archives
+
+
+def has_text(*fragments):
+    def predicate(method, message):
+        return method == 'sendMessage' and any(fragment in message.get('text', '') for fragment in fragments)
+    return predicate
+
+
+def is_error(method, message):
+    return 'Ошибка' in (message.get('text') or '') or 'Не найдены' in (message.get('text') or '')
+
+
+def run_save(api, chat_id, step, timeout, context):
+    since = api.mark(chat_id)
+    api.user_message(chat_id, f"/save chat{chat_id}")
+    if api.wait_for(chat_id, since, has_text('Отправьте файл', 'Ошибка'), timeout) is None:
+        return None
+    since = api.mark(chat_id)
+    api.user_message(chat_id, document=(f"upload{step}.bin", context['payload']))
+    return since, has_text('сохранен', 'Ошибка', 'уже существует')
+
+
+def run_ls(api, chat_id, step, timeout, context):
+    since = api.mark(chat_id)
+    api.user_message(chat_id, f"/ls /chat{chat_id}")
+    return since, lambda method, message: method == 'sendMessage'
+
+
+def run_get(api, chat_id, step, timeout, context):
+    since = api.mark(chat_id)
+    api.user_message(chat_id, f"/get chat{chat_id}/file{step % 5}.bin")
+    return since, lambda method, message: method == 'sendDocument' or is_error(method, message)
+
+
+def run_cp(api, chat_id, step, timeout, context):
+    since = api.mark(chat_id)
+    api.user_message(chat_id, f"/cp chat{chat_id}/file{step % 5}.bin chat{chat_id}/copies")
+    return since, has_text('скопирован', 'Ошибка')
+
+
+def run_archget(api, chat_id, step, timeout, context):
+    since = api.mark(chat_id)
+    api.user_message(chat_id, f"/archget {context['archives']}")
+    return since, has_text('Директория:', 'Ошибка')
+
+
+COMMANDS = {
+    'save': run_save,
+    'ls': run_ls,
+    'get': run_get,
+    'cp': run_cp,
+    'archget': run_archget,
+}
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.timeouts = defaultdict(int)
+
+    def add(self, command, latency=None, error=False):
+        with self.lock:
+            if latency is None:
+                self.timeouts[command] += 1
+            elif error:
+                self.errors[command] += 1
+            else:
+                self.latencies[command].append(latency)
+
+    def report(self, elapsed):
+        commands = {}
+        for command in sorted(set(self.latencies) | set(self.errors) | set(self.timeouts)):
+            latencies = self.latencies[command]
+            total = len(latencies) + self.errors[command] + self.timeouts[command]
+            commands[command] = {
+                'count': total,
+                'ok': len(latencies),
+                'errors': self.errors[command],
+                'timeouts': self.timeouts[command],
+                'error_rate': (total - len(latencies)) / total if total else 0,
+                'throughput': len(latencies) / elapsed if elapsed else 0,
+                'p50': percentile(latencies, 0.5),
+                'p99': percentile(latencies, 0.99),
+            }
+        ok = sum(item['ok'] for item in commands.values())
+        total = sum(item['count'] for item in commands.values())
+        latencies = [latency for values in self.latencies.values() for latency in values]
+        return {
+            'elapsed': elapsed,
+            'completed': ok,
+            'throughput': ok / elapsed if elapsed else 0,
+            'error_rate': (total - ok) / total if total else 0,
+            'p50': percentile(latencies, 0.5),
+            'p99': percentile(latencies, 0.99),
+            'commands': commands,
+        }
+
+
+def simulate_chat(api, chat_id, args, mix, results, context):
+    rng = random.Random(args.seed + chat_id)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    for step in range(args.commands):
+        command = rng.choices(names, weights)[0]
+        started = time.monotonic()
+        pending = COMMANDS[command](api, chat_id, step, args.timeout, context)
+        if pending is None:
+            results.add(command)
+            continue
+        since, predicate = pending
+        reply = api.wait_for(chat_id, since, predicate, args.timeout)
+        if reply is None:
+            results.add(command)
+            continue
+        sent_at, method, message = reply
+        results.add(command, sent_at - started, error=is_error(method, message))
+        if args.think:
+            time.sleep(rng.uniform(0, args.think))
+
+
+def print_report(report, args):
+    print(f"{args.chats} chats x {args.commands} commands, {args.mode} mode, {report['elapsed']:.2f}s")
+    print(f"{'command':<10}{'count':>7}{'ok':>7}{'err%':>7}{'cmd/s':>8}{'p50 ms':>9}{'p99 ms':>9}")
+    for command, item in report['commands'].items():
+        p50 = f"{item['p50'] * 1000:.0f}" if item['p50'] is not None else '-'
+        p99 = f"{item['p99'] * 1000:.0f}" if item['p99'] is not None else '-'
+        print(f"{command:<10}{item['count']:>7}{item['ok']:>7}{item['error_rate'] * 100:>7.1f}"
+              f"{item['throughput']:>8.2f}{p50:>9}{p99:>9}")
+    print(f"total: {report['completed']} ok, {report['throughput']:.2f} cmd/s, "
+          f"error rate {report['error_rate'] * 100:.1f}%", end='')
+    if report['p50'] is not None:
+        print(f", p50 {report['p50'] * 1000:.0f} ms, p99 {report['p99'] * 1000:.0f} ms", end='')
+    print()
+    print(f"\n{'handler':<18}{'count':>7}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for command, item in sorted(report['handlers'].items()):
+        print(f"{command:<18}{item['count']:>7}{item['p50'] * 1000:>9.1f}{item['p99'] * 1000:>9.1f}"
+              f"{item['max'] * 1000:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end load test against a local fake Bot API')
+    parser.add_argument('--chats', type=int, default=10)
+    parser.add_argument('--commands', type=int, default=20, help='commands issued by every chat')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help=f"command weights, default {DEFAULT_MIX}")
+    parser.add_argument('--mode', choices=('polling', 'webhook'), default='polling')
+    parser.add_argument('--file-size', type=int, default=64 * 1024)
+    parser.add_argument('--timeout', type=float, default=60, help='seconds to wait for a reply')
+    parser.add_argument('--think', type=float, default=0, help='max pause between commands of one chat')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--keep', action='store_true', help='keep the temporary mount for inspection')
+    args = parser.parse_args()
+
+    sys.path[:0] = [ROOT, os.path.join(ROOT, 'bot')]
+    from bench.fake_bot_api import FakeBotAPI
+
+    api = FakeBotAPI(TOKEN).start()
+    workdir = tempfile.mkdtemp(prefix='fsbot-load-')
+    chats = list(range(1, args.chats + 1))
+    mount_point, archives = prepare_tree(workdir, chats, args.file_size)
+    os.environ.update({
+        'TOKEN': TOKEN,
+        'BOT_API_BASE_URL': api.base_url,
+        'MOUNT_POINT': mount_point,
+        'STORAGE_PATH': os.path.join(workdir, 'storage.json'),
+        'BACKUP_FILE': os.path.join(workdir, 'backup.json'),
+        'CUSTOM_STORAGE_PATH': os.path.join(workdir, 'custom_storage.json'),
+        'CUSTOM_BACKUP_FILE': os.path.join(workdir, 'custom_backup.json'),
+    })
+
+    from bot.__main__ import create_updater
+    from bot.jobs import drain_jobs
+    from bot.outbound import drain_outbound
+    from bot.metrics import command_stats
+    from bot.persistence import flush_metadata
+
+    updater = create_updater()
+    if args.mode == 'webhook':
+        port = free_port()
+        updater.start_webhook(listen='127.0.0.1', port=port, url_path=TOKEN,
+                              webhook_url=f"http://127.0.0.1:{port}/{TOKEN}")
+    else:
+        updater.start_polling(poll_interval=0, timeout=10)
+
+    results = Results()
+    context = {'archives': archives, 'payload': os.urandom(args.file_size)}
+    threads = [threading.Thread(target=simulate_chat, args=(api, chat_id, args, args.mix, results, context))
+               for chat_id in chats]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    updater.stop()
+    drain_jobs(args.timeout)
+    drain_outbound(args.timeout)
+    flush_metadata()
+    api.stop()
+    if not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = results.report(elapsed)
+    report.update(mode=args.mode, chats=args.chats, commands_per_chat=args.commands, handlers=command_stats(),
+                  api_calls=dict(api.calls))
+    print_report(report, args)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,411 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SCALES = '1000,10000,100000'
+FILES_PER_DIR = 100
+DIRS_PER_GROUP = 10
+MP3_FRAME = b'\xff\xfb\x90\x64' + b'\x00' * 413
+ARTISTS = [f"artist{i:02d}" for i in range(50)]
+GENRES = ['rock', 'jazz', 'pop', 'metal', 'folk', 'blues', 'punk', 'soul', 'house', 'ambient']
+
+
+class FakeChat:
+    def __init__(self, chat_id):
+        self.id = chat_id
+        self.type = 'private'
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.username = f"user{user_id}"
+
+
+class FakeBot:
+    username = 'bench_bot'
+
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(('message', chat_id, len(text)))
+
+    def send_document(self, chat_id, document, **kwargs):
+        self.sent.append(('document', chat_id, kwargs.get('filename')))
+
+
+class FakeMessage:
+    def __init__(self, bot, text, chat_id=1, user_id=1):
+        self.bot = bot
+        self.text = text
+        self.chat = FakeChat(chat_id)
+        self.chat_id = chat_id
+        self.from_user = FakeUser(user_id)
+        self.message_id = 1
+        self.media_group_id = None
+        self.document = None
+        self.replies = []
+
+    def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+    def reply_document(self, document, **kwargs):
+        self.replies.append(kwargs.get('filename') or getattr(document, 'name', None))
+
+
+class FakeUpdate:
+    def __init__(self, message):
+        self.message = message
+        self.effective_message = message
+        self.effective_chat = message.chat
+        self.effective_user = message.from_user
+        self.callback_query = None
+
+
+class FakeContext:
+    def __init__(self, bot):
+        self.bot = bot
+        self.user_data = {}
+        self.chat_data = {}
+        self.bot_data = {}
+
+
+def command(text):
+    bot = FakeBot()
+    return FakeUpdate(FakeMessage(bot, text)), FakeContext(bot)
+
+
+class Fixtures:
+    def __init__(self, workdir, seed):
+        self.workdir = workdir
+        self.seed = seed
+        self.built = {}
+
+    def get(self, kind, scale):
+        key = (kind, scale)
+        if key not in self.built:
+            path = os.path.join(self.workdir, 'fixtures', f"{kind}-{scale}")
+            started = time.perf_counter()
+            getattr(self, f"make_{kind}")(path, scale, random.Random(f"{self.seed}:{kind}:{scale}"))
+            print(f"  built {kind} x{scale} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+            self.built[key] = path
+        return self.built[key]
+
+    def make_tree(self, path, scale, rng):
+        for i in range(scale):
+            directory = os.path.join(path, f"group{i // (FILES_PER_DIR * DIRS_PER_GROUP):03d}",
+                                     f"dir{(i // FILES_PER_DIR) % DIRS_PER_GROUP}")
+            if i % FILES_PER_DIR == 0:
+                os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, f"file{i:06d}.txt"), 'wb') as f:
+                f.write(rng.randbytes(rng.randint(0, 2048)))
+
+    def make_zip(self, path, scale, rng):
+        os.makedirs(path)
+        with zipfile.ZipFile(os.path.join(path, 'archive.zip'), 'w') as archive:
+            for i in range(scale):
+                archive.writestr(f"dir{i // FILES_PER_DIR}/file{i:06d}.txt", rng.randbytes(rng.randint(0, 512)))
+
+    def make_tar(self, path, scale, rng):
+        tree = self.get('tree', scale)
+        os.makedirs(path)
+        with tarfile.open(os.path.join(path, 'archive.tar'), 'w') as archive:
+            archive.add(tree, arcname='')
+
+    def make_mp3(self, path, scale, rng):
+        from mutagen.easyid3 import EasyID3
+
+        os.makedirs(path)
+        for i in range(scale):
+            file_path = os.path.join(path, f"track{i:06d}.mp3")
+            with open(file_path, 'wb') as f:
+                f.write(MP3_FRAME * 4)
+            if i % 20 == 0:
+                continue
+            tags = EasyID3()
+            tags['artist'] = rng.choice(ARTISTS)
+            tags['genre'] = rng.choice(GENRES)
+            tags['date'] = str(rng.randint(1970, 2020))
+            tags.save(file_path)
+
+    def make_png(self, path, scale, rng):
+        from PIL import Image
+
+        os.makedirs(path)
+        for i in range(max(1, scale // 100)):
+            image = Image.frombytes('RGB', (256, 256), rng.randbytes(256 * 256 * 3))
+            image.save(os.path.join(path, f"image{i:04d}.png"))
+
+
+def run_dir(workdir):
+    return tempfile.mkdtemp(prefix='run-', dir=workdir)
+
+
+def bench_ls(fixtures, scale):
+    from bot import listing, telegram_bot
+    import config
+
+    tree = fixtures.get('tree', scale)
+
+    def setup():
+        config.MOUNT_POINT = tree
+        listing.cache.clear()
+        return command('/ls')
+
+    def run(state):
+        telegram_bot.list_files(*state)
+
+    return setup, run, None
+
+
+def bench_trls(fixtures, scale):
+    from bot import listing, telegram_bot
+    import config
+
+    tree = fixtures.get('tree', scale)
+
+    def setup():
+        config.MOUNT_POINT = tree
+        listing.cache.clear()
+        return command('/trls')
+
+    def run(state):
+        telegram_bot.tree_list_files(*state)
+
+    return setup, run, None
+
+
+def bench_tree(fixtures, scale):
+    from bot import listing, telegram_bot
+
+    tree = fixtures.get('tree', scale)
+
+    def setup():
+        listing.cache.clear()
+        return tree
+
+    return setup, telegram_bot.tree, None
+
+
+def bench_collect_metadata(fixtures, scale):
+    from bot.collect_metadata import collect_metadata
+
+    tree = fixtures.get('tree', scale)
+    return lambda: tree, collect_metadata, None
+
+
+def bench_save_metadata_to_storage(fixtures, scale):
+    from bot.collect_metadata import save_metadata_to_storage
+
+    tree = fixtures.get('tree', scale)
+
+    def setup():
+        directory = run_dir(fixtures.workdir)
+        return directory, os.path.join(directory, 'storage.json'), os.path.join(directory, 'data.json')
+
+    def run(state):
+        save_metadata_to_storage(tree, *state[1:])
+
+    return setup, run, lambda state: shutil.rmtree(state[0])
+
+
+def bench_copy_path_with_suffix(fixtures, scale):
+    from bot.telegram_bot import copy_path_with_suffix
+
+    tree = fixtures.get('tree', scale)
+
+    def setup():
+        return run_dir(fixtures.workdir)
+
+    def run(directory):
+        copy_path_with_suffix(tree, directory)
+
+    return setup, run, shutil.rmtree
+
+
+def archive_bench(kind):
+    def bench(fixtures, scale):
+        from bot.archivator import delete_file_from_archive
+
+        source = os.path.join(fixtures.get(kind, scale), f"archive.{kind}")
+
+        def setup():
+            directory = run_dir(fixtures.workdir)
+            shutil.copy(source, directory)
+            return directory
+
+        def run(directory):
+            delete_file_from_archive(os.path.join(directory, f"archive.{kind}"), 'file000000.txt')
+
+        return setup, run, shutil.rmtree
+
+    return bench
+
+
+def bench_group_mp3_files(fixtures, scale):
+    from bot.telegram_bot import group_mp3_files
+
+    source = fixtures.get('mp3', scale)
+
+    def setup():
+        return run_dir(fixtures.workdir)
+
+    def run(directory):
+        group_mp3_files(source, directory)
+
+    return setup, run, shutil.rmtree
+
+
+def bench_convert_png_to_jpg(fixtures, scale):
+    from bot.converter import convert_png_to_jpg
+
+    source = fixtures.get('png', scale)
+    paths = sorted(os.path.join(source, name) for name in os.listdir(source) if name.endswith('.png'))
+
+    def run(paths):
+        for path in paths:
+            convert_png_to_jpg(path)
+
+    def teardown(paths):
+        for path in paths:
+            os.remove(path[:-3] + 'jpg')
+
+    return lambda: paths, run, teardown
+
+
+BENCHMARKS = {
+    'ls': bench_ls,
+    'trls': bench_trls,
+    'tree': bench_tree,
+    'collect_metadata': bench_collect_metadata,
+    'save_metadata_to_storage': bench_save_metadata_to_storage,
+    'copy_path_with_suffix': bench_copy_path_with_suffix,
+    'delete_file_from_archive[zip]': archive_bench('zip'),
+    'delete_file_from_archive[tar]': archive_bench('tar'),
+    'group_mp3_files': bench_group_mp3_files,
+    'convert_png_to_jpg': bench_convert_png_to_jpg,
+}
+
+
+def measure(setup, run, teardown, repeat):
+    timings = []
+    for _ in range(repeat):
+        state = setup()
+        started = time.perf_counter()
+        run(state)
+        timings.append(time.perf_counter() - started)
+        if teardown is not None:
+            teardown(state)
+
+    state = setup()
+    tracemalloc.start()
+    try:
+        run(state)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        if teardown is not None:
+            teardown(state)
+    return {
+        'runs': repeat,
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.mean(timings),
+        'peak_memory': peak,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path) as f:
+        baseline = {(item['name'], item['scale']): item for item in json.load(f)['results']}
+    regressions = 0
+    print(f"\ncompared with {baseline_path}:")
+    for item in results:
+        old = baseline.get((item['name'], item['scale']))
+        if old is None:
+            continue
+        ratio = item['median'] / old['median'] if old['median'] else float('inf')
+        memory_ratio = item['peak_memory'] / old['peak_memory'] if old['peak_memory'] else 1
+        flag = ''
+        if ratio > 1 + threshold or memory_ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"{item['name']:<32}{item['scale']:>8}  time x{ratio:.2f}  memory x{memory_ratio:.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmarks for handlers and helpers on synthetic trees')
+    parser.add_argument('--scales', default=DEFAULT_SCALES, help=f"file counts, default {DEFAULT_SCALES}")
+    parser.add_argument('--only', action='append', choices=sorted(BENCHMARKS), help='run only these benchmarks')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workdir', help='reuse generated fixtures from this directory')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='baseline JSON from an earlier run')
+    parser.add_argument('--threshold', type=float, default=0.1, help='allowed slowdown before flagging, default 0.1')
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='fsbot-micro-')
+    os.makedirs(workdir, exist_ok=True)
+    os.environ.update({
+        'TOKEN': '123456:bench',
+        'MOUNT_POINT': os.path.join(workdir, 'mount'),
+        'STORAGE_PATH': os.path.join(workdir, 'storage.json'),
+        'BACKUP_FILE': os.path.join(workdir, 'backup.json'),
+        'CUSTOM_STORAGE_PATH': os.path.join(workdir, 'custom_storage.json'),
+        'CUSTOM_BACKUP_FILE': os.path.join(workdir, 'custom_backup.json'),
+    })
+    sys.path[:0] = [ROOT, os.path.join(ROOT, 'bot')]
+
+    fixtures = Fixtures(workdir, args.seed)
+    results = []
+    try:
+        for scale in [int(value) for value in args.scales.split(',')]:
+            for name in args.only or BENCHMARKS:
+                setup, run, teardown = BENCHMARKS[name](fixtures, scale)
+                result = dict(name=name, scale=scale, **measure(setup, run, teardown, args.repeat))
+                results.append(result)
+                print(f"{name:<32}{scale:>8}  median {result['median'] * 1000:>10.1f} ms  "
+                      f"min {result['min'] * 1000:>10.1f} ms  peak {result['peak_memory'] / 1024:>10.0f} KiB")
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN = '123456:fake'
+CHAT_ID = 1
+LAZY_MODULES = ('PIL', 'mutagen', 'yaml')
+
+
+def child():
+    sys.path[:0] = [ROOT, os.path.join(ROOT, 'bot')]
+    started = time.perf_counter()
+    import bot.__main__
+    imported = time.perf_counter()
+    updater = bot.__main__.create_updater()
+    created = time.perf_counter()
+    updater.start_polling(poll_interval=0, timeout=10)
+    print(json.dumps({
+        'import': imported - started,
+        'create_updater': created - imported,
+        'loaded': [name for name in LAZY_MODULES if name in sys.modules],
+    }), flush=True)
+    updater.idle()
+
+
+def run_once(api, workdir, timeout):
+    since = api.mark(CHAT_ID)
+    api.user_message(CHAT_ID, '/help')
+    env = dict(os.environ, TOKEN=TOKEN, BOT_API_BASE_URL=api.base_url, MOUNT_POINT=workdir,
+               STORAGE_PATH=os.path.join(workdir, 'storage.json'), BACKUP_FILE=os.path.join(workdir, 'backup.json'),
+               LOG_FILE=os.path.join(workdir, 'logfile.log'), METRICS_FILE='', METRICS_PORT='0')
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-m', 'bench.startup', '--child'], cwd=ROOT, env=env,
+                               stdout=subprocess.PIPE, text=True)
+    try:
+        reply = api.wait_for(CHAT_ID, since, lambda method, message: method == 'sendMessage', timeout)
+        first_update = time.perf_counter() - started
+        result = json.loads(process.stdout.readline() or '{}')
+    finally:
+        process.kill()
+        process.wait()
+    if reply is None:
+        raise RuntimeError(f"no reply to /help within {timeout}s")
+    result['first_update'] = first_update
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure bot import time and time-to-first-update')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+
+    sys.path.insert(0, ROOT)
+    from bench.fake_bot_api import FakeBotAPI
+
+    api = FakeBotAPI(TOKEN).start()
+    workdir = tempfile.mkdtemp(prefix='fsbot-startup-')
+    try:
+        runs = [run_once(api, workdir, args.timeout) for _ in range(args.runs)]
+    finally:
+        api.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {key: statistics.median(run[key] for run in runs) for key in ('import', 'create_updater', 'first_update')}
+    report.update(runs=len(runs), loaded=runs[-1]['loaded'])
+    print(f"{len(runs)} runs, median")
+    print(f"  import bot:        {report['import'] * 1000:8.1f} ms")
+    print(f"  create_updater:    {report['create_updater'] * 1000:8.1f} ms")
+    print(f"  first update:      {report['first_update'] * 1000:8.1f} ms")
+    print(f"  heavy modules loaded at startup: {', '.join(report['loaded']) or 'none'}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
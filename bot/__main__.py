@@ -2,39 +2,62 @@ import threading
 import signal
 import sys
 
-from telegram import Bot, MessageEntity
-from telegram.ext import Updater, MessageHandler, Filters, ConversationHandler, CommandHandler
+from telegram import MessageEntity
+from telegram.ext import Updater, ExtBot, MessageHandler, Filters, ConversationHandler, CommandHandler, \
+    CallbackQueryHandler
 from telegram_bot import handle_private, handle_mention, save_file_command, save_file, save_file_mention_command, \
-    handle_overwrite_response, convert_mention_command, convert_private_command, cancel, file_list, \
-    custom_save_file_command, custom_save_file_mention_command, custom_save_file
-from config import TOKEN
-from fs_utils import start_fuse, unmount_fs
+    handle_overwrite_response, convert_mention_command, convert_private_command, cancel, \
+    custom_save_file_command, custom_save_file_mention_command, custom_save_file, list_files_page, \
+    save_batch_file, finish_save_batch, cancel_save_batch
+from config import logger, TOKEN, MOUNT_POINT, STORAGE_PATH, BACKUP_FILE, UPDATER_WORKERS, WEBHOOK_URL, WEBHOOK_LISTEN, \
+    WEBHOOK_PORT, WEBHOOK_PATH, SHUTDOWN_TIMEOUT, BOT_API_BASE_URL, JOB_WORKERS, SAVE_DOWNLOAD_WORKERS
+from fs_utils import start_fuse, unmount_fs, check_mount
+from bot.downloads import download_stats
+from bot.jobs import drain_jobs, jobs_stats
+from bot.metadata_watcher import start_watcher, stop_all_watchers
+from bot.metrics import TimedRequest, timed, register_gauges, start_metrics, write_metrics
+from bot.outbound import drain_outbound, outbound_stats
+from bot.persistence import flush_metadata, persistence_stats
+from bot.sessions import serialized
+from bot.trash import recover_trash, trash_stats
+
+
+updater = None
 
 
 def signal_handler(sig, frame):
+    if updater is not None:
+        updater.stop()
+        drain_jobs(SHUTDOWN_TIMEOUT)
+        drain_outbound(SHUTDOWN_TIMEOUT)
+    stop_all_watchers()
+    flush_metadata()
+    write_metrics()
     unmount_fs()
     sys.exit(0)
 
 
-def main():
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
+def connection_pool_size():
+    return UPDATER_WORKERS + JOB_WORKERS + SAVE_DOWNLOAD_WORKERS + 3
 
-    fuse_thread = threading.Thread(target=start_fuse)
-    fuse_thread.start()
 
-    updater = Updater(TOKEN, use_context=True)
+def create_updater():
+    request = TimedRequest(con_pool_size=connection_pool_size())
+    if BOT_API_BASE_URL:
+        bot = ExtBot(TOKEN, base_url=f"{BOT_API_BASE_URL}/bot", base_file_url=f"{BOT_API_BASE_URL}/file/bot",
+                     request=request)
+    else:
+        bot = ExtBot(TOKEN, request=request)
+    updater = Updater(bot=bot, use_context=True, workers=UPDATER_WORKERS)
     dp = updater.dispatcher
-    dp.user_data['bot_username'] = "@" + Bot(TOKEN).get_me().username
-    bot_username = dp.user_data['bot_username']
-    file_list()
+    bot_username = "@" + updater.bot.username
 
     conv_handler_convert_command_private = ConversationHandler(
         entry_points=[MessageHandler(Filters.chat_type.private & Filters.regex(fr'^(/convert(?:\s+\S+)+)$'),
-                                     convert_private_command)],
+                                     timed('/convert', convert_private_command))],
         states={
             'handle_overwrite_response_private': [
-                MessageHandler(Filters.text & ~Filters.command, handle_overwrite_response)]
+                MessageHandler(Filters.text & ~Filters.command, timed('/convert:answer', handle_overwrite_response))]
         },
         fallbacks=[]
     )
@@ -42,9 +65,10 @@ def main():
     conv_handler_convert_command_mention = ConversationHandler(
         entry_points=[MessageHandler(
             Filters.entity(MessageEntity.MENTION) & Filters.regex(fr'^{bot_username}\s+(/convert(?:\s+\S+)+)$'),
-            convert_mention_command)],
+            timed('/convert', convert_mention_command))],
         states={
-            'handle_overwrite_response_mention': [MessageHandler(~Filters.command, handle_overwrite_response)]
+            'handle_overwrite_response_mention': [
+                MessageHandler(~Filters.command, timed('/convert:answer', handle_overwrite_response))]
         },
         fallbacks=[]
     )
@@ -52,13 +76,21 @@ def main():
     conv_handler_save_file_mention = ConversationHandler(
         entry_points=[MessageHandler(
             Filters.entity(MessageEntity.MENTION) & Filters.regex(fr'^{bot_username}\s+(/save|(/save(?:\s+\S+)+))$'),
-            save_file_mention_command)],
+            timed('/save', save_file_mention_command))],
         states={
             'waiting_for_file_mention': [
                 MessageHandler(Filters.regex(
                     fr'^({bot_username}\s+/cancel_save|/cancel_save{bot_username}|/cancel_save\s+{bot_username})$'),
-                    cancel),
-                MessageHandler(~Filters.command, save_file)
+                    timed('/cancel_save', cancel)),
+                MessageHandler(~Filters.command, timed('/save:file', save_file))
+            ],
+            'waiting_for_files_mention': [
+                MessageHandler(Filters.regex(
+                    fr'^({bot_username}\s+/cancel_save|/cancel_save{bot_username}|/cancel_save\s+{bot_username})$'),
+                    timed('/cancel_save', cancel_save_batch)),
+                MessageHandler(Filters.regex(fr'^({bot_username}\s+/done|/done{bot_username}|/done\s+{bot_username})$'),
+                               timed('/done', finish_save_batch)),
+                MessageHandler(~Filters.command, timed('/save:batch_file', save_batch_file))
             ]
         },
         fallbacks=[]
@@ -66,11 +98,16 @@ def main():
 
     conv_handler_save_file_private = ConversationHandler(
         entry_points=[MessageHandler(Filters.chat_type.private & Filters.regex(fr'^(/save|(/save(?:\s+\S+)+))$'),
-                                     save_file_command)],
+                                     timed('/save', save_file_command))],
         states={
             'waiting_for_file_private': [
-                CommandHandler('cancel_save', cancel),
-                MessageHandler(~Filters.command, save_file)
+                CommandHandler('cancel_save', timed('/cancel_save', cancel)),
+                MessageHandler(~Filters.command, timed('/save:file', save_file))
+            ],
+            'waiting_for_files_private': [
+                CommandHandler('cancel_save', timed('/cancel_save', cancel_save_batch)),
+                CommandHandler('done', timed('/done', finish_save_batch)),
+                MessageHandler(~Filters.command, timed('/save:batch_file', save_batch_file))
             ]
         },
         fallbacks=[]
@@ -79,13 +116,13 @@ def main():
     conv_handler_custom_save_file_mention = ConversationHandler(
         entry_points=[MessageHandler(
             Filters.entity(MessageEntity.MENTION) & Filters.regex(fr'^{bot_username}\s+(/c_save|(/c_save(?:\s+\S+)+))$'),
-            custom_save_file_mention_command)],
+            timed('/c_save', custom_save_file_mention_command))],
         states={
             'custom_waiting_for_file_mention': [
                 MessageHandler(Filters.regex(
                     fr'^({bot_username}\s+/cancel_save|/cancel_save{bot_username}|/cancel_save\s+{bot_username})$'),
-                    cancel),
-                MessageHandler(~Filters.command, custom_save_file)
+                    timed('/cancel_save', cancel)),
+                MessageHandler(~Filters.command, timed('/c_save:file', custom_save_file))
             ]
         },
         fallbacks=[]
@@ -93,11 +130,11 @@ def main():
 
     conv_handler_custom_save_file_private = ConversationHandler(
         entry_points=[MessageHandler(Filters.chat_type.private & Filters.regex(fr'^(/c_save|(/c_save(?:\s+\S+)+))$'),
-                                     custom_save_file_command)],
+                                     timed('/c_save', custom_save_file_command))],
         states={
             'custom_waiting_for_file_private': [
-                CommandHandler('cancel_save', cancel),
-                MessageHandler(~Filters.command, custom_save_file)
+                CommandHandler('cancel_save', timed('/cancel_save', cancel)),
+                MessageHandler(~Filters.command, timed('/c_save:file', custom_save_file))
             ]
         },
         fallbacks=[]
@@ -113,11 +150,42 @@ def main():
     dp.add_handler(conv_handler_custom_save_file_mention)
     dp.add_handler(conv_handler_custom_save_file_private)
 
-    dp.add_handler(MessageHandler(Filters.command & Filters.chat_type.private, handle_private))
-    dp.add_handler(MessageHandler(Filters.entity(MessageEntity.MENTION), handle_mention))
+    dp.add_handler(MessageHandler(Filters.command & Filters.chat_type.private, serialized(handle_private),
+                                  run_async=True))
+    dp.add_handler(MessageHandler(Filters.entity(MessageEntity.MENTION), serialized(handle_mention), run_async=True))
+    dp.add_handler(CallbackQueryHandler(serialized(timed('/ls:page', list_files_page)), pattern=r'^ls:',
+                                        run_async=True))
 
-    updater.start_polling()
-    updater.idle()
+    return updater
+
+
+def main():
+    global updater
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    fuse_thread = threading.Thread(target=start_fuse)
+    fuse_thread.start()
+    start_watcher(MOUNT_POINT, STORAGE_PATH, BACKUP_FILE, wait_for=check_mount)
+    recover_trash(MOUNT_POINT, wait_for=check_mount)
+
+    updater = create_updater()
+    register_gauges('jobs', lambda: {key: sum(stats[key] for stats in jobs_stats().values())
+                                     for key in ('queued', 'running')})
+    register_gauges('outbound', outbound_stats, counters=('sent', 'retries', 'errors'))
+    register_gauges('persistence', persistence_stats, counters=('requests', 'saves'))
+    register_gauges('downloads', download_stats, counters=('downloads', 'failures', 'retries', 'bytes'))
+    register_gauges('trash', trash_stats, counters=('reaped', 'reclaimed_bytes'))
+    start_metrics()
+    if WEBHOOK_URL:
+        url_path = WEBHOOK_PATH or TOKEN
+        updater.start_webhook(listen=WEBHOOK_LISTEN, port=WEBHOOK_PORT, url_path=url_path,
+                              webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{url_path}")
+        logger.info(f"Listening for webhook updates on {WEBHOOK_LISTEN}:{WEBHOOK_PORT}")
+    else:
+        updater.start_polling()
+    updater.idle(stop_signals=())
 
     fuse_thread.join()
 
@@ -0,0 +1,162 @@
+import gzip
+import io
+import lzma
+import os
+import tarfile
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from config import TRASH_DIR
+
+BLOCK_SIZE = 4 * 1024 * 1024
+FORMATS = {
+    'tar': '.tar',
+    'gz': '.tar.gz',
+    'xz': '.tar.xz',
+    'zip': '.zip',
+}
+
+
+def compress_gzip(block):
+    return gzip.compress(block, compresslevel=6, mtime=0)
+
+
+def compress_xz(block):
+    return lzma.compress(block, preset=6)
+
+
+class PartWriter(io.RawIOBase):
+    def __init__(self, part_size, send_part):
+        super(PartWriter, self).__init__()
+        self.part_size = part_size
+        self.send_part = send_part
+        self.buffer = bytearray()
+        self.parts = 0
+        self.written = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        self.written += len(data)
+        while len(self.buffer) > self.part_size:
+            self.parts += 1
+            self.send_part(self.parts, bytes(self.buffer[:self.part_size]), False)
+            del self.buffer[:self.part_size]
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            if self.buffer or not self.parts:
+                self.parts += 1
+                self.send_part(self.parts, bytes(self.buffer), True)
+                self.buffer = bytearray()
+        super(PartWriter, self).close()
+
+
+class BlockCompressor(io.RawIOBase):
+    def __init__(self, output, compress, workers):
+        super(BlockCompressor, self).__init__()
+        self.output = output
+        self.compress = compress
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='compress')
+        self.pending = deque()
+        self.block = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.block += data
+        while len(self.block) >= BLOCK_SIZE:
+            self.submit(bytes(self.block[:BLOCK_SIZE]))
+            del self.block[:BLOCK_SIZE]
+        return len(data)
+
+    def submit(self, block):
+        self.pending.append(self.executor.submit(self.compress, block))
+        while len(self.pending) > self.workers * 2:
+            self.output.write(self.pending.popleft().result())
+
+    def close(self):
+        if not self.closed:
+            try:
+                if self.block:
+                    self.submit(bytes(self.block))
+                    self.block = bytearray()
+                while self.pending:
+                    self.output.write(self.pending.popleft().result())
+            finally:
+                self.executor.shutdown()
+        super(BlockCompressor, self).close()
+
+
+def directory_signature(directory):
+    latest = os.stat(directory).st_mtime_ns
+    count = 0
+    total = 0
+    stack = [directory]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.name == TRASH_DIR:
+                    continue
+                entry_stat = entry.stat(follow_symlinks=False)
+                latest = max(latest, entry_stat.st_mtime_ns)
+                count += 1
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    total += entry_stat.st_size
+    return f"{latest}:{count}:{total}"
+
+
+def write_archive(directory, archive_format, output, workers, progress=None):
+    added = 0
+
+    def track(name):
+        nonlocal added
+        added += 1
+        if progress is not None:
+            progress(added, name)
+
+    if archive_format == 'zip':
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+            base = os.path.dirname(directory)
+            for root, dirs, files in os.walk(directory):
+                dirs[:] = sorted(name for name in dirs if name != TRASH_DIR)
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    track(name)
+                    archive.write(path, os.path.relpath(path, base))
+        return
+
+    stream = output
+    if archive_format == 'gz':
+        stream = BlockCompressor(output, compress_gzip, workers)
+    elif archive_format == 'xz':
+        stream = BlockCompressor(output, compress_xz, workers)
+
+    def track_member(member):
+        if os.path.basename(member.name) == TRASH_DIR:
+            return None
+        track(member.name)
+        return member
+
+    try:
+        with tarfile.open(fileobj=stream, mode='w|') as tar:
+            tar.add(directory, arcname=os.path.basename(directory), filter=track_member)
+    finally:
+        if stream is not output:
+            stream.close()
+
+
+def write_files_archive(paths, base, output, progress=None):
+    with tarfile.open(fileobj=output, mode='w|') as tar:
+        for index, path in enumerate(paths, start=1):
+            if progress is not None:
+                progress(index, path)
+            tar.add(path, arcname=os.path.relpath(path, base))
@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import logger, SAVE_DOWNLOAD_WORKERS, STORAGE_PATH
+from bot.dedup import fetch_file
+from bot.sent_files import remember_file_id
+
+pool = None
+pool_lock = threading.Lock()
+
+
+def get_pool():
+    global pool
+    with pool_lock:
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=SAVE_DOWNLOAD_WORKERS, thread_name_prefix='save')
+        return pool
+
+
+def numbered_name(filename, counter):
+    name, ext = os.path.splitext(filename)
+    return f"{name}({counter}){ext}"
+
+
+class SaveBatch:
+    def __init__(self, bot, directory):
+        self.bot = bot
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.reserved = set()
+        self.futures = []
+        self.pending = 0
+        self.closed = False
+        self.on_complete = None
+        self.saved = []
+        self.renamed = []
+        self.failed = []
+        self.avoided = 0
+        self.started = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+
+    def reserve(self, filename):
+        candidate = filename
+        counter = 1
+        while candidate in self.reserved or os.path.exists(os.path.join(self.directory, candidate)):
+            candidate = numbered_name(filename, counter)
+            counter += 1
+        self.reserved.add(candidate)
+        return candidate
+
+    def add(self, file_id, filename, file_unique_id=None, document=False):
+        with self.lock:
+            if self.closed:
+                return None
+            saved_name = self.reserve(filename)
+            if saved_name != filename:
+                self.renamed.append((filename, saved_name))
+            self.pending += 1
+            self.futures.append(get_pool().submit(self.download, file_id, file_unique_id, saved_name, document))
+        return saved_name
+
+    def download(self, file_id, file_unique_id, filename, document):
+        local_path = os.path.join(self.directory, filename)
+        try:
+            avoided = fetch_file(self.bot, file_id, file_unique_id, local_path)
+            if document:
+                remember_file_id(STORAGE_PATH, local_path, file_id)
+            with self.lock:
+                self.saved.append(filename)
+                self.avoided += avoided
+        except Exception as e:
+            logger.error(f"Error downloading {filename} to {self.directory}: {e}")
+            with self.lock:
+                self.failed.append(filename)
+        finally:
+            self.done()
+
+    def done(self):
+        with self.lock:
+            self.pending -= 1
+            complete = self.closed and self.pending == 0
+        if complete:
+            self.complete()
+
+    def close(self, on_complete, cancel=False):
+        with self.lock:
+            self.closed = True
+            self.on_complete = on_complete
+            if cancel:
+                for future in self.futures:
+                    if future.cancel():
+                        self.pending -= 1
+            complete = self.pending == 0
+        if complete:
+            self.complete()
+
+    def complete(self):
+        try:
+            self.on_complete(self)
+        except Exception as e:
+            logger.error(f"Error finishing save batch for {self.directory}: {e}")
+
+    def elapsed(self):
+        return time.monotonic() - self.started
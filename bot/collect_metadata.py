@@ -1,103 +1,159 @@
 import os
-import json
 import time
 import stat
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
+from functools import partial
 
-from config import logger, STORAGE_PATH
+from config import logger, STORAGE_PATH, SCAN_WORKERS, TRASH_DIR
+from bot.metadata_store import get_store, get_content_store
 
 
-def collect_metadata(directory, existing_files=None):
+def content_changed(known, entry_stat):
+    return known is None or known.get('st_mtime') != entry_stat.st_mtime or known.get('st_size') != entry_stat.st_size
+
+
+def scan_directory(dir_path, directory, files, stored):
+    entries = []
+    subdirs = []
+    for entry in os.scandir(dir_path):
+        if entry.name == TRASH_DIR:
+            continue
+        if entry.is_dir():
+            entries.append((entry.path, True, None, None))
+            subdirs.append(entry.path)
+        elif entry.is_file():
+            entry_stat = os.stat(entry.path)
+            path = os.path.relpath(entry.path, directory)
+            content = None
+            if content_changed(files.get(path), entry_stat) or (stored is not None and path not in stored):
+                with open(entry.path, 'rb') as f:
+                    content = f.read()
+            entries.append((entry.path, False, entry_stat, content))
+    return entries, subdirs
+
+
+def scan_tree(directory, workers, files, stored=None):
+    scan = partial(scan_directory, directory=directory, files=files, stored=stored)
+    results = {}
+    if workers <= 1:
+        stack = [directory]
+        while stack:
+            dir_path = stack.pop()
+            results[dir_path], subdirs = scan(dir_path)
+            stack.extend(subdirs)
+        return results
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(scan, directory): directory}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                dir_path = pending.pop(future)
+                results[dir_path], subdirs = future.result()
+                for subdir in subdirs:
+                    pending[executor.submit(scan, subdir)] = subdir
+    return results
+
+
+def collect_metadata(directory, existing_files=None, workers=SCAN_WORKERS, stored=None):
     files = existing_files if existing_files is not None else {}
     data = {}
     now = time.time()
 
-    def collect(dir_path):
-        nonlocal files, data, now
+    results = scan_tree(directory, workers, files, stored)
+    seen = set()
+    changed = {}
+    for dir_path in sorted(results, key=lambda p: (-p.count(os.sep), p)):
         directory_changed = False
-        for entry in os.scandir(dir_path):
-            path = os.path.relpath(entry.path, directory)
-            if entry.is_dir():
+        for entry_path, is_dir, entry_stat, content in results[dir_path]:
+            path = os.path.relpath(entry_path, directory)
+            seen.add(path)
+            if is_dir:
                 if path not in files:
                     files[path] = dict(st_mode=(stat.S_IFDIR | 0o755), st_ctime=now, st_mtime=now, st_atime=now,
                                        st_nlink=2)
                     directory_changed = True
-                subdir_changed = collect(entry.path)
-                if subdir_changed:
+                if changed.get(entry_path):
                     files[path]['st_mtime'] = now
                     directory_changed = True
-            elif entry.is_file():
-                with open(entry.path, 'rb') as f:
-                    content = f.read()
+            else:
                 if path not in files:
-                    files[path] = dict(st_mode=(stat.S_IFREG | 0o644), st_ctime=os.path.getctime(entry.path),
-                                       st_mtime=os.path.getmtime(entry.path), st_atime=os.path.getatime(entry.path),
-                                       st_size=len(content))
+                    files[path] = dict(st_mode=(stat.S_IFREG | 0o644), st_ctime=entry_stat.st_ctime,
+                                       st_mtime=entry_stat.st_mtime, st_atime=entry_stat.st_atime,
+                                       st_size=entry_stat.st_size)
                     directory_changed = True
                 else:
-                    if files[path]['st_mtime'] != os.path.getmtime(entry.path):
-                        files[path]['st_mtime'] = os.path.getmtime(entry.path)
+                    if files[path]['st_mtime'] != entry_stat.st_mtime:
+                        files[path]['st_mtime'] = entry_stat.st_mtime
                         directory_changed = True
-                    if files[path]['st_atime'] != os.path.getatime(entry.path):
-                        files[path]['st_atime'] = os.path.getatime(entry.path)
-                    if files[path]['st_size'] != len(content):
-                        files[path]['st_size'] = len(content)
+                    if files[path]['st_atime'] != entry_stat.st_atime:
+                        files[path]['st_atime'] = entry_stat.st_atime
+                    if files[path]['st_size'] != entry_stat.st_size:
+                        files[path]['st_size'] = entry_stat.st_size
                         directory_changed = True
-                data[path] = content
-        return directory_changed
+                if content is not None:
+                    data[path] = content
+        changed[dir_path] = directory_changed
 
-    collect(directory)
-    return {'files': files, 'data': data}
+    removed = [path for path in files if path not in seen]
+    for path in removed:
+        del files[path]
+    return {'files': files, 'data': data, 'removed': removed}
 
 
 def save_metadata_to_storage(directory, metadata_path, data_path):
-    if os.path.exists(metadata_path):
-        try:
-            with open(metadata_path, 'r') as f:
-                existing_metadata = json.load(f)
-            existing_files = existing_metadata.get('files', {})
-        except Exception as e:
-            logger.error(f"Error loading existing metadata from {metadata_path}: {e}")
-            existing_files = {}
-    else:
-        existing_files = {}
+    store = get_store(metadata_path)
+    stored = get_content_store(data_path).paths()
+    state = collect_metadata(directory, store.all_files(), stored=stored)
+    write_metadata(metadata_path, state['files'], state['removed'])
+    write_data(data_path, state['data'], stored.difference(state['files']))
 
-    state = collect_metadata(directory, existing_files)
 
-    metadata = {'files': state['files']}
+def write_metadata(metadata_path, files, removed=()):
     try:
-        with open(metadata_path, 'w') as f:
-            json.dump(metadata, f)
-        logger.info(f"Metadata saved to {metadata_path}")
+        store = get_store(metadata_path)
+        store.delete(removed)
+        store.upsert(files)
+        logger.info(f"Metadata saved to {store.db_path}")
     except Exception as e:
         logger.error(f"Error saving metadata to {metadata_path}: {e}")
 
-    data = {k: v.decode('latin1') for k, v in state['data'].items()}
+
+def write_data(data_path, file_data, removed=()):
     try:
-        with open(data_path, 'w') as f:
-            json.dump(data, f)
-        logger.info(f"File data saved to {data_path}")
+        store = get_content_store(data_path)
+        store.delete(removed)
+        store.upsert(file_data)
+        logger.info(f"File data saved to {store.db_path}")
     except Exception as e:
         logger.error(f"Error saving file data to {data_path}: {e}")
 
 
 def load_metadata():
     try:
-        with open(STORAGE_PATH, 'r') as f:
-            return json.load(f)
+        return {'files': get_store(STORAGE_PATH).all_files()}
     except Exception as e:
         logger.error(f"Error loading metadata from {STORAGE_PATH}: {e}")
         return {'files': {}}
 
 
+def load_entry(filename):
+    try:
+        return get_store(STORAGE_PATH).get(filename)
+    except Exception as e:
+        logger.error(f"Error loading metadata for {filename} from {STORAGE_PATH}: {e}")
+        return None
+
+
 def format_timestamp(timestamp):
     return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
 
 
 def get_ctime(filename):
-    metadata = load_metadata()
-    if filename in metadata['files']:
-        ctime = metadata['files'][filename].get('st_ctime')
+    entry = load_entry(filename)
+    if entry is not None:
+        ctime = entry.get('st_ctime')
         if ctime:
             return format_timestamp(ctime)
         else:
@@ -107,9 +163,9 @@ def get_ctime(filename):
 
 
 def get_mtime(filename):
-    metadata = load_metadata()
-    if filename in metadata['files']:
-        mtime = metadata['files'][filename].get('st_mtime')
+    entry = load_entry(filename)
+    if entry is not None:
+        mtime = entry.get('st_mtime')
         if mtime:
             return format_timestamp(mtime)
         else:
@@ -1,7 +1,6 @@
-from PIL import Image
-
-
 def convert_png_to_jpg(png_path):
+    from PIL import Image
+
     img = Image.open(png_path)
     rgb_im = img.convert('RGB')
     rgb_im.save(png_path[:-3] + 'jpg')
@@ -1,7 +1,7 @@
 import os
 import llfuse
 from memory_fs import MemoryFS
-from config import CUSTOM_STORAGE_PATH, logger
+from config import CUSTOM_STORAGE_PATH, CUSTOM_BACKUP_FILE, logger
 
 custom_memory_fs = None
 
@@ -12,7 +12,8 @@ def custom_check_mount(custom_mount: str):
 
 def custom_mount_fs(custom_mount: str):
     global custom_memory_fs
-    custom_memory_fs = MemoryFS(CUSTOM_STORAGE_PATH)
+    custom_memory_fs = MemoryFS(CUSTOM_STORAGE_PATH, CUSTOM_BACKUP_FILE)
+    custom_memory_fs.restore()
     llfuse.init(custom_memory_fs, custom_mount, ['nonempty'])
     logger.info(f"File system successfully mounted at {custom_mount}")
     try:
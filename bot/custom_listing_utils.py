@@ -1,9 +1,9 @@
-import yaml
-
 from config import logger
 
 
 def parse_directory_listing(yaml_file):
+    import yaml
+
     try:
         with open(yaml_file, 'r') as file:
             data = yaml.safe_load(file)
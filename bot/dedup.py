@@ -0,0 +1,78 @@
+import hashlib
+import os
+import shutil
+
+import config
+from config import logger, STORAGE_PATH
+from bot.downloads import download_file
+from bot.metadata_store import get_upload_index
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def index_path(path):
+    return os.path.relpath(os.path.abspath(path), config.MOUNT_POINT)
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_duplicate(file_unique_id):
+    index = get_upload_index(STORAGE_PATH)
+    for location in index.locations(file_unique_id):
+        full_path = os.path.join(config.MOUNT_POINT, location['path'])
+        try:
+            file_stat = os.stat(full_path)
+            if file_stat.st_size == location['st_size']:
+                if file_stat.st_mtime == location['st_mtime']:
+                    return full_path
+                if file_digest(full_path) == location['sha256']:
+                    index.add(file_unique_id, location['path'], file_stat.st_size, file_stat.st_mtime,
+                              location['sha256'])
+                    return full_path
+        except OSError:
+            pass
+        index.discard(file_unique_id, location['path'])
+    return None
+
+
+def record_upload(file_unique_id, local_path):
+    try:
+        file_stat = os.stat(local_path)
+        get_upload_index(STORAGE_PATH).add(file_unique_id, index_path(local_path), file_stat.st_size,
+                                           file_stat.st_mtime, file_digest(local_path))
+    except OSError as e:
+        logger.error(f"Error indexing upload {local_path}: {e}")
+
+
+def fetch_file(bot, file_id, file_unique_id, local_path):
+    source = find_duplicate(file_unique_id) if file_unique_id else None
+    if source is not None:
+        shutil.copyfile(source, local_path)
+        size = os.path.getsize(local_path)
+        get_upload_index(STORAGE_PATH).add_avoided(size)
+        logger.info(f"File {file_unique_id} copied from {source} to {local_path}, {size} bytes of download avoided")
+        record_upload(file_unique_id, local_path)
+        return size
+
+    download_file(bot, file_id, local_path)
+    if file_unique_id:
+        record_upload(file_unique_id, local_path)
+    return 0
+
+
+def forget_path(path):
+    get_upload_index(STORAGE_PATH).delete_tree(index_path(path))
+
+
+def move_path(source, destination):
+    get_upload_index(STORAGE_PATH).move_tree(index_path(source), index_path(destination))
+
+
+def bytes_avoided():
+    return get_upload_index(STORAGE_PATH).avoided()
@@ -0,0 +1,124 @@
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from http.client import HTTPException
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote, urlsplit, urlunsplit
+from urllib.request import Request, urlopen
+
+from config import logger, DOWNLOAD_CONCURRENCY, DOWNLOAD_CHUNK_SIZE, DOWNLOAD_RETRIES, DOWNLOAD_TIMEOUT
+from bot.metrics import phase
+
+slots = threading.BoundedSemaphore(DOWNLOAD_CONCURRENCY)
+stats_lock = threading.Lock()
+totals = {'downloads': 0, 'failures': 0, 'retries': 0, 'bytes': 0}
+throughputs = deque(maxlen=100)
+
+
+class DownloadError(Exception):
+    pass
+
+
+def encoded_url(file_path):
+    parts = urlsplit(file_path)
+    return urlunsplit(parts._replace(path=quote(parts.path)))
+
+
+def fetch_range(url, part_path, offset):
+    request = Request(url, headers={'Range': f"bytes={offset}-"} if offset else {})
+    with urlopen(request, timeout=DOWNLOAD_TIMEOUT) as response:
+        if offset and response.status != 206:
+            offset = 0
+        with open(part_path, 'r+b' if offset else 'wb') as part:
+            part.seek(offset)
+            part.truncate()
+            while True:
+                chunk = response.read(DOWNLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                part.write(chunk)
+            part.flush()
+            os.fsync(part.fileno())
+
+
+def download_url(url, local_path, expected_size=None):
+    part_path = local_path + '.part'
+    started = time.monotonic()
+    retries = 0
+    if os.path.exists(part_path):
+        os.remove(part_path)
+
+    while True:
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        try:
+            if expected_size is None or offset < expected_size:
+                with slots:
+                    fetch_range(url, part_path, offset)
+            size = os.path.getsize(part_path)
+            if expected_size is not None and size != expected_size:
+                raise DownloadError(f"got {size} of {expected_size} bytes")
+            break
+        except HTTPError as e:
+            if e.code == 416 and expected_size is None:
+                break
+            if (e.code < 500 and e.code != 429) or retries >= DOWNLOAD_RETRIES:
+                fail(part_path, retries)
+                raise
+            logger.warning(f"Download of {local_path} failed with HTTP {e.code}, retrying")
+        except (URLError, HTTPException, OSError, DownloadError) as e:
+            if retries >= DOWNLOAD_RETRIES:
+                fail(part_path, retries)
+                raise
+            logger.warning(f"Download of {local_path} interrupted at {offset} bytes, resuming: {e}")
+        retries += 1
+        time.sleep(backoff(retries))
+
+    os.replace(part_path, local_path)
+    size = os.path.getsize(local_path)
+    elapsed = time.monotonic() - started
+    record(size, elapsed, retries)
+    logger.info(f"File downloaded to: {local_path} ({size} bytes in {elapsed:.2f}s, "
+                f"{size / max(elapsed, 1e-6) / 1024 / 1024:.2f} MiB/s, {retries} retries)")
+    return local_path
+
+
+def backoff(retries):
+    return min(2 ** retries, 30)
+
+
+def download_file(bot, file_id, local_path):
+    file = bot.get_file(file_id)
+    with phase('download'):
+        if os.path.isabs(file.file_path or '') and os.path.exists(file.file_path):
+            with slots:
+                shutil.copyfile(file.file_path, local_path)
+            return local_path
+        return download_url(encoded_url(file.file_path), local_path, file.file_size)
+
+
+def fail(part_path, retries):
+    if os.path.exists(part_path):
+        os.remove(part_path)
+    record(0, 0, retries, failed=True)
+
+
+def record(size, elapsed, retries, failed=False):
+    with stats_lock:
+        totals['retries'] += retries
+        if failed:
+            totals['failures'] += 1
+            return
+        totals['downloads'] += 1
+        totals['bytes'] += size
+        if elapsed > 0:
+            throughputs.append(size / elapsed)
+
+
+def download_stats():
+    with stats_lock:
+        rates = sorted(throughputs)
+        return dict(totals,
+                    throughput_p50=rates[len(rates) // 2] if rates else None,
+                    throughput_min=rates[0] if rates else None)
@@ -1,7 +1,7 @@
 import os
 import llfuse
 from memory_fs import MemoryFS
-from config import MOUNT_POINT, STORAGE_PATH, logger
+from config import MOUNT_POINT, STORAGE_PATH, BACKUP_FILE, logger
 
 memory_fs = None
 
@@ -12,7 +12,8 @@ def check_mount():
 
 def mount_fs():
     global memory_fs
-    memory_fs = MemoryFS(STORAGE_PATH)
+    memory_fs = MemoryFS(STORAGE_PATH, BACKUP_FILE)
+    memory_fs.restore()
     llfuse.init(memory_fs, MOUNT_POINT, ['fsname=memoryfs', 'nonempty'])
     logger.info(f"File system successfully mounted at {MOUNT_POINT}")
     try:
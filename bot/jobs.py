@@ -0,0 +1,303 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+
+from telegram.error import TelegramError
+
+from config import logger, JOB_WORKERS, JOB_PROGRESS_INTERVAL, JOB_USER_CONCURRENCY, JOB_USER_QUEUE_LIMIT, \
+    JOB_USER_WEIGHTS
+
+JOB_HISTORY_LIMIT = 50
+STATUS_TEXT = {
+    'queued': 'в очереди',
+    'running': 'выполняется',
+    'done': 'завершена',
+    'failed': 'завершилась с ошибкой',
+    'cancelled': 'отменена',
+}
+
+current = threading.local()
+manager = None
+manager_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id, name, message):
+        self.id = job_id
+        self.name = name
+        self.message = message
+        self.chat_id = message.chat_id
+        self.user_id = message.from_user.id
+        self.status = 'queued'
+        self.progress = ''
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_event = threading.Event()
+        self.status_message = None
+        self.last_edit = 0.0
+        self.call = None
+
+    def describe(self):
+        text = f"Задача #{self.id} ({self.name}) {STATUS_TEXT[self.status]}"
+        if self.progress:
+            text += f": {self.progress}"
+        return text
+
+    def show_status(self):
+        if self.status_message is not None:
+            return
+        self.last_edit = time.monotonic()
+        try:
+            self.status_message = self.message.reply_text(self.describe())
+        except TelegramError as e:
+            logger.warning(f"Could not send status of job {self.id}: {e}")
+
+    def edit_status(self, force=False):
+        if self.status_message is None:
+            return
+        now = time.monotonic()
+        if not force and now - self.last_edit < JOB_PROGRESS_INTERVAL:
+            return
+        self.last_edit = now
+        try:
+            self.status_message.edit_text(self.describe())
+        except TelegramError as e:
+            logger.warning(f"Could not update status of job {self.id}: {e}")
+
+    def report(self, progress):
+        self.check_cancelled()
+        self.progress = progress
+        if self.status_message is None:
+            self.show_status()
+        else:
+            self.edit_status()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+
+def parse_weights(value):
+    weights = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        user_id, _, weight = item.partition(':')
+        try:
+            user_id, weight = int(user_id), float(weight)
+        except ValueError:
+            logger.error(f"Invalid job weight entry: {item}")
+            continue
+        if weight > 0:
+            weights[user_id] = weight
+        else:
+            logger.error(f"Job weight must be positive: {item}")
+    return weights
+
+
+class JobManager:
+    def __init__(self, workers=JOB_WORKERS, user_concurrency=JOB_USER_CONCURRENCY, queue_limit=JOB_USER_QUEUE_LIMIT,
+                 weights=None):
+        self.workers = workers
+        self.user_concurrency = user_concurrency
+        self.queue_limit = queue_limit
+        self.weights = parse_weights(JOB_USER_WEIGHTS) if weights is None else weights
+        self.jobs = OrderedDict()
+        self.queues = {}
+        self.running = {}
+        self.virtual_time = {}
+        self.waits = {}
+        self.idle = workers
+        self.condition = threading.Condition()
+        self.ids = itertools.count(1)
+        for index in range(workers):
+            threading.Thread(target=self.worker, name=f"job-{index}", daemon=True).start()
+
+    def submit(self, update, context, name, handler):
+        user_id = update.message.from_user.id
+        with self.condition:
+            queue = self.queues.setdefault(user_id, deque())
+            if len(queue) >= self.queue_limit:
+                return None
+            job = Job(next(self.ids), name, update.message)
+            job.call = (handler, update, context)
+            if not queue and self.running.get(user_id, 0) == 0:
+                floor = min(self.virtual_time.values(), default=0.0)
+                self.virtual_time[user_id] = max(self.virtual_time.get(user_id, 0.0), floor)
+            queue.append(job)
+            self.jobs[job.id] = job
+            self.trim()
+            starts_now = self.idle > 0 and len(queue) == 1 and self.running.get(user_id, 0) < self.user_concurrency
+            self.condition.notify()
+        if not starts_now:
+            job.show_status()
+        return job
+
+    def next_job(self):
+        ready = [user_id for user_id, queue in self.queues.items()
+                 if queue and self.running.get(user_id, 0) < self.user_concurrency]
+        if not ready:
+            return None
+        user_id = min(ready, key=lambda user: (self.virtual_time.get(user, 0.0), self.queues[user][0].id))
+        job = self.queues[user_id].popleft()
+        self.running[user_id] = self.running.get(user_id, 0) + 1
+        self.virtual_time[user_id] = self.virtual_time.get(user_id, 0.0) + 1 / self.weights.get(user_id, 1.0)
+        return job
+
+    def worker(self):
+        while True:
+            with self.condition:
+                job = self.next_job()
+                while job is None:
+                    self.condition.wait()
+                    job = self.next_job()
+                self.idle -= 1
+            try:
+                self.run(job, *job.call)
+            finally:
+                job.call = None
+                with self.condition:
+                    self.idle += 1
+                    self.running[job.user_id] -= 1
+                    if job.started is not None:
+                        self.waits.setdefault(job.user_id, deque(maxlen=20)).append(job.started - job.created)
+                    self.forget_idle()
+                    self.condition.notify_all()
+
+    def run(self, job, handler, update, context):
+        if job.cancel_event.is_set():
+            job.status = 'cancelled'
+            job.finished = time.time()
+            job.edit_status(force=True)
+            return
+
+        job.status = 'running'
+        job.started = time.time()
+        job.edit_status(force=True)
+        current.job = job
+        try:
+            handler(update, context)
+            job.status = 'done'
+            job.progress = ''
+        except JobCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            job.status = 'failed'
+            job.progress = ''
+            logger.error(f"Job {job.id} ({job.name}) failed: {e}")
+        finally:
+            current.job = None
+            job.finished = time.time()
+            job.edit_status(force=True)
+            logger.info(f"Job {job.id} ({job.name}) {job.status} in {job.finished - job.started:.3f}s")
+
+    def forget_idle(self):
+        active = {user_id for user_id, queue in self.queues.items() if queue}
+        active.update(user_id for user_id, count in self.running.items() if count)
+        floor = min((self.virtual_time.get(user_id, 0.0) for user_id in active), default=None)
+        for user_id in (set(self.queues) | set(self.running) | set(self.virtual_time)) - active:
+            self.queues.pop(user_id, None)
+            self.running.pop(user_id, None)
+            if floor is None or self.virtual_time.get(user_id, 0.0) <= floor:
+                self.virtual_time.pop(user_id, None)
+
+    def trim(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished is not None]
+        for job_id in finished[:max(0, len(self.jobs) - JOB_HISTORY_LIMIT)]:
+            del self.jobs[job_id]
+
+    def cancel(self, job_id, user_id):
+        with self.condition:
+            job = self.jobs.get(job_id)
+            if job is None or job.user_id != user_id or job.finished is not None:
+                return False
+            job.cancel_event.set()
+            queue = self.queues.get(user_id)
+            if queue is None or job not in queue:
+                return True
+            queue.remove(job)
+            self.forget_idle()
+            job.call = None
+            job.status = 'cancelled'
+            job.finished = time.time()
+        job.edit_status(force=True)
+        return True
+
+    def list(self, user_id=None):
+        with self.condition:
+            return [job for job in self.jobs.values() if user_id is None or job.user_id == user_id]
+
+    def drain(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            for queue in self.queues.values():
+                for job in queue:
+                    job.cancel_event.set()
+                    job.status = 'cancelled'
+                    job.finished = time.time()
+                queue.clear()
+            self.forget_idle()
+            while any(self.running.values()):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def stats(self):
+        now = time.time()
+        with self.condition:
+            users = set(self.queues) | set(self.running)
+            return {
+                user_id: {
+                    'queued': len(self.queues.get(user_id, ())),
+                    'running': self.running.get(user_id, 0),
+                    'oldest_wait': now - self.queues[user_id][0].created if self.queues.get(user_id) else 0.0,
+                    'average_wait': (sum(self.waits[user_id]) / len(self.waits[user_id])
+                                     if self.waits.get(user_id) else None),
+                }
+                for user_id in users
+            }
+
+
+def get_manager():
+    global manager
+    with manager_lock:
+        if manager is None:
+            manager = JobManager()
+        return manager
+
+
+def submit_job(update, context, name, handler):
+    return get_manager().submit(update, context, name, handler)
+
+
+def current_job():
+    return getattr(current, 'job', None)
+
+
+def report_progress(progress):
+    job = current_job()
+    if job is not None:
+        job.report(progress)
+
+
+def cancel_job(job_id, user_id):
+    return get_manager().cancel(job_id, user_id)
+
+
+def list_jobs(user_id=None):
+    return get_manager().list(user_id)
+
+
+def jobs_stats():
+    return get_manager().stats()
+
+
+def drain_jobs(timeout):
+    if manager is not None and not manager.drain(timeout):
+        logger.warning("Shutting down with jobs still running")
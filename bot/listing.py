@@ -0,0 +1,149 @@
+import fnmatch
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from config import TRASH_DIR, LISTING_CACHE_SIZE
+
+GLOB_CHARS = re.compile(r'[*?\[]')
+
+cache = OrderedDict()
+cache_lock = threading.Lock()
+
+
+def scan_dir(path):
+    path = os.path.normpath(path)
+    dir_stat = os.stat(path)
+    key = (dir_stat.st_ino, dir_stat.st_mtime_ns)
+    with cache_lock:
+        cached = cache.get(path)
+        if cached is not None and cached[0] == key:
+            cache.move_to_end(path)
+            return cached[1]
+
+    entries = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.name == TRASH_DIR:
+                continue
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            entries.append((entry.name, is_dir, entry.is_symlink()))
+    entries.sort(key=lambda e: e[0].lower())
+
+    with cache_lock:
+        cache[path] = (key, entries)
+        cache.move_to_end(path)
+        while len(cache) > LISTING_CACHE_SIZE:
+            cache.popitem(last=False)
+    return entries
+
+
+def invalidate(path, recursive=False):
+    path = os.path.normpath(path)
+    prefix = path + os.sep
+    with cache_lock:
+        cache.pop(path, None)
+        if recursive:
+            for cached_path in [p for p in cache if p.startswith(prefix)]:
+                del cache[cached_path]
+
+
+def glob_files(pattern):
+    base = os.path.dirname(GLOB_CHARS.split(pattern)[0])
+    candidates = [base]
+    for part in os.path.relpath(pattern, base).split(os.sep):
+        matched = []
+        for directory in candidates:
+            if not GLOB_CHARS.search(part):
+                matched.append(os.path.join(directory, part))
+                continue
+            try:
+                entries = scan_dir(directory)
+            except OSError:
+                continue
+            matched.extend(os.path.join(directory, name) for name, is_dir, is_link in entries
+                           if fnmatch.fnmatchcase(name, part) and (part.startswith('.') or not name.startswith('.')))
+        candidates = matched
+    return sorted(path for path in candidates if os.path.isfile(path))
+
+
+def files_cursor(mount_point, directory_path='/'):
+    return (os.path.normpath(os.path.join(mount_point, directory_path.strip('/'))),), None, 0
+
+
+def files_page(mount_point, cursor, visited, max_lines, max_chars):
+    stack, root, index = list(cursor[0]), cursor[1], cursor[2]
+    page = []
+    size = 0
+    while root is not None or stack:
+        if root is None:
+            root, index = stack.pop(), 0
+            try:
+                root_stat = os.stat(root)
+                if visited.setdefault((root_stat.st_dev, root_stat.st_ino), root) != root:
+                    root = None
+                    continue
+                entries = scan_dir(root)
+            except OSError:
+                root = None
+                continue
+            stack.extend(os.path.join(root, name) for name, is_dir, is_link in reversed(entries) if is_dir)
+        else:
+            try:
+                entries = scan_dir(root)
+            except OSError:
+                entries = []
+
+        relative_path = os.path.relpath(root, mount_point)
+        relative_path = '/' if relative_path == '.' else f"/{relative_path}"
+        files = [(name, is_link) for name, is_dir, is_link in entries if not is_dir]
+        while index < len(files):
+            name, is_link = files[index]
+            line = f"<{relative_path}> {name} ->" if is_link else f"<{relative_path}> {name}"
+            if page and (len(page) >= max_lines or size + len(line) + 1 > max_chars):
+                return page, (tuple(stack), root, index)
+            page.append(line)
+            size += len(line) + 1
+            index += 1
+        root = None
+    return page, None
+
+
+def tree_entries(path, dirs_only):
+    entries = scan_dir(path)
+    if dirs_only:
+        return [entry for entry in entries if entry[1] and not entry[2]]
+    return entries
+
+
+def iter_tree(directory, max_depth=None, dirs_only=False):
+    root = os.path.normpath(directory)
+    frames = [[tree_entries(root, dirs_only), 0, root, '', 1]]
+    while frames:
+        frame = frames[-1]
+        entries, index, path, prefix, depth = frame
+        if index >= len(entries):
+            frames.pop()
+            continue
+        frame[1] += 1
+
+        name, is_dir, is_link = entries[index]
+        is_last = index == len(entries) - 1
+        pointer = '└── ' if is_last else '├── '
+        if is_dir and not is_link:
+            yield f"{prefix}{pointer}{name}/"
+            if max_depth is None or depth < max_depth:
+                child = os.path.join(path, name)
+                try:
+                    child_entries = tree_entries(child, dirs_only)
+                except OSError:
+                    continue
+                frames.append([child_entries, 0, child, prefix + ('    ' if is_last else '│   '), depth + 1])
+        elif is_link:
+            yield f"{prefix}{pointer}{name} ->"
+        else:
+            yield f"{prefix}{pointer}{name}"
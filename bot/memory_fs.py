@@ -1,20 +1,67 @@
 import errno
+import threading
 import time
 import stat
 import os
 import llfuse
 from llfuse import FUSEError, Operations
 
+from config import logger, RESTORE_PREFETCH_COUNT
+from bot.metadata_store import get_store, get_content_store
+
 
 class MemoryFS(Operations):
-    def __init__(self, storage_path):
+    def __init__(self, storage_path, backup_path=None):
         super(MemoryFS, self).__init__()
         self.files = {}
         self.data = {}
+        self.aliases = {}
         self.storage_path = storage_path
+        self.backup_path = backup_path
+        self.data_lock = threading.Lock()
         now = time.time()
         self.files['/'] = dict(st_mode=(stat.S_IFDIR | 0o755), st_ctime=now, st_mtime=now, st_atime=now, st_nlink=2)
 
+    def restore(self):
+        if self.backup_path is None:
+            return
+        started = time.perf_counter()
+        for path, entry in get_store(self.storage_path).all_files().items():
+            entry = dict(entry)
+            if stat.S_ISREG(entry.get('st_mode', 0)):
+                entry.setdefault('st_nlink', 1)
+            else:
+                self.files['/']['st_nlink'] += 1
+            self.files['/' + path] = entry
+        logger.info(f"Restored {len(self.files) - 1} entries from {self.storage_path} "
+                    f"in {time.perf_counter() - started:.3f}s, contents are loaded on first read")
+        threading.Thread(target=self.prefetch, daemon=True).start()
+
+    def prefetch(self):
+        try:
+            for path in get_store(self.storage_path).recent(RESTORE_PREFETCH_COUNT):
+                self.load_content('/' + path)
+        except Exception as e:
+            logger.error(f"Error prefetching contents from {self.backup_path}: {e}")
+
+    def load_content(self, path):
+        with self.data_lock:
+            if path in self.data or path not in self.files:
+                return self.data.get(path, b'')
+            key = self.aliases.get(path, path[1:])
+        content = b''
+        if self.backup_path is not None:
+            store = get_content_store(self.backup_path)
+            content = store.get(key)
+            if content is None and key != path[1:]:
+                content = store.get(path[1:])
+            content = content or b''
+        with self.data_lock:
+            if path not in self.files:
+                return b''
+            self.aliases.pop(path, None)
+            return self.data.setdefault(path, content)
+
     def getattr(self, inode, ctx=None):
         path = llfuse.fuse_decode_inode(inode)
         if path not in self.files:
@@ -43,6 +90,7 @@ class MemoryFS(Operations):
         self.files[full_path] = dict(st_mode=(stat.S_IFREG | mode), st_nlink=1, st_size=0,
                                      st_ctime=time.time(), st_mtime=time.time(), st_atime=time.time())
         self.data[full_path] = b''
+        self.aliases.pop(full_path, None)
 
     def mkdir(self, parent_inode, name, mode, ctx=None):
         path = llfuse.fuse_decode_inode(parent_inode)
@@ -58,6 +106,7 @@ class MemoryFS(Operations):
         full_path = os.path.join(path, name)
         self.files.pop(full_path)
         self.data.pop(full_path, None)
+        self.aliases.pop(full_path, None)
 
     def rmdir(self, parent_inode, name, ctx=None):
         path = llfuse.fuse_decode_inode(parent_inode)
@@ -66,15 +115,54 @@ class MemoryFS(Operations):
         self.files.pop(full_path)
         self.files['/']['st_nlink'] -= 1
 
+    def rename(self, parent_inode_old, name_old, parent_inode_new, name_new, ctx=None):
+        old_path = os.path.join(llfuse.fuse_decode_inode(parent_inode_old), name_old.decode())
+        new_path = os.path.join(llfuse.fuse_decode_inode(parent_inode_new), name_new.decode())
+        if old_path not in self.files:
+            raise FUSEError(errno.ENOENT)
+        if new_path == old_path or new_path.startswith(old_path + '/'):
+            raise FUSEError(errno.EINVAL)
+        if any(path.startswith(new_path + '/') for path in self.files):
+            raise FUSEError(errno.ENOTEMPTY)
+
+        prefix = old_path + '/'
+        with self.data_lock:
+            paths = [path for path in self.files if path == old_path or path.startswith(prefix)]
+            if new_path in self.files and not stat.S_ISREG(self.files[new_path]['st_mode']):
+                self.files['/']['st_nlink'] -= 1
+            self.files.pop(new_path, None)
+            self.data.pop(new_path, None)
+            self.aliases.pop(new_path, None)
+            for path in paths:
+                moved_path = new_path + path[len(old_path):]
+                self.files[moved_path] = self.files.pop(path)
+                if path in self.data:
+                    self.data[moved_path] = self.data.pop(path)
+                elif stat.S_ISREG(self.files[moved_path].get('st_mode', 0)):
+                    self.aliases[moved_path] = self.aliases.pop(path, path[1:])
+
+    def statfs(self, ctx=None):
+        disk = os.statvfs(os.path.dirname(os.path.abspath(self.backup_path or self.storage_path)))
+        used = sum(entry.get('st_size', 0) for entry in self.files.values())
+        result = llfuse.StatvfsData()
+        result.f_bsize = disk.f_bsize
+        result.f_frsize = disk.f_frsize
+        result.f_blocks = -(-used // disk.f_frsize) + disk.f_bavail
+        result.f_bfree = disk.f_bavail
+        result.f_bavail = disk.f_bavail
+        result.f_files = len(self.files) + disk.f_favail
+        result.f_ffree = disk.f_favail
+        result.f_favail = disk.f_favail
+        result.f_namemax = 255
+        return result
+
     def read(self, fh, off, size):
         path = llfuse.fuse_decode_inode(fh)
-        return self.data[path][off:off + size]
+        return self.load_content(path)[off:off + size]
 
     def write(self, fh, off, buf):
         path = llfuse.fuse_decode_inode(fh)
-        if path not in self.data:
-            self.data[path] = b''
-        self.data[path] = self.data[path][:off] + buf
+        self.data[path] = self.load_content(path)[:off] + buf
         self.files[path]['st_size'] = len(self.data[path])
         return len(buf)
 
@@ -0,0 +1,308 @@
+import json
+import os
+import sqlite3
+import threading
+
+from config import logger
+
+COLUMNS = ('st_mode', 'st_ctime', 'st_mtime', 'st_atime', 'st_size', 'st_nlink')
+INFO_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS store_info (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+FILES_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    parent TEXT NOT NULL,
+    st_mode INTEGER,
+    st_ctime REAL,
+    st_mtime REAL,
+    st_atime REAL,
+    st_size INTEGER,
+    st_nlink INTEGER
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS files_parent ON files (parent);
+'''
+CONTENT_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS content (
+    path TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+'''
+UPLOADS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS uploads (
+    file_unique_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    st_size INTEGER,
+    st_mtime REAL,
+    sha256 TEXT,
+    PRIMARY KEY (file_unique_id, path)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS uploads_path ON uploads (path);
+'''
+SENT_FILES_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sent_files (
+    path TEXT PRIMARY KEY,
+    st_size INTEGER NOT NULL,
+    st_mtime_ns INTEGER NOT NULL,
+    file_id TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sent_archives (
+    path TEXT NOT NULL,
+    format TEXT NOT NULL,
+    signature TEXT NOT NULL,
+    file_ids TEXT NOT NULL,
+    PRIMARY KEY (path, format)
+) WITHOUT ROWID;
+'''
+
+stores = {}
+stores_lock = threading.Lock()
+
+
+def database_path(storage_path):
+    return os.path.splitext(storage_path)[0] + '.sqlite3'
+
+
+def parent_of(path):
+    return os.path.dirname(path)
+
+
+def row_to_entry(row):
+    return {column: row[column] for column in COLUMNS if row[column] is not None}
+
+
+def entry_to_row(path, entry):
+    return (path, parent_of(path)) + tuple(entry.get(column) for column in COLUMNS)
+
+
+class SQLiteStore:
+    schema = ''
+
+    def __init__(self, storage_path):
+        self.storage_path = storage_path
+        self.db_path = database_path(storage_path)
+        self.local = threading.local()
+        self.write_lock = threading.Lock()
+        self.connection().executescript(INFO_SCHEMA + self.schema)
+        self.migrate()
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def migrate(self):
+        conn = self.connection()
+        if conn.execute("SELECT 1 FROM store_info WHERE key = 'migrated'").fetchone():
+            return
+
+        legacy = {}
+        if os.path.exists(self.storage_path):
+            try:
+                with open(self.storage_path, 'r') as f:
+                    legacy = json.load(f)
+            except Exception as e:
+                logger.error(f"Error migrating {self.storage_path}: {e}")
+
+        count = self.import_legacy(legacy)
+        with self.write_lock, conn:
+            conn.execute("INSERT INTO store_info VALUES ('migrated', ?)", (self.storage_path,))
+        if count:
+            logger.info(f"Migrated {count} entries from {self.storage_path} to {self.db_path}")
+
+    def import_legacy(self, legacy):
+        return 0
+
+
+class MetadataStore(SQLiteStore):
+    schema = FILES_SCHEMA
+
+    def import_legacy(self, legacy):
+        files = legacy.get('files', {})
+        self.upsert(files)
+        return len(files)
+
+    def get(self, path):
+        row = self.connection().execute('SELECT * FROM files WHERE path = ?', (path,)).fetchone()
+        return row_to_entry(row) if row else None
+
+    def all_files(self):
+        return {row['path']: row_to_entry(row) for row in self.connection().execute('SELECT * FROM files')}
+
+    def children(self, parent):
+        rows = self.connection().execute('SELECT * FROM files WHERE parent = ? ORDER BY path', (parent,))
+        return [(row['path'], row_to_entry(row)) for row in rows]
+
+    def subtree(self, prefix):
+        if not prefix:
+            rows = self.connection().execute('SELECT * FROM files ORDER BY path')
+        else:
+            rows = self.connection().execute(
+                'SELECT * FROM files WHERE path = ? OR (path >= ? AND path < ?) ORDER BY path',
+                (prefix, prefix + '/', prefix + '0'))
+        return [(row['path'], row_to_entry(row)) for row in rows]
+
+    def recent(self, limit):
+        rows = self.connection().execute('SELECT path FROM files WHERE st_size IS NOT NULL '
+                                         'ORDER BY st_atime DESC LIMIT ?', (limit,))
+        return [row['path'] for row in rows]
+
+    def upsert(self, files):
+        if not files:
+            return
+        conn = self.connection()
+        with self.write_lock, conn:
+            conn.executemany(f"INSERT OR REPLACE INTO files VALUES (?, ?, {', '.join('?' * len(COLUMNS))})",
+                             [entry_to_row(path, entry) for path, entry in files.items()])
+
+    def delete(self, paths):
+        if not paths:
+            return
+        conn = self.connection()
+        with self.write_lock, conn:
+            conn.executemany('DELETE FROM files WHERE path = ?', [(path,) for path in paths])
+
+
+class ContentStore(SQLiteStore):
+    schema = CONTENT_SCHEMA
+
+    def import_legacy(self, legacy):
+        self.upsert({path: content.encode('latin1') for path, content in legacy.items()})
+        return len(legacy)
+
+    def get(self, path):
+        row = self.connection().execute('SELECT data FROM content WHERE path = ?', (path,)).fetchone()
+        return bytes(row['data']) if row else None
+
+    def paths(self):
+        return {row['path'] for row in self.connection().execute('SELECT path FROM content')}
+
+    def upsert(self, data):
+        if not data:
+            return
+        conn = self.connection()
+        with self.write_lock, conn:
+            conn.executemany('INSERT OR REPLACE INTO content VALUES (?, ?)', list(data.items()))
+
+    def delete(self, paths):
+        if not paths:
+            return
+        conn = self.connection()
+        with self.write_lock, conn:
+            conn.executemany('DELETE FROM content WHERE path = ?', [(path,) for path in paths])
+
+
+class UploadIndex(SQLiteStore):
+    schema = UPLOADS_SCHEMA
+
+    def migrate(self):
+        pass
+
+    def locations(self, file_unique_id):
+        rows = self.connection().execute('SELECT * FROM uploads WHERE file_unique_id = ?', (file_unique_id,))
+        return [dict(row) for row in rows]
+
+    def add(self, file_unique_id, path, st_size, st_mtime, sha256):
+        conn = self.connection()
+        with self.write_lock, conn:
+            conn.execute('INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?)',
+                         (file_unique_id, path, st_size, st_mtime, sha256))
+
+    def discard(self, file_unique_id, path):
+        conn = self.connection()
+        with self.write_lock, conn:
+            conn.execute('DELETE FROM uploads WHERE file_unique_id = ? AND path = ?', (file_unique_id, path))
+
+    def delete_tree(self, path):
+        conn = self.connection()
+        with self.write_lock, conn:
+            conn.execute('DELETE FROM uploads WHERE path = ? OR (path >= ? AND path < ?)',
+                         (path, path + '/', path + '0'))
+
+    def move_tree(self, source, destination):
+        conn = self.connection()
+        with self.write_lock, conn:
+            conn.execute('UPDATE OR REPLACE uploads SET path = ? || substr(path, ?) '
+                         'WHERE path = ? OR (path >= ? AND path < ?)',
+                         (destination, len(source) + 1, source, source + '/', source + '0'))
+
+    def add_avoided(self, size):
+        conn = self.connection()
+        with self.write_lock, conn:
+            conn.execute("INSERT OR REPLACE INTO store_info VALUES ('bytes_avoided', ?)",
+                         (str(self.avoided() + size),))
+
+    def avoided(self):
+        row = self.connection().execute("SELECT value FROM store_info WHERE key = 'bytes_avoided'").fetchone()
+        return int(row['value']) if row else 0
+
+
+class SentFileCache(SQLiteStore):
+    schema = SENT_FILES_SCHEMA
+
+    def migrate(self):
+        pass
+
+    def get(self, path, st_size, st_mtime_ns):
+        row = self.connection().execute('SELECT file_id FROM sent_files WHERE path = ? AND st_size = ? '
+                                        'AND st_mtime_ns = ?', (path, st_size, st_mtime_ns)).fetchone()
+        return row['file_id'] if row else None
+
+    def put(self, path, st_size, st_mtime_ns, file_id):
+        conn = self.connection()
+        with self.write_lock, conn:
+            conn.execute('INSERT OR REPLACE INTO sent_files VALUES (?, ?, ?, ?)', (path, st_size, st_mtime_ns, file_id))
+
+    def discard(self, path):
+        conn = self.connection()
+        with self.write_lock, conn:
+            conn.execute('DELETE FROM sent_files WHERE path = ?', (path,))
+
+    def get_archive(self, path, archive_format, signature):
+        row = self.connection().execute('SELECT file_ids FROM sent_archives WHERE path = ? AND format = ? '
+                                        'AND signature = ?', (path, archive_format, signature)).fetchone()
+        return json.loads(row['file_ids']) if row else None
+
+    def put_archive(self, path, archive_format, signature, file_ids):
+        conn = self.connection()
+        with self.write_lock, conn:
+            conn.execute('INSERT OR REPLACE INTO sent_archives VALUES (?, ?, ?, ?)',
+                         (path, archive_format, signature, json.dumps(file_ids)))
+
+    def discard_archive(self, path, archive_format):
+        conn = self.connection()
+        with self.write_lock, conn:
+            conn.execute('DELETE FROM sent_archives WHERE path = ? AND format = ?', (path, archive_format))
+
+
+def open_store(store_class, storage_path):
+    with stores_lock:
+        store = stores.get((store_class, storage_path))
+        if store is None:
+            store = store_class(storage_path)
+            stores[(store_class, storage_path)] = store
+        return store
+
+
+def get_store(storage_path):
+    return open_store(MetadataStore, storage_path)
+
+
+def get_content_store(data_path):
+    return open_store(ContentStore, data_path)
+
+
+def get_upload_index(storage_path):
+    return open_store(UploadIndex, storage_path)
+
+
+def get_sent_file_cache(storage_path):
+    return open_store(SentFileCache, storage_path)
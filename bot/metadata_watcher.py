@@ -0,0 +1,301 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import stat
+import struct
+import threading
+import time
+
+from config import logger, METADATA_FLUSH_INTERVAL, TRASH_DIR
+from bot.collect_metadata import collect_metadata, write_metadata, write_data
+from bot.listing import invalidate
+from bot.metadata_store import get_store, get_content_store
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+              IN_DELETE_SELF)
+EVENT_HEADER = struct.Struct('iIII')
+
+watchers = {}
+watchers_lock = threading.Lock()
+
+
+def load_libc():
+    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    return libc
+
+
+class MetadataWatcher(threading.Thread):
+    def __init__(self, directory, metadata_path, data_path, wait_for=None, flush_interval=METADATA_FLUSH_INTERVAL):
+        super(MetadataWatcher, self).__init__(daemon=True)
+        self.directory = directory
+        self.metadata_path = metadata_path
+        self.data_path = data_path
+        self.wait_for = wait_for
+        self.flush_interval = flush_interval
+        self.files = {}
+        self.data = {}
+        self.changed = set()
+        self.removed = set()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.dirty = False
+        self.last_flush = 0.0
+        self.libc = None
+        self.fd = -1
+        self.wd_paths = {}
+
+    def run(self):
+        while not self.stop_event.is_set():
+            if os.path.isdir(self.directory) and (self.wait_for is None or self.wait_for()):
+                break
+            self.stop_event.wait(0.5)
+        if self.stop_event.is_set():
+            return
+
+        try:
+            self.libc = load_libc()
+            self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if self.fd < 0:
+                raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        except (OSError, AttributeError) as e:
+            logger.error(f"Metadata watcher for {self.directory} is unavailable: {e}")
+            return
+
+        try:
+            self.add_watch_tree(self.directory)
+            self.resync()
+            logger.info(f"Metadata watcher started for {self.directory}")
+            while not self.stop_event.is_set():
+                readable, _, _ = select.select([self.fd], [], [], 0.5)
+                if readable:
+                    self.read_events()
+                if self.dirty and time.time() - self.last_flush >= self.flush_interval:
+                    self.flush()
+        except Exception as e:
+            logger.error(f"Metadata watcher for {self.directory} failed: {e}")
+        finally:
+            os.close(self.fd)
+            self.fd = -1
+
+    def stop(self):
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+        self.flush()
+
+    def resync(self):
+        with self.lock:
+            existing_files = self.files or get_store(self.metadata_path).all_files()
+            stored = get_content_store(self.data_path).paths()
+            stored.difference_update(self.removed)
+            state = collect_metadata(self.directory, existing_files, stored=stored | set(self.data))
+            self.files = state['files']
+            self.data.update(state['data'])
+            for path in state['removed']:
+                self.data.pop(path, None)
+                self.removed.add(path)
+            self.changed.update(self.files)
+            self.dirty = True
+        self.flush()
+
+    def flush(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            files = {path: dict(self.files[path]) for path in self.changed if path in self.files}
+            removed = list(self.removed)
+            data = self.data
+            self.data = {}
+            self.changed.clear()
+            self.removed.clear()
+            self.dirty = False
+            self.last_flush = time.time()
+        write_metadata(self.metadata_path, files, removed)
+        write_data(self.data_path, data, removed)
+
+    def add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd >= 0:
+            self.wd_paths[wd] = path
+
+    def add_watch_tree(self, path):
+        self.add_watch(path)
+        for root, dirs, _ in os.walk(path):
+            dirs[:] = [name for name in dirs if name != TRASH_DIR]
+            for name in dirs:
+                self.add_watch(os.path.join(root, name))
+
+    def remove_watch_tree(self, path):
+        prefix = path + os.sep
+        for wd, watched in list(self.wd_paths.items()):
+            if watched == path or watched.startswith(prefix):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.wd_paths[wd]
+
+    def read_events(self):
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(buffer):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = buffer[offset:offset + length].rstrip(b'\0')
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                logger.warning(f"Metadata watcher queue overflow for {self.directory}, rescanning")
+                self.resync()
+                continue
+            if mask & IN_IGNORED:
+                self.wd_paths.pop(wd, None)
+                continue
+
+            parent = self.wd_paths.get(wd)
+            if parent is None or not name:
+                continue
+            self.apply_event(os.path.join(parent, os.fsdecode(name)), mask)
+
+    def apply_event(self, full_path, mask):
+        if TRASH_DIR in os.path.relpath(full_path, self.directory).split(os.sep):
+            return
+        is_dir = bool(mask & IN_ISDIR)
+        invalidate(os.path.dirname(full_path))
+        if is_dir:
+            invalidate(full_path, recursive=True)
+        if mask & (IN_DELETE | IN_MOVED_FROM):
+            if is_dir:
+                self.remove_watch_tree(full_path)
+            self.remove_entry(full_path)
+        elif mask & (IN_CREATE | IN_MOVED_TO):
+            if is_dir:
+                self.add_watch_tree(full_path)
+                self.update_tree(full_path)
+            else:
+                self.update_file(full_path, read_content=bool(mask & IN_MOVED_TO))
+        elif mask & IN_CLOSE_WRITE:
+            self.update_file(full_path, read_content=True)
+        elif mask & (IN_MODIFY | IN_ATTRIB) and not is_dir:
+            self.update_file(full_path, read_content=False)
+
+    def touch_parents(self, path, now):
+        parent = os.path.dirname(path)
+        while parent and parent != '.':
+            if parent in self.files:
+                self.files[parent]['st_mtime'] = now
+                self.changed.add(parent)
+            parent = os.path.dirname(parent)
+
+    def remove_entry(self, full_path):
+        path = os.path.relpath(full_path, self.directory)
+        prefix = path + os.sep
+        with self.lock:
+            for key in [key for key in self.files if key == path or key.startswith(prefix)]:
+                del self.files[key]
+                self.data.pop(key, None)
+                self.changed.discard(key)
+                self.removed.add(key)
+            self.touch_parents(path, time.time())
+            self.dirty = True
+
+    def update_tree(self, full_path):
+        now = time.time()
+        path = os.path.relpath(full_path, self.directory)
+        with self.lock:
+            if path not in self.files:
+                self.files[path] = dict(st_mode=(stat.S_IFDIR | 0o755), st_ctime=now, st_mtime=now, st_atime=now,
+                                        st_nlink=2)
+                self.changed.add(path)
+                self.removed.discard(path)
+            self.touch_parents(path, now)
+            self.dirty = True
+        for root, dirs, files in os.walk(full_path):
+            for name in dirs:
+                self.update_tree(os.path.join(root, name))
+            for name in files:
+                self.update_file(os.path.join(root, name), read_content=True)
+            break
+
+    def update_file(self, full_path, read_content):
+        path = os.path.relpath(full_path, self.directory)
+        try:
+            file_stat = os.stat(full_path)
+            content = None
+            if read_content or path not in self.files:
+                with open(full_path, 'rb') as f:
+                    content = f.read()
+        except OSError:
+            return
+        if not stat.S_ISREG(file_stat.st_mode):
+            return
+
+        with self.lock:
+            entry = self.files.get(path)
+            if entry is None:
+                self.files[path] = dict(st_mode=(stat.S_IFREG | 0o644), st_ctime=file_stat.st_ctime,
+                                        st_mtime=file_stat.st_mtime, st_atime=file_stat.st_atime,
+                                        st_size=file_stat.st_size)
+                self.touch_parents(path, time.time())
+            else:
+                if entry['st_mtime'] != file_stat.st_mtime or entry.get('st_size') != file_stat.st_size:
+                    self.touch_parents(path, time.time())
+                entry['st_mtime'] = file_stat.st_mtime
+                entry['st_atime'] = file_stat.st_atime
+                entry['st_size'] = file_stat.st_size
+            if content is not None:
+                self.data[path] = content
+            self.changed.add(path)
+            self.removed.discard(path)
+            self.dirty = True
+
+
+def find_watcher(directory):
+    with watchers_lock:
+        for root, watcher in watchers.items():
+            if (directory == root or directory.startswith(root.rstrip(os.sep) + os.sep)) and watcher.is_alive():
+                return watcher
+    return None
+
+
+def start_watcher(directory, metadata_path, data_path, wait_for=None):
+    with watchers_lock:
+        watcher = watchers.get(directory)
+        if watcher is not None and watcher.is_alive():
+            return watcher
+        watcher = MetadataWatcher(directory, metadata_path, data_path, wait_for)
+        watchers[directory] = watcher
+    watcher.start()
+    return watcher
+
+
+def stop_watcher(directory):
+    with watchers_lock:
+        watcher = watchers.pop(directory, None)
+    if watcher is not None:
+        watcher.stop()
+        logger.info(f"Metadata watcher stopped for {directory}")
+
+
+def stop_all_watchers():
+    for directory in list(watchers):
+        stop_watcher(directory)
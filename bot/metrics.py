@@ -0,0 +1,298 @@
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telegram.utils.request import Request
+
+from config import logger, METRICS_FILE, METRICS_INTERVAL, METRICS_LISTEN, METRICS_PORT, SLOW_COMMAND_THRESHOLD, \
+    SLOW_COMMAND_LOG
+from bot.outbound import wait_for_chat
+from bot.profiling import armed, take, run_profiled
+
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PHASES = ('fs', 'metadata', 'send', 'download')
+SLOWEST_LIMIT = 20
+MAX_ARGS_LENGTH = 500
+
+current = threading.local()
+lock = threading.Lock()
+slow_log_lock = threading.Lock()
+histograms = {}
+phase_totals = defaultdict(float)
+durations = defaultdict(lambda: deque(maxlen=500))
+failures = defaultdict(int)
+slowest = []
+sequence = itertools.count()
+in_flight = 0
+gauges = {}
+exporters = []
+
+
+class CommandTimer:
+    def __init__(self, command, update):
+        self.command = command
+        message = getattr(update, 'effective_message', None)
+        self.args = ''
+        if message is not None:
+            document = getattr(message, 'document', None)
+            self.args = (message.text or message.caption or (document.file_name if document else '') or '')
+            self.args = self.args[:MAX_ARGS_LENGTH]
+        self.chat_id = update.effective_chat.id if getattr(update, 'effective_chat', None) else None
+        self.user_id = update.effective_user.id if getattr(update, 'effective_user', None) else None
+        self.started = time.perf_counter()
+        self.phases = defaultdict(float)
+        self.active = None
+        self.outcome = 'ok'
+
+    def breakdown(self, duration):
+        phases = {name: self.phases.get(name, 0.0) for name in PHASES}
+        phases['fs'] = max(0.0, duration - sum(phases.values()))
+        return phases
+
+
+def timed(command, handler):
+    def timed_handler(update, context):
+        if getattr(current, 'timer', None) is not None:
+            return handler(update, context)
+        timer = CommandTimer(command, update)
+        current.timer = timer
+        track_in_flight(1)
+        try:
+            entry = take(command) if armed and not getattr(handler, 'deferred', False) else None
+            if entry is not None:
+                return run_profiled(command, entry, handler, update, context)
+            return handler(update, context)
+        except Exception:
+            timer.outcome = 'error'
+            raise
+        finally:
+            current.timer = None
+            track_in_flight(-1)
+            finish(timer)
+    return timed_handler
+
+
+def track_in_flight(delta):
+    global in_flight
+    with lock:
+        in_flight += delta
+
+
+@contextmanager
+def phase(name):
+    timer = getattr(current, 'timer', None)
+    if timer is None or timer.active is not None:
+        yield
+        return
+    timer.active = name
+    phase_started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.phases[name] += time.perf_counter() - phase_started
+        timer.active = None
+
+
+def mark_outcome(outcome):
+    timer = getattr(current, 'timer', None)
+    if timer is not None and timer.outcome == 'ok':
+        timer.outcome = outcome
+
+
+def finish(timer):
+    duration = time.perf_counter() - timer.started
+    breakdown = timer.breakdown(duration)
+    record = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'command': timer.command,
+        'args': timer.args,
+        'chat_id': timer.chat_id,
+        'user_id': timer.user_id,
+        'outcome': timer.outcome,
+        'duration': round(duration, 6),
+        'breakdown': {name: round(seconds, 6) for name, seconds in breakdown.items()},
+    }
+
+    with lock:
+        key = (timer.command, timer.outcome)
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = {'count': 0, 'sum': 0.0, 'buckets': [0] * len(BUCKETS)}
+        histogram['count'] += 1
+        histogram['sum'] += duration
+        for index, bound in enumerate(BUCKETS):
+            if duration <= bound:
+                histogram['buckets'][index] += 1
+        for name, seconds in breakdown.items():
+            phase_totals[(timer.command, name)] += seconds
+        if timer.outcome != 'queued':
+            durations[timer.command].append(duration)
+        if timer.outcome in ('failed', 'error'):
+            failures[timer.command] += 1
+        entry = (duration, next(sequence), record)
+        if len(slowest) < SLOWEST_LIMIT:
+            heapq.heappush(slowest, entry)
+        elif duration > slowest[0][0]:
+            heapq.heapreplace(slowest, entry)
+
+    if duration >= SLOW_COMMAND_THRESHOLD:
+        write_slow_command(record)
+
+
+def write_slow_command(record):
+    logger.warning(f"Slow command {record['command']} took {record['duration']:.2f}s: {record['breakdown']}")
+    if not SLOW_COMMAND_LOG:
+        return
+    try:
+        with slow_log_lock, open(SLOW_COMMAND_LOG, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    except OSError as e:
+        logger.error(f"Error writing slow command log {SLOW_COMMAND_LOG}: {e}")
+
+
+class TimedRequest(Request):
+    def post(self, url, data, timeout=None):
+        if isinstance(data, dict) and str(data.get('text', '')).startswith('Ошибка'):
+            mark_outcome('failed')
+        if isinstance(data, dict) and 'chat_id' in data:
+            wait_for_chat(data['chat_id'])
+        with phase('send'):
+            return super(TimedRequest, self).post(url, data, timeout=timeout)
+
+    def retrieve(self, url, timeout=None):
+        with phase('download'):
+            return super(TimedRequest, self).retrieve(url, timeout=timeout)
+
+
+def register_gauges(prefix, stats, counters=()):
+    gauges[prefix] = (stats, frozenset(counters))
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def command_stats():
+    with lock:
+        samples = {command: sorted(values) for command, values in durations.items() if values}
+        counts = defaultdict(int)
+        for (command, outcome), histogram in histograms.items():
+            counts[command] += histogram['count']
+        return {
+            command: {
+                'count': counts[command],
+                'failed': failures[command],
+                'p50': percentile(values, 0.5),
+                'p99': percentile(values, 0.99),
+                'max': values[-1],
+            }
+            for command, values in samples.items()
+        }
+
+
+def slowest_commands(limit=10):
+    with lock:
+        return [record for _, _, record in sorted(slowest, reverse=True)[:limit]]
+
+
+def label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render():
+    lines = [
+        '# HELP fsbot_command_duration_seconds Time spent handling a bot command.',
+        '# TYPE fsbot_command_duration_seconds histogram',
+    ]
+    with lock:
+        for (command, outcome), histogram in sorted(histograms.items()):
+            labels = f'command="{label(command)}",outcome="{label(outcome)}"'
+            for bound, count in zip(BUCKETS, histogram['buckets']):
+                lines.append(f'fsbot_command_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'fsbot_command_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram["count"]}')
+            lines.append(f'fsbot_command_duration_seconds_sum{{{labels}}} {histogram["sum"]:.6f}')
+            lines.append(f'fsbot_command_duration_seconds_count{{{labels}}} {histogram["count"]}')
+        lines.append('# HELP fsbot_command_phase_seconds_total Command time spent in fs, metadata, send and download.')
+        lines.append('# TYPE fsbot_command_phase_seconds_total counter')
+        for (command, name), seconds in sorted(phase_totals.items()):
+            labels = f'command="{label(command)}",phase="{name}"'
+            lines.append(f'fsbot_command_phase_seconds_total{{{labels}}} {seconds:.6f}')
+        lines.append('# HELP fsbot_commands_in_flight Commands being handled right now.')
+        lines.append('# TYPE fsbot_commands_in_flight gauge')
+        lines.append(f'fsbot_commands_in_flight {in_flight}')
+
+    for prefix, (stats, counters) in sorted(gauges.items()):
+        try:
+            values = stats()
+        except Exception as e:
+            logger.error(f"Error collecting {prefix} metrics: {e}")
+            continue
+        for key, value in sorted(values.items()):
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                continue
+            if key in counters:
+                lines.append(f'# TYPE fsbot_{prefix}_{key}_total counter')
+                lines.append(f'fsbot_{prefix}_{key}_total {value}')
+            else:
+                lines.append(f'# TYPE fsbot_{prefix}_{key} gauge')
+                lines.append(f'fsbot_{prefix}_{key} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_metrics():
+    if not METRICS_FILE:
+        return
+    temp_path = f"{METRICS_FILE}.tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(render())
+        os.replace(temp_path, METRICS_FILE)
+    except OSError as e:
+        logger.error(f"Error writing metrics to {METRICS_FILE}: {e}")
+
+
+class MetricsFileWriter(threading.Thread):
+    def __init__(self, interval=METRICS_INTERVAL):
+        super(MetricsFileWriter, self).__init__(daemon=True)
+        self.interval = interval
+
+    def run(self):
+        while True:
+            write_metrics()
+            time.sleep(self.interval)
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        data = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics():
+    if METRICS_FILE:
+        writer = MetricsFileWriter()
+        writer.start()
+        exporters.append(writer)
+        logger.info(f"Writing metrics to {METRICS_FILE} every {METRICS_INTERVAL:g}s")
+    if METRICS_PORT:
+        server = ThreadingHTTPServer((METRICS_LISTEN, METRICS_PORT), MetricsRequestHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        exporters.append(server)
+        logger.info(f"Serving metrics on http://{METRICS_LISTEN}:{METRICS_PORT}/metrics")
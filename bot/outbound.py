@@ -0,0 +1,243 @@
+import gzip
+import io
+import threading
+import time
+from collections import deque
+
+from telegram.error import RetryAfter, TimedOut, NetworkError, TelegramError
+
+from config import logger, OUTBOUND_CHAT_INTERVAL, OUTBOUND_GLOBAL_RATE
+
+MAX_MESSAGE_LENGTH = 4096 - 10
+MAX_ATTEMPTS = 3
+ORDER_TIMEOUT = 30
+
+outbound = None
+outbound_lock = threading.Lock()
+
+
+class OutboundQueue(threading.Thread):
+    def __init__(self, chat_interval=OUTBOUND_CHAT_INTERVAL, global_rate=OUTBOUND_GLOBAL_RATE):
+        super(OutboundQueue, self).__init__(daemon=True)
+        self.chat_interval = chat_interval
+        self.global_rate = global_rate
+        self.chats = {}
+        self.next_allowed = {}
+        self.global_sent = deque()
+        self.condition = threading.Condition()
+        self.sent = 0
+        self.retries = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=1000)
+        self.delivering = None
+
+    def put(self, item):
+        item.setdefault('enqueued', time.monotonic())
+        item.setdefault('attempts', 0)
+        with self.condition:
+            self.chats.setdefault(item['chat_id'], deque()).append(item)
+            self.condition.notify_all()
+
+    def run(self):
+        while True:
+            with self.condition:
+                item, delay = self.next_item()
+                if item is None:
+                    self.condition.wait(delay)
+                    continue
+                self.delivering = item['chat_id']
+            try:
+                self.deliver(item)
+            finally:
+                with self.condition:
+                    self.delivering = None
+                    self.condition.notify_all()
+
+    def expire(self, now):
+        while self.global_sent and now - self.global_sent[0] >= 1:
+            self.global_sent.popleft()
+        for chat_id in [chat_id for chat_id, ready_at in self.next_allowed.items()
+                        if ready_at <= now and chat_id not in self.chats]:
+            del self.next_allowed[chat_id]
+
+    def next_item(self):
+        now = time.monotonic()
+        self.expire(now)
+        if len(self.global_sent) >= self.global_rate:
+            return None, 1 - (now - self.global_sent[0])
+
+        chat_id = min(self.chats, key=lambda chat: self.next_allowed.get(chat, 0), default=None)
+        if chat_id is None:
+            return None, None
+        ready_at = self.next_allowed.get(chat_id, 0)
+        if ready_at > now:
+            return None, ready_at - now
+
+        queue = self.chats[chat_id]
+        item = queue.popleft()
+        while (item['kind'] == 'chunk' and queue and queue[0]['kind'] == 'chunk'
+               and len(item['text']) + len(queue[0]['text']) + 1 <= MAX_MESSAGE_LENGTH):
+            item['text'] += '\n' + queue.popleft()['text']
+        if not queue:
+            del self.chats[chat_id]
+
+        self.next_allowed[chat_id] = now + self.chat_interval
+        self.global_sent.append(now)
+        return item, None
+
+    def requeue(self, item, delay):
+        with self.condition:
+            self.chats.setdefault(item['chat_id'], deque()).appendleft(item)
+            self.next_allowed[item['chat_id']] = time.monotonic() + delay
+            self.condition.notify_all()
+
+    def deliver(self, item):
+        item['attempts'] += 1
+        try:
+            self.send(item)
+        except RetryAfter as e:
+            self.retries += 1
+            logger.warning(f"Flood limit for chat {item['chat_id']}, retrying in {e.retry_after}s")
+            self.requeue(item, e.retry_after)
+            return
+        except (TimedOut, NetworkError) as e:
+            if item['attempts'] < MAX_ATTEMPTS:
+                self.retries += 1
+                self.requeue(item, self.chat_interval * item['attempts'])
+                return
+            self.errors += 1
+            logger.error(f"Error sending message to chat {item['chat_id']}: {e}")
+            return
+        except TelegramError as e:
+            self.errors += 1
+            logger.error(f"Error sending message to chat {item['chat_id']}: {e}")
+            return
+
+        self.sent += 1
+        self.latencies.append(time.monotonic() - item['enqueued'])
+
+    def send(self, item):
+        bot = item['bot']
+        if item['kind'] == 'chunk':
+            bot.send_message(item['chat_id'], f"```\n{item['text']}\n```", parse_mode='MarkdownV2',
+                             reply_to_message_id=item['reply_to'])
+        elif item['kind'] == 'document':
+            bot.send_document(item['chat_id'], document=io.BytesIO(item['data']), filename=item['filename'],
+                              caption=item.get('caption'), reply_to_message_id=item['reply_to'])
+        else:
+            bot.send_message(item['chat_id'], item['text'], reply_to_message_id=item['reply_to'])
+
+    def reserve(self, chat_id):
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                self.expire(now)
+                if chat_id in self.chats or self.delivering == chat_id:
+                    self.condition.wait()
+                    continue
+                delay = self.next_allowed.get(chat_id, 0) - now
+                if len(self.global_sent) >= self.global_rate:
+                    delay = max(delay, 1 - (now - self.global_sent[0]))
+                if delay <= 0:
+                    self.next_allowed[chat_id] = now + self.chat_interval
+                    self.global_sent.append(now)
+                    return
+                self.condition.wait(delay)
+
+    def defer(self, chat_id, delay):
+        with self.condition:
+            self.next_allowed[chat_id] = max(self.next_allowed.get(chat_id, 0), time.monotonic() + delay)
+            self.condition.notify_all()
+
+    def drain(self, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self.condition:
+                if not self.chats and self.delivering is None:
+                    return True
+            time.sleep(0.1)
+        return False
+
+    def wait_for_chat(self, chat_id, timeout):
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while chat_id in self.chats or self.delivering == chat_id:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def stats(self):
+        with self.condition:
+            depth = {chat_id: len(queue) for chat_id, queue in self.chats.items()}
+            latencies = sorted(self.latencies)
+        return {
+            'queue_depth': sum(depth.values()),
+            'chat_queue_depth': depth,
+            'sent': self.sent,
+            'retries': self.retries,
+            'errors': self.errors,
+            'send_latency_p50': latencies[len(latencies) // 2] if latencies else None,
+            'send_latency_max': latencies[-1] if latencies else None,
+        }
+
+
+def get_outbound():
+    global outbound
+    with outbound_lock:
+        if outbound is None:
+            outbound = OutboundQueue()
+            outbound.start()
+        return outbound
+
+
+def reply_target(update):
+    message = update.message
+    return dict(bot=message.bot, chat_id=message.chat_id,
+                reply_to=None if message.chat.type == 'private' else message.message_id)
+
+
+def enqueue_chunk(update, text):
+    get_outbound().put(dict(reply_target(update), kind='chunk', text=text))
+
+
+def enqueue_text(update, text):
+    get_outbound().put(dict(reply_target(update), kind='text', text=text))
+
+
+def enqueue_lines_document(update, lines, filename='output.txt', caption=None):
+    buffer = io.BytesIO()
+    with gzip.GzipFile(filename=filename, mode='wb', fileobj=buffer) as archive:
+        for line in lines:
+            archive.write(line.encode('utf-8') + b'\n')
+    get_outbound().put(dict(reply_target(update), kind='document', data=buffer.getvalue(),
+                            filename=f"{filename}.gz", caption=caption))
+
+
+def outbound_stats():
+    if outbound is None:
+        return {'queue_depth': 0, 'chat_queue_depth': {}, 'sent': 0, 'retries': 0, 'errors': 0,
+                'send_latency_p50': None, 'send_latency_max': None}
+    return outbound.stats()
+
+
+def reserve_send(chat_id):
+    get_outbound().reserve(chat_id)
+
+
+def defer_send(chat_id, delay):
+    get_outbound().defer(chat_id, delay)
+
+
+def wait_for_chat(chat_id, timeout=ORDER_TIMEOUT):
+    current = threading.current_thread()
+    if outbound is None or current is outbound or current.name.endswith(':dispatcher'):
+        return
+    if not outbound.wait_for_chat(chat_id, timeout):
+        logger.warning(f"Sending to chat {chat_id} ahead of queued messages after waiting {timeout}s")
+
+
+def drain_outbound(timeout):
+    if outbound is not None and not outbound.drain(timeout):
+        logger.warning("Shutting down with outbound messages still queued")
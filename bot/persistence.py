@@ -0,0 +1,108 @@
+import threading
+import time
+
+from config import logger, PERSIST_DEBOUNCE_WINDOW
+from bot.collect_metadata import save_metadata_to_storage
+from bot.listing import invalidate
+from bot.metrics import phase
+from bot.metadata_watcher import find_watcher
+
+scheduler = None
+scheduler_lock = threading.Lock()
+
+
+class PersistenceScheduler(threading.Thread):
+    def __init__(self, window=PERSIST_DEBOUNCE_WINDOW):
+        super(PersistenceScheduler, self).__init__(daemon=True)
+        self.window = window
+        self.pending = {}
+        self.condition = threading.Condition()
+        self.save_lock = threading.Lock()
+        self.requests = 0
+        self.saves = 0
+        self.last_flush_latency = None
+        self.last_flush_at = None
+
+    def mark_dirty(self, directory, metadata_path, data_path):
+        with self.condition:
+            self.requests += 1
+            if directory not in self.pending:
+                self.pending[directory] = (metadata_path, data_path, time.time())
+                self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                deadline = min(marked_at for _, _, marked_at in self.pending.values()) + self.window
+                delay = deadline - time.time()
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+            self.save_due()
+
+    def take(self, due_before=None):
+        with self.condition:
+            directories = [directory for directory, (_, _, marked_at) in self.pending.items()
+                           if due_before is None or marked_at + self.window <= due_before]
+            return [(directory,) + self.pending.pop(directory)[:2] for directory in directories]
+
+    def save_due(self):
+        with self.save_lock:
+            self.save(self.take(time.time()))
+
+    def flush(self):
+        with self.save_lock:
+            self.save(self.take())
+
+    def save(self, jobs):
+        for directory, metadata_path, data_path in jobs:
+            started = time.perf_counter()
+            try:
+                save_metadata_to_storage(directory, metadata_path, data_path)
+            except Exception as e:
+                logger.error(f"Error persisting metadata for {directory}: {e}")
+            self.last_flush_latency = time.perf_counter() - started
+            self.last_flush_at = time.time()
+            self.saves += 1
+            logger.info(f"Metadata for {directory} persisted in {self.last_flush_latency:.3f}s "
+                        f"({self.requests} requests coalesced into {self.saves} saves)")
+
+    def stats(self):
+        with self.condition:
+            return {
+                'queue_depth': len(self.pending),
+                'requests': self.requests,
+                'saves': self.saves,
+                'last_flush_latency': self.last_flush_latency,
+                'last_flush_at': self.last_flush_at,
+            }
+
+
+def get_scheduler():
+    global scheduler
+    with scheduler_lock:
+        if scheduler is None:
+            scheduler = PersistenceScheduler()
+            scheduler.start()
+        return scheduler
+
+
+def metadata_changed(directory, metadata_path, data_path):
+    if find_watcher(directory) is not None:
+        return
+    with phase('metadata'):
+        invalidate(directory, recursive=True)
+        get_scheduler().mark_dirty(directory, metadata_path, data_path)
+
+
+def flush_metadata():
+    if scheduler is not None:
+        scheduler.flush()
+
+
+def persistence_stats():
+    if scheduler is None:
+        return {'queue_depth': 0, 'requests': 0, 'saves': 0, 'last_flush_latency': None, 'last_flush_at': None}
+    return scheduler.stats()
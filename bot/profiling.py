@@ -0,0 +1,126 @@
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+from config import logger, PROFILE_DIR, PROFILE_COMMANDS
+from bot.outbound import get_outbound
+
+SUMMARY_FUNCTIONS = 20
+SUMMARY_ALLOCATIONS = 10
+TRACEMALLOC_FRAMES = 25
+
+
+def parse_commands(value):
+    commands = {}
+    for item in value.replace(',', ' ').split():
+        command, _, count = item.partition(':')
+        commands['/' + command.lstrip('/')] = int(count or 1)
+    return commands
+
+
+lock = threading.Lock()
+armed = {command: {'remaining': count, 'bot': None, 'chat_id': None}
+         for command, count in parse_commands(PROFILE_COMMANDS).items()}
+sequence = itertools.count(1)
+tracing = 0
+
+
+def arm(command, count, bot=None, chat_id=None):
+    with lock:
+        armed[command] = {'remaining': count, 'bot': bot, 'chat_id': chat_id}
+    logger.info(f"Profiling armed for the next {count} dispatches of {command}")
+
+
+def disarm(command=None):
+    with lock:
+        if command is None:
+            armed.clear()
+        else:
+            armed.pop(command, None)
+
+
+def armed_commands():
+    with lock:
+        return {command: entry['remaining'] for command, entry in armed.items()}
+
+
+def take(command):
+    with lock:
+        entry = armed.get(command)
+        if entry is None:
+            return None
+        entry['remaining'] -= 1
+        if entry['remaining'] <= 0:
+            del armed[command]
+        return entry
+
+
+def start_tracing():
+    global tracing
+    with lock:
+        if tracing == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            tracing = 1
+        elif tracing:
+            tracing += 1
+
+
+def stop_tracing():
+    global tracing
+    with lock:
+        if tracing:
+            tracing -= 1
+            if tracing == 0:
+                tracemalloc.stop()
+
+
+def run_profiled(command, entry, handler, update, context):
+    profile = cProfile.Profile()
+    start_tracing()
+    tracemalloc.reset_peak()
+    started = time.perf_counter()
+    try:
+        return profile.runcall(handler, update, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        stop_tracing()
+        try:
+            save_profile(command, entry, profile, snapshot, elapsed, peak)
+        except Exception as e:
+            logger.error(f"Error saving profile of {command}: {e}")
+
+
+def save_profile(command, entry, profile, snapshot, elapsed, peak):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = command.strip('/').replace('/', '_').replace(':', '_') or 'command'
+    base_path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{next(sequence)}")
+    profile.dump_stats(base_path + '.pstats')
+    if snapshot is not None:
+        snapshot.dump(base_path + '.tracemalloc')
+    logger.info(f"Profile of {command} ({elapsed:.3f}s, peak {peak} bytes) saved to {base_path}.pstats")
+
+    if entry['bot'] is not None and entry['chat_id'] is not None:
+        summary = profile_summary(command, profile, snapshot, elapsed, peak)
+        get_outbound().put(dict(bot=entry['bot'], chat_id=entry['chat_id'], reply_to=None, kind='document',
+                                data=summary.encode('utf-8'), filename=f"{os.path.basename(base_path)}.txt",
+                                caption=f"Профиль {command}: {elapsed:.2f} с, пик памяти {peak / 1024 / 1024:.1f} МиБ"))
+
+
+def profile_summary(command, profile, snapshot, elapsed, peak):
+    output = io.StringIO()
+    output.write(f"{command}: {elapsed:.3f}s, peak traced memory {peak} bytes\n\n")
+    stats = pstats.Stats(profile, stream=output)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(SUMMARY_FUNCTIONS)
+    if snapshot is not None:
+        output.write(f"\nTop {SUMMARY_ALLOCATIONS} allocation sites:\n")
+        for statistic in snapshot.statistics('lineno')[:SUMMARY_ALLOCATIONS]:
+            output.write(f"{statistic}\n")
+    return output.getvalue()
+
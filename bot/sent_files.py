@@ -0,0 +1,107 @@
+import os
+from functools import partial
+
+from telegram import InputMediaDocument
+from telegram.error import BadRequest, RetryAfter, TimedOut, NetworkError
+
+from config import logger
+from bot.metadata_store import get_sent_file_cache
+from bot.outbound import defer_send, reserve_send
+
+MEDIA_GROUP_SIZE = 10
+MAX_ATTEMPTS = 3
+
+
+def remember_file_id(storage_path, path, file_id):
+    try:
+        file_stat = os.stat(path)
+    except OSError:
+        return
+    get_sent_file_cache(storage_path).put(os.path.abspath(path), file_stat.st_size, file_stat.st_mtime_ns, file_id)
+
+
+def send_document(update, storage_path, path, limited=False):
+    reply_document = update.message.reply_document
+    if limited:
+        reply_document = partial(call_with_retry, update.message.chat_id, reply_document)
+    path = os.path.abspath(path)
+    file_stat = os.stat(path)
+    cache = get_sent_file_cache(storage_path)
+    file_id = cache.get(path, file_stat.st_size, file_stat.st_mtime_ns)
+    if file_id is not None:
+        try:
+            return reply_document(document=file_id)
+        except BadRequest as e:
+            logger.warning(f"Cached file_id for {path} was rejected, uploading again: {e}")
+            cache.discard(path)
+
+    with open(path, 'rb') as file:
+        message = reply_document(document=file)
+    if message.document is not None:
+        cache.put(path, file_stat.st_size, file_stat.st_mtime_ns, message.document.file_id)
+    return message
+
+
+def call_with_retry(chat_id, method, *args, **kwargs):
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        reserve_send(chat_id)
+        try:
+            return method(*args, **kwargs)
+        except RetryAfter as e:
+            if attempt == MAX_ATTEMPTS:
+                raise
+            logger.warning(f"Flood limit while sending files, retrying in {e.retry_after}s")
+            defer_send(chat_id, e.retry_after)
+        except (TimedOut, NetworkError):
+            if attempt == MAX_ATTEMPTS:
+                raise
+            defer_send(chat_id, attempt)
+
+
+def send_media_group(update, storage_path, paths, use_cache=True):
+    paths = [os.path.abspath(path) for path in paths]
+    if len(paths) == 1:
+        return [send_document(update, storage_path, paths[0], limited=True)]
+
+    cache = get_sent_file_cache(storage_path)
+    stats = [os.stat(path) for path in paths]
+    files = []
+    media = []
+    cached = False
+    try:
+        for path, file_stat in zip(paths, stats):
+            file_id = cache.get(path, file_stat.st_size, file_stat.st_mtime_ns) if use_cache else None
+            if file_id is None:
+                file = open(path, 'rb')
+                files.append(file)
+                media.append(InputMediaDocument(file, filename=os.path.basename(path)))
+            else:
+                cached = True
+                media.append(InputMediaDocument(file_id))
+        messages = call_with_retry(update.message.chat_id, update.message.reply_media_group, media=media)
+    except BadRequest as e:
+        if not cached:
+            raise
+        logger.warning(f"Cached file_id rejected in media group, uploading again: {e}")
+        for path in paths:
+            cache.discard(path)
+        return send_media_group(update, storage_path, paths, use_cache=False)
+    finally:
+        for file in files:
+            file.close()
+
+    for path, file_stat, message in zip(paths, stats, messages):
+        if message.document is not None:
+            cache.put(path, file_stat.st_size, file_stat.st_mtime_ns, message.document.file_id)
+    return messages
+
+
+def send_media_groups(update, storage_path, paths, progress=None):
+    sent = 0
+    for start in range(0, len(paths), MEDIA_GROUP_SIZE):
+        group = paths[start:start + MEDIA_GROUP_SIZE]
+        send_media_group(update, storage_path, group)
+        sent += len(group)
+        if progress is not None:
+            progress(sent)
+    return sent
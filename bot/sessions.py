@@ -0,0 +1,87 @@
+import threading
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+import config
+from config import logger
+
+sessions = {}
+sessions_lock = threading.Lock()
+pinned = threading.local()
+pending = {}
+pending_lock = threading.Lock()
+
+
+class Session:
+    def __init__(self):
+        self.mount_point = None
+        self.lock = threading.Lock()
+
+    def current(self):
+        with self.lock:
+            return config.MOUNT_POINT if self.mount_point is None else self.mount_point
+
+    def change(self, mount_point):
+        with self.lock:
+            self.mount_point = mount_point
+
+    def reset(self):
+        with self.lock:
+            previous, self.mount_point = self.mount_point, None
+            return previous
+
+
+def session_key(update):
+    return update.effective_chat.id, update.effective_user.id
+
+
+def get_session(update):
+    key = session_key(update)
+    with sessions_lock:
+        session = sessions.get(key)
+        if session is None:
+            session = Session()
+            sessions[key] = session
+        return session
+
+
+def session_mount(update):
+    mount_point = getattr(pinned, 'mount_point', None)
+    if mount_point is not None:
+        return mount_point
+    return get_session(update).current()
+
+
+@contextmanager
+def pinned_mount(mount_point):
+    previous = getattr(pinned, 'mount_point', None)
+    pinned.mount_point = mount_point
+    try:
+        yield
+    finally:
+        pinned.mount_point = previous
+
+
+def serialized(callback):
+    @wraps(callback)
+    def wrapper(update, context):
+        key = session_key(update)
+        with pending_lock:
+            queue = pending.get(key)
+            if queue is not None:
+                queue.append((update, context))
+                return
+            queue = pending[key] = deque()
+        while True:
+            try:
+                callback(update, context)
+            except Exception as e:
+                logger.error(f"Error handling update for session {key}: {e}")
+            with pending_lock:
+                if not queue:
+                    del pending[key]
+                    return
+                update, context = queue.popleft()
+
+    return wrapper
@@ -1,34 +1,55 @@
 import grp
+import io
 import os
 import pwd
 import shutil
 import subprocess
-import tarfile
-import tempfile
 import threading
 import re
-import yaml
+import uuid
 from functools import partial
+from itertools import chain
 
-from telegram import Update, MessageEntity, Bot
+from telegram import Update, MessageEntity, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import CallbackContext, ConversationHandler
 
 import config
+from bot.archive_stream import FORMATS, PartWriter, directory_signature, write_archive, write_files_archive
 from bot.archivator import untar_file, unzip_file, delete_file_from_zip, delete_file_from_tar, delete_file_from_archive
+from bot.batch_save import SaveBatch
 from bot.converter import create_empty_jpg, convert_png_to_jpg
-from bot.collect_metadata import save_metadata_to_storage, get_ctime, get_mtime
-from bot.custom_fs_utils import custom_start_fuse, custom_unmount_fs
+from bot.dedup import fetch_file, forget_path, move_path
+from bot.downloads import download_file
+from bot.collect_metadata import get_ctime, get_mtime, format_timestamp
+from bot.custom_fs_utils import custom_start_fuse, custom_unmount_fs, custom_check_mount
 from bot.custom_listing_utils import parse_directory_listing
-from config import logger, TOKEN, STORAGE_PATH, BACKUP_FILE, CUSTOM_STORAGE_PATH, CUSTOM_BACKUP_FILE
-from fs_utils import unmount_fs, start_fuse
-from mutagen.easyid3 import EasyID3
-from mutagen.id3 import error
+from bot.jobs import JobCancelled, submit_job, report_progress, cancel_job, list_jobs, jobs_stats
+from bot.listing import GLOB_CHARS, files_cursor, files_page, glob_files, iter_tree
+from bot.metadata_store import get_store, get_sent_file_cache
+from bot.metadata_watcher import start_watcher, stop_watcher
+from bot.metrics import timed, mark_outcome, command_stats, slowest_commands
+from bot.outbound import MAX_MESSAGE_LENGTH, enqueue_chunk, enqueue_text, enqueue_lines_document
+from bot.persistence import metadata_changed
+from bot.profiling import arm, disarm, armed_commands
+from bot.sent_files import send_document, send_media_groups, remember_file_id, call_with_retry
+from bot.sessions import get_session, session_mount, pinned_mount
+from bot.trash import in_trash, move_to_trash, recover_trash, restore_from_trash, trash_stats
+from config import logger, STORAGE_PATH, BACKUP_FILE, CUSTOM_STORAGE_PATH, CUSTOM_BACKUP_FILE, LS_PAGE_SIZE, \
+    OUTBOUND_DOCUMENT_THRESHOLD, GET_ARCHIVE_THRESHOLD, GETDIR_PART_SIZE, GETDIR_COMPRESS_WORKERS, \
+    ADMIN_IDS, SLOW_COMMAND_THRESHOLD, PROFILE_DIR, TRASH_DIR, TRASH_UNDO_WINDOW
+from fs_utils import unmount_fs, start_fuse, check_mount
 
 fuse_stopped = False
 custom_fuse_stopped = False
 custom_mount_point = ''
 custom_config_path = ''
 
+LS_PAGE_CHARS = MAX_MESSAGE_LENGTH // 2
+LS_LISTINGS_LIMIT = 20
+JOB_QUEUE_FULL_MESSAGE = ("Ошибка: слишком много задач в очереди. Дождитесь завершения текущих "
+                          "или отмените их командой /jobs cancel <номер>.")
+
 
 def help_command(update: Update, context):
     if '-b' in update.message.text:
@@ -41,15 +62,20 @@ def help_command(update: Update, context):
             "/stop - остановка ФС",
             "/mkdir <dir> - создание директории",
             "/save <dir> - отправка файла на сервер",
+            "/save -b <dir> - отправка нескольких файлов или альбома, завершение по /done",
             "/get <file> - получение файла от сервера",
+            "/get <file> <file> ... - получение нескольких файлов, поддерживаются шаблоны (*.jpg)",
             "/cp <src> <dst> - копирование файла или директории ",
             "/mv <src> <dst> - перемещение файла или директории",
             "/cd <dir> - переход к директории",
             "/returnmount - возврат к примонтированной директории",
             "/ls <dir> - листинг с тегами",
-            "/trls <dir> - листинг деревом",
+            "/trls [--depth N] [--dirs-only] <dir> - листинг деревом",
             "/rm <file | dir> - удаление файла или директории",
+            "/undo [N] - восстановление удаленного через /rm",
+            "/df - свободное место с учетом ожидающих удаления",
             "/getdir <dir> - получении директории от сервера",
+            "/getdir --gz|--xz|--zip <dir> - получение директории в сжатом архиве",
             "/ctime' <file | dir> - время создания файла или директории",
             "/mtime <file | dir> - время изменения файла или директории",
             "/group <srs> <dir> - группировка mp3",
@@ -61,7 +87,12 @@ def help_command(update: Update, context):
             "/c_stop - отключение кастомной ФС",
             "/c_ls <dir> - листинг кастомной ФС",
             "/c_save <dir> - отправка файла на кастомную ФС сервера",
-            "/c_get <file> - получение файла из кастомной ФС сервера"
+            "/c_get <file> - получение файла из кастомной ФС сервера",
+            "/jobs - список ваших задач",
+            "/jobs cancel <id> - отмена задачи",
+            "/stats - самые медленные команды (для администраторов)",
+            "/profile [--send] <command> [N] - профилирование следующих N вызовов команды (для администраторов)",
+            "/profile off [command] - отмена профилирования"
         ]
         update.message.reply_text("\n".join(commands))
         return ConversationHandler.END
@@ -85,14 +116,26 @@ def escape_markdown(text: str) -> str:
 
 
 def split_and_send_message(update, message):
-    MAX_MESSAGE_LENGTH = 4096 - 10
-    escaped_message = escape_markdown(message)
-    lines = escaped_message.split('\n')
+    send_lines(update, message.split('\n'))
 
-    current_message = ""
+
+def send_lines(update, lines):
+    lines = iter(lines)
+    buffered = []
+    buffered_size = 0
     for line in lines:
+        buffered.append(line)
+        buffered_size += len(line) + 1
+        if buffered_size > OUTBOUND_DOCUMENT_THRESHOLD:
+            enqueue_lines_document(update, chain(buffered, lines),
+                                   caption='Вывод слишком большой, поэтому отправлен файлом.')
+            return
+
+    current_message = ""
+    for line in buffered:
+        line = escape_markdown(line)
         if len(current_message) + len(line) + 1 > MAX_MESSAGE_LENGTH:
-            update.message.reply_text(f"```\n{current_message}\n```", parse_mode='MarkdownV2')
+            enqueue_chunk(update, current_message)
             current_message = line
         else:
             if current_message:
@@ -100,19 +143,121 @@ def split_and_send_message(update, message):
             current_message += line
 
     if current_message:
-        update.message.reply_text(f"```\n{current_message}\n```", parse_mode='MarkdownV2')
+        enqueue_chunk(update, current_message)
 
 
-def check_mention(update, context) -> bool:
-    if 'bot_username' not in context.user_data:
-        context.user_data['bot_username'] = "@" + Bot(TOKEN).get_me().username
+def bot_mention(context):
+    return f"@{context.bot.username}"
 
-    bot_username = context.user_data['bot_username']
+
+def check_mention(update, context) -> bool:
+    bot_username = bot_mention(context)
     entities = update.message.parse_entities([MessageEntity.MENTION]).values()
 
     return bot_username in entities
 
 
+def run_as_job(name, handler):
+    def job_handler(update, context):
+        mount_point = session_mount(update)
+
+        def pinned_handler(update, context):
+            with pinned_mount(mount_point):
+                return handler(update, context)
+
+        if submit_job(update, context, name, timed(f"/{name}", pinned_handler)) is None:
+            update.message.reply_text(JOB_QUEUE_FULL_MESSAGE)
+        else:
+            mark_outcome('queued')
+        return ConversationHandler.END
+    job_handler.deferred = True
+    return job_handler
+
+
+def jobs_command(update, context):
+    user_id = update.message.from_user.id
+    match = re.search(r'/jobs\s+cancel\s+#?(\d+)', update.message.text)
+    if match:
+        job_id = int(match.group(1))
+        if cancel_job(job_id, user_id):
+            update.message.reply_text(f"Задача #{job_id} будет отменена.")
+        else:
+            update.message.reply_text(f"Ошибка: активная задача #{job_id} не найдена.")
+        return ConversationHandler.END
+
+    jobs = list_jobs(user_id)
+    if not jobs:
+        update.message.reply_text("У вас нет задач.")
+    else:
+        lines = [job.describe() for job in jobs]
+        stats = jobs_stats().get(user_id)
+        if stats is not None:
+            lines.append(f"В очереди: {stats['queued']}, выполняется: {stats['running']}, "
+                         f"ожидание: {stats['oldest_wait']:.0f} с")
+            if stats['average_wait'] is not None:
+                lines.append(f"Среднее ожидание запуска: {stats['average_wait']:.1f} с")
+        split_and_send_message(update, "\n".join(lines))
+    return ConversationHandler.END
+
+
+def stats_command(update, context):
+    if update.message.from_user.id not in ADMIN_IDS:
+        update.message.reply_text("Ошибка: команда доступна только администраторам.")
+        return ConversationHandler.END
+
+    stats = command_stats()
+    if not stats:
+        update.message.reply_text("Статистика команд пока пуста.")
+        return ConversationHandler.END
+
+    lines = ["Команды по p99:"]
+    for command, item in sorted(stats.items(), key=lambda item: -item[1]['p99'])[:10]:
+        lines.append(f"{command}: {item['count']} вызовов, ошибок {item['failed']}, p50 {item['p50']:.2f} с, "
+                     f"p99 {item['p99']:.2f} с, максимум {item['max']:.2f} с")
+
+    lines.append("")
+    lines.append(f"Самые медленные вызовы (в журнал пишутся дольше {SLOW_COMMAND_THRESHOLD:g} с):")
+    for record in slowest_commands(10):
+        breakdown = ", ".join(f"{name} {seconds:.2f}" for name, seconds in record['breakdown'].items() if seconds)
+        lines.append(f"{record['duration']:.2f} с [{record['outcome']}] {record['args'][:80]} ({breakdown})")
+    split_and_send_message(update, "\n".join(lines))
+    return ConversationHandler.END
+
+
+def profile_command(update, context):
+    if update.message.from_user.id not in ADMIN_IDS:
+        update.message.reply_text("Ошибка: команда доступна только администраторам.")
+        return ConversationHandler.END
+
+    match = re.search(r'/profile(?:@\S+)?(?:\s+(off))?(?:\s+(--send))?(?:\s+/?(\S+))?(?:\s+(\d+))?\s*$',
+                      update.message.text)
+    if not match:
+        update.message.reply_text("Ошибка: используйте /profile [--send] <command> [N] или /profile off [command].")
+        return ConversationHandler.END
+
+    off, send, command, count = match.groups()
+    command = f"/{command}" if command else None
+    if off:
+        disarm(command)
+        update.message.reply_text(f"Профилирование {command or 'всех команд'} отключено.")
+    elif command:
+        count = int(count or 1)
+        if send:
+            arm(command, count, context.bot, update.message.chat_id)
+        else:
+            arm(command, count)
+        update.message.reply_text(f"Следующие {count} вызовов {command} будут профилированы, "
+                                  f"результаты сохраняются в {PROFILE_DIR}.")
+    else:
+        commands = armed_commands()
+        if commands:
+            update.message.reply_text("\n".join(f"{command}: осталось {remaining}"
+                                                for command, remaining in commands.items()))
+        else:
+            update.message.reply_text("Профилирование не включено.")
+    return ConversationHandler.END
+
+
 def handle_private(update, context):
     message_text = update.message.text.split()[0]
     command_mapping = {
@@ -123,15 +268,17 @@ def handle_private(update, context):
         '/ls': list_files,
         '/trls': tree_list_files,
         '/rm': remove,
-        '/cp': cp,
+        '/undo': undo_command,
+        '/df': df_command,
+        '/cp': run_as_job('cp', cp),
         '/get': get_document,
-        '/getdir': get_directory,
+        '/getdir': run_as_job('getdir', get_directory),
         '/ctime': ctime_command,
         '/mtime': mtime_command,
         '/cd': set_mount_dir,
         '/returnmount': revert_mount_dir,
-        '/archget': get_archive,
-        '/group': group_files,
+        '/archget': run_as_job('archget', get_archive),
+        '/group': run_as_job('group', group_files),
         '/ungroup': rm_group,
         '/c_start': custom_start_command,
         '/c_stop': custom_stop_command,
@@ -139,12 +286,15 @@ def handle_private(update, context):
         '/c_get': custom_get_document,
         '/help': help_command,
         '/finfo': file_info,
-        '/archdel': archive_file_deliter,
+        '/archdel': run_as_job('archdel', archive_file_deliter),
+        '/jobs': jobs_command,
+        '/stats': stats_command,
+        '/profile': profile_command,
     }
 
     command_function = command_mapping.get(message_text)
     if command_function:
-        command_function(update, context)
+        timed(message_text, command_function)(update, context)
     else:
         update.message.reply_text('неверная команда. Для получения списка доступных команд введите /help')
 
@@ -165,15 +315,17 @@ def handle_mention(update, context):
                 '/ls': list_files,
                 '/trls': tree_list_files,
                 '/rm': remove,
-                '/cp': cp,
+                '/undo': undo_command,
+                '/df': df_command,
+                '/cp': run_as_job('cp', cp),
                 '/get': get_document,
-                '/getdir': get_directory,
+                '/getdir': run_as_job('getdir', get_directory),
                 '/ctime': ctime_command,
                 '/mtime': mtime_command,
                 '/cd': set_mount_dir,
                 '/returnmount': revert_mount_dir,
-                '/archget': get_archive,
-                '/group': group_files,
+                '/archget': run_as_job('archget', get_archive),
+                '/group': run_as_job('group', group_files),
                 '/ungroup': rm_group,
                 '/c_start': custom_start_command,
                 '/c_stop': custom_stop_command,
@@ -181,18 +333,23 @@ def handle_mention(update, context):
                 '/c_get': custom_get_document,
                 '/help': help_command,
                 '/finfo': file_info,
-                '/archdel': archive_file_deliter,
+                '/archdel': run_as_job('archdel', archive_file_deliter),
+                '/jobs': jobs_command,
+                '/stats': stats_command,
+                '/profile': profile_command,
             }
 
             command_function = command_mapping.get(command)
             if command_function:
-                command_function(update, context)
+                timed(command, command_function)(update, context)
 
 
 def file_info(update, context):
     if check_fuse(update) is ConversationHandler.END:
         return ConversationHandler.END
 
+    mount_point = session_mount(update)
+
     message_text = update.message.text
     match = re.search(r'/finfo\s+(?:"([^"]+)"|(\S+))', message_text)
     if not match:
@@ -204,7 +361,7 @@ def file_info(update, context):
         update.message.reply_text("Ошибка: используйте /finfo <file | dir>.")
         return ConversationHandler.END
 
-    full_path = os.path.join(config.MOUNT_POINT, relative_path)
+    full_path = os.path.join(mount_point, relative_path)
 
     if not os.path.exists(full_path):
         update.message.reply_text("Ошибка: файл или директория не существует.")
@@ -228,6 +385,13 @@ def file_info(update, context):
             f"Права доступа: {file_permissions_octal}\n"
         )
 
+        entry = get_store(STORAGE_PATH).get(os.path.relpath(full_path, config.MOUNT_POINT))
+        if entry is not None:
+            if entry.get('st_ctime'):
+                file_info_message += f"Создан: {format_timestamp(entry['st_ctime'])}\n"
+            if entry.get('st_mtime'):
+                file_info_message += f"Изменен: {format_timestamp(entry['st_mtime'])}\n"
+
         split_and_send_message(update, file_info_message)
     except Exception as e:
         logger.error(e)
@@ -244,25 +408,30 @@ def save_file_command(update: Update, context: CallbackContext):
     if check_fuse(update) is ConversationHandler.END:
         return ConversationHandler.END
 
+    mount_point = session_mount(update)
+
     message_text = update.message.text
-    match = re.search(r'^/save(?:\s+"([^"]+)"|\s+(\S+))?$', message_text)
+    match = re.search(r'^/save(\s+-b)?(?:\s+"([^"]+)"|\s+(\S+))?$', message_text)
     if not match:
-        update.message.reply_text('Неверный формат команды. Используйте /save или /save "<directory>"')
+        update.message.reply_text('Неверный формат команды. Используйте /save [-b] или /save [-b] "<directory>"')
         return ConversationHandler.END
 
-    directory = match.group(1) or match.group(2)
+    directory = match.group(2) or match.group(3)
     if directory:
         if directory.startswith('/'):
             update.message.reply_text("Ошибка: имя директории не должно начинаться с `/`.")
             return ConversationHandler.END
-        context.user_data['save_dir'] = directory
+        context.user_data['save_dir'] = os.path.join(mount_point, directory)
     else:
-        context.user_data['save_dir'] = config.MOUNT_POINT
+        context.user_data['save_dir'] = mount_point
 
-    update.message.reply_text('Отправьте файл или введите /cancel_save для отмены.')
     context.user_data['save_user_id'] = update.message.from_user.id
-    context.user_data['save_context'] = 'waiting_for_file_private'
     context.user_data['attempt_count'] = 0
+    if match.group(1):
+        return start_save_batch(update, context, 'waiting_for_files_private')
+
+    update.message.reply_text('Отправьте файл или введите /cancel_save для отмены.')
+    context.user_data['save_context'] = 'waiting_for_file_private'
     return 'waiting_for_file_private'
 
 
@@ -270,28 +439,33 @@ def save_file_mention_command(update: Update, context: CallbackContext):
     if check_fuse(update) is ConversationHandler.END:
         return ConversationHandler.END
 
+    mount_point = session_mount(update)
+
     if check_mention(update, context):
         bot_username = context.bot.username
         message_text = update.message.text
-        pattern = fr'^@{bot_username}\s+/save(?:\s+"([^"]+)"|\s+(\S+))?$'
+        pattern = fr'^@{bot_username}\s+/save(\s+-b)?(?:\s+"([^"]+)"|\s+(\S+))?$'
         match = re.search(pattern, message_text)
         if not match:
-            update.message.reply_text(f'Неверный формат команды. Используйте /save или /save "<directory>"')
+            update.message.reply_text(f'Неверный формат команды. Используйте /save [-b] или /save [-b] "<directory>"')
             return ConversationHandler.END
 
-        directory = match.group(1) or match.group(2)
+        directory = match.group(2) or match.group(3)
         if directory:
             if directory.startswith('/'):
                 update.message.reply_text("Ошибка: имя директории не должно начинаться с `/`.")
                 return ConversationHandler.END
-            context.user_data['save_dir'] = directory
+            context.user_data['save_dir'] = os.path.join(mount_point, directory)
         else:
-            context.user_data['save_dir'] = config.MOUNT_POINT
+            context.user_data['save_dir'] = mount_point
 
-        update.message.reply_text(f'Отправьте файл или введите /cancel_save@{bot_username} для отмены.')
         context.user_data['save_user_id'] = update.message.from_user.id
-        context.user_data['save_context'] = 'waiting_for_file_mention'
         context.user_data['attempt_count'] = 0
+        if match.group(1):
+            return start_save_batch(update, context, 'waiting_for_files_mention')
+
+        update.message.reply_text(f'Отправьте файл или введите /cancel_save@{bot_username} для отмены.')
+        context.user_data['save_context'] = 'waiting_for_file_mention'
         return 'waiting_for_file_mention'
 
 
@@ -299,36 +473,24 @@ def save_file(update, context):
     if check_fuse(update) is ConversationHandler.END:
         return ConversationHandler.END
 
+    mount_point = session_mount(update)
+
     if 'save_user_id' in context.user_data and context.user_data['save_user_id'] == update.message.from_user.id:
-        file_info = None
-        filename = None
+        file_info, filename = message_file(update.message)
 
-        if update.message.document:
-            file_info = update.message.document
-            filename = file_info.file_name
-        elif update.message.photo:
-            file_info = update.message.photo[-1]
-            filename = f"photo_{file_info.file_unique_id}.jpg"
-        elif update.message.video:
-            file_info = update.message.video
-            filename = file_info.file_name
-        elif update.message.animation:
-            file_info = update.message.animation
-            filename = file_info.file_name
-        elif update.message.audio:
-            file_info = update.message.audio
-            filename = file_info.file_name
+        if file_info and update.message.media_group_id:
+            batch_context = context.user_data['save_context'].replace('waiting_for_file_', 'waiting_for_files_')
+            start_save_batch(update, context, batch_context)
+            return save_batch_file(update, context)
 
         if file_info:
             file_id = file_info.file_id
             chat_id = update.message.chat_id
             user_id = update.message.from_user.id
-            logger.info(f"Received file from chat_id: {chat_id}")
-            logger.info(f"Received file from user_id: {user_id}")
-            logger.info(f"File received: file_id={file_id}, filename={filename}")
+            logger.info(f"File received: file_id={file_id}, filename={filename}, chat_id={chat_id}, user_id={user_id}")
 
-            save_dir = context.user_data.get('save_dir', config.MOUNT_POINT)
-            local_path = os.path.join(config.MOUNT_POINT, save_dir, filename)
+            save_dir = context.user_data.get('save_dir', mount_point)
+            local_path = os.path.join(save_dir, filename)
 
             os.makedirs(os.path.dirname(local_path), exist_ok=True)
 
@@ -337,12 +499,16 @@ def save_file(update, context):
                     f"Файл с именем {filename} уже существует. Пожалуйста, отправьте файл с другим именем.")
                 return context.user_data['save_context']
 
-            file = context.bot.get_file(file_id)
-            file.download(local_path)
-            logger.info(f"File downloaded to: {local_path}")
+            avoided = fetch_file(context.bot, file_id, file_info.file_unique_id, local_path)
+            if update.message.document:
+                remember_file_id(STORAGE_PATH, local_path, file_id)
 
-            update.message.reply_text(f"Файл {filename} загружен и сохранен на вашем сервере.")
-            save_metadata_to_storage(config.MOUNT_POINT, STORAGE_PATH, BACKUP_FILE)
+            if avoided:
+                update.message.reply_text(f"Файл {filename} уже был на сервере и сохранен без повторной загрузки "
+                                          f"({avoided} байт).")
+            else:
+                update.message.reply_text(f"Файл {filename} загружен и сохранен на вашем сервере.")
+            metadata_changed(config.MOUNT_POINT, STORAGE_PATH, BACKUP_FILE)
             return ConversationHandler.END
         else:
             context.user_data['attempt_count'] += 1
@@ -351,7 +517,7 @@ def save_file(update, context):
                 return ConversationHandler.END
             else:
                 if context.user_data['save_context'] == 'waiting_for_file_mention':
-                    bot_username = context.user_data['bot_username']
+                    bot_username = bot_mention(context)
                     update.message.reply_text(f'Отправьте файл или введите /cancel_save{bot_username} для отмены.')
                 else:
                     update.message.reply_text('Отправьте файл или введите /cancel_save для отмены.')
@@ -360,24 +526,124 @@ def save_file(update, context):
         return context.user_data['save_context']
 
 
+def message_file(message):
+    file_info = None
+    filename = None
+
+    if message.document:
+        file_info = message.document
+        filename = file_info.file_name
+    elif message.photo:
+        file_info = message.photo[-1]
+        filename = f"photo_{file_info.file_unique_id}.jpg"
+    elif message.video:
+        file_info = message.video
+        filename = file_info.file_name or f"video_{file_info.file_unique_id}.mp4"
+    elif message.animation:
+        file_info = message.animation
+        filename = file_info.file_name or f"animation_{file_info.file_unique_id}.mp4"
+    elif message.audio:
+        file_info = message.audio
+        filename = file_info.file_name or f"audio_{file_info.file_unique_id}.mp3"
+
+    return file_info, filename
+
+
+def save_batch_hint(context):
+    if context.user_data['save_context'] == 'waiting_for_files_mention':
+        bot_username = bot_mention(context)
+        return f'Отправьте файлы, затем {bot_username} /done для сохранения или /cancel_save{bot_username} для отмены.'
+    return 'Отправьте файлы, затем /done для сохранения или /cancel_save для отмены.'
+
+
+def start_save_batch(update, context, save_context):
+    context.user_data['save_context'] = save_context
+    context.user_data['save_batch'] = SaveBatch(context.bot, context.user_data['save_dir'])
+    if update.message.media_group_id:
+        update.message.reply_text(f"Получен альбом, включен пакетный режим. {save_batch_hint(context)}")
+    else:
+        update.message.reply_text(save_batch_hint(context))
+    return save_context
+
+
+def save_batch_file(update, context):
+    if check_fuse(update) is ConversationHandler.END:
+        return ConversationHandler.END
+
+    if context.user_data.get('save_user_id') != update.message.from_user.id or 'save_batch' not in context.user_data:
+        return context.user_data.get('save_context', ConversationHandler.END)
+
+    file_info, filename = message_file(update.message)
+    if file_info is None:
+        if not update.message.media_group_id:
+            update.message.reply_text(save_batch_hint(context))
+        return context.user_data['save_context']
+
+    batch = context.user_data['save_batch']
+    logger.info(f"File queued for batch save: file_id={file_info.file_id}, filename={filename}, "
+                f"chat_id={update.message.chat_id}, user_id={update.message.from_user.id}")
+    batch.add(file_info.file_id, filename, file_info.file_unique_id, document=update.message.document is not None)
+    return context.user_data['save_context']
+
+
+def save_batch_finished(update, batch, cancelled=False):
+    saved = set(batch.saved)
+    lines = [f"{'Сохранение отменено. ' if cancelled else ''}Сохранено файлов: {len(saved)} "
+             f"за {batch.elapsed():.1f} с."]
+    if batch.avoided:
+        lines.append(f"Без повторной загрузки (уже были на сервере): {batch.avoided} байт.")
+    renamed = [f"  - {original} -> {saved_name}" for original, saved_name in batch.renamed if saved_name in saved]
+    if renamed:
+        lines.append("Переименованы из-за совпадения имен:")
+        lines.extend(renamed)
+    if batch.failed:
+        lines.append("Не удалось сохранить:")
+        lines.extend(f"  - {filename}" for filename in batch.failed)
+    enqueue_text(update, "\n".join(lines))
+    if saved:
+        metadata_changed(config.MOUNT_POINT, STORAGE_PATH, BACKUP_FILE)
+
+
+def finish_save_batch(update, context):
+    batch = context.user_data.pop('save_batch', None)
+    if batch is None or context.user_data.get('save_user_id') != update.message.from_user.id:
+        return ConversationHandler.END
+
+    if batch.pending:
+        update.message.reply_text(f"Ожидаю завершения загрузки файлов: {batch.pending}.")
+    batch.close(partial(save_batch_finished, update))
+    return ConversationHandler.END
+
+
+def cancel_save_batch(update, context):
+    batch = context.user_data.pop('save_batch', None)
+    if batch is None:
+        return cancel(update, context)
+
+    batch.close(partial(save_batch_finished, update, cancelled=True), cancel=True)
+    return ConversationHandler.END
+
+
 def get_document(update, context):
     if check_fuse(update) is ConversationHandler.END:
         return ConversationHandler.END
 
+    mount_point = session_mount(update)
+
     message_text = update.message.text
-    match = re.search(r'/get\s+(?:"([^"]+)"|(\S+))', message_text)
+    match = re.search(r'/get\s+(.+)$', message_text)
     if not match:
-        update.message.reply_text("Ошибка: используйте /get <filename>.")
+        update.message.reply_text("Ошибка: используйте /get <filename> [<filename> ...].")
         return
 
-    relative_path = match.group(1) or match.group(2)
-    if relative_path is None:
-        update.message.reply_text("Ошибка: используйте /get <filename>.")
-        return
+    patterns = [quoted or plain for quoted, plain in re.findall(r'"([^"]+)"|(\S+)', match.group(1))]
+    if len(patterns) > 1 or GLOB_CHARS.search(patterns[0]):
+        return get_documents(update, context, mount_point, patterns)
 
-    absolute_path = os.path.join(config.MOUNT_POINT, relative_path)
+    relative_path = patterns[0]
+    absolute_path = os.path.join(mount_point, relative_path)
 
-    if not os.path.exists(absolute_path) or not os.path.isfile(absolute_path):
+    if not os.path.isfile(absolute_path) or in_trash(absolute_path, mount_point):
         update.message.reply_text(f"Ошибка: файл {relative_path} не найден.")
         return
 
@@ -391,49 +657,128 @@ def get_document(update, context):
             os.remove(jpg_path)
             return
 
-    with open(absolute_path, 'rb') as file:
-        update.message.reply_document(document=file)
+    send_document(update, STORAGE_PATH, absolute_path)
+
+
+def resolve_pattern(mount_point, pattern):
+    full_pattern = os.path.normpath(os.path.join(mount_point, pattern.lstrip('/')))
+    if not GLOB_CHARS.search(pattern):
+        return [full_pattern] if os.path.isfile(full_pattern) and not in_trash(full_pattern, mount_point) else []
+
+    return glob_files(full_pattern)
+
+
+def get_documents(update, context, mount_point, patterns):
+    paths = []
+    missing = []
+    for pattern in patterns:
+        matches = resolve_pattern(mount_point, pattern)
+        if not matches:
+            missing.append(pattern)
+        paths.extend(path for path in matches if path not in paths)
+
+    if missing:
+        update.message.reply_text("Не найдены: " + ", ".join(missing))
+    if not paths:
+        return ConversationHandler.END
+
+    handler = timed('/get', partial(send_found_files, mount_point=mount_point, paths=paths))
+    if submit_job(update, context, 'get', handler) is None:
+        update.message.reply_text(JOB_QUEUE_FULL_MESSAGE)
+    else:
+        mark_outcome('queued')
+    return ConversationHandler.END
+
+
+def send_found_files(update, context, mount_point, paths):
+    if len(paths) <= GET_ARCHIVE_THRESHOLD:
+        send_media_groups(update, STORAGE_PATH, paths,
+                          progress=lambda sent: report_progress(f"отправлено файлов: {sent} из {len(paths)}"))
+        return
+
+    output = PartWriter(GETDIR_PART_SIZE, archive_part_sender(update, 'files.tar', [],
+                                                              caption=f"Файлов в архиве: {len(paths)}"))
+    write_files_archive(paths, mount_point, output,
+                        lambda index, path: report_progress(f"упаковано файлов: {index} из {len(paths)}"))
+    output.close()
+
+
+def archive_part_sender(update, archive_name, sent_ids, caption=None):
+    def send_part(number, data, last):
+        if last and number == 1:
+            filename, part_caption = archive_name, caption
+        else:
+            filename = f"{archive_name}.part{number:03}"
+            part_caption = f"Часть {number}. Соберите архив командой: cat {archive_name}.part* > {archive_name}"
+        report_progress(f"отправка {filename}")
+        message = call_with_retry(update.message.chat_id, update.message.reply_document, document=io.BytesIO(data),
+                                  filename=filename, caption=part_caption)
+        sent_ids.append(message.document.file_id)
+
+    return send_part
 
 
 def get_directory(update, context):
     if check_fuse(update) is ConversationHandler.END:
         return ConversationHandler.END
 
+    mount_point = session_mount(update)
+
     message_text = update.message.text
+    archive_format = 'tar'
+    format_match = re.search(r'\s--(gz|xz|zip)(?=\s|$)', message_text)
+    if format_match:
+        archive_format = format_match.group(1)
+        message_text = message_text.replace(format_match.group(0), '')
+
     match = re.search(r'/getdir\s+(?:"([^"]+)"|(\S+))', message_text)
     if not match:
-        update.message.reply_text("Ошибка: используйте /getdir <directory>.")
+        update.message.reply_text("Ошибка: используйте /getdir [--gz|--xz|--zip] <directory>.")
         return
 
     relative_path = match.group(1) or match.group(2)
     if relative_path is None:
-        update.message.reply_text("Ошибка: используйте /getdir <directory>.")
+        update.message.reply_text("Ошибка: используйте /getdir [--gz|--xz|--zip] <directory>.")
         return
 
-    absolute_path = os.path.join(config.MOUNT_POINT, relative_path)
+    absolute_path = os.path.normpath(os.path.join(mount_point, relative_path))
 
-    if not os.path.exists(absolute_path) or not os.path.isdir(absolute_path):
+    if not os.path.isdir(absolute_path) or in_trash(absolute_path, mount_point):
         update.message.reply_text(f"Ошибка: директория {relative_path} не найдена.")
         return
 
-    with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-        temp_file_path = temp_file.name
+    cache = get_sent_file_cache(STORAGE_PATH)
+    signature = directory_signature(absolute_path)
+    file_ids = cache.get_archive(absolute_path, archive_format, signature)
+    if file_ids is not None:
+        try:
+            for file_id in file_ids:
+                update.message.reply_document(document=file_id)
+            return
+        except BadRequest as e:
+            logger.warning(f"Cached archive of {absolute_path} was rejected, building it again: {e}")
+            cache.discard_archive(absolute_path, archive_format)
 
-    try:
-        with tarfile.open(temp_file_path, 'w') as tar:
-            tar.add(absolute_path, arcname=os.path.basename(absolute_path))
+    archive_name = f"{os.path.basename(absolute_path)}{FORMATS[archive_format]}"
+    sent_ids = []
 
-        with open(temp_file_path, 'rb') as file:
-            update.message.reply_document(document=file, filename=f"{os.path.basename(absolute_path)}.tar")
+    def track_member(added, name):
+        report_progress(f"упаковано элементов: {added}")
 
-    finally:
-        os.unlink(temp_file_path)
+    output = PartWriter(GETDIR_PART_SIZE, archive_part_sender(update, archive_name, sent_ids))
+    write_archive(absolute_path, archive_format, output, GETDIR_COMPRESS_WORKERS, track_member)
+    output.close()
+
+    if directory_signature(absolute_path) == signature:
+        cache.put_archive(absolute_path, archive_format, signature, sent_ids)
 
 
 def mkdir(update: Update, context: CallbackContext):
     if check_fuse(update) is ConversationHandler.END:
         return ConversationHandler.END
 
+    mount_point = session_mount(update)
+
     message_text = update.message.text
     bot_username = context.bot.username
     pattern = fr'@{bot_username}\s+/mkdir\s+(?:"([^"]+)"|(\S+))'
@@ -454,7 +799,7 @@ def mkdir(update: Update, context: CallbackContext):
             update.message.reply_text("Ошибка: имя директории не должно начинаться с `/`.")
             return ConversationHandler.END
 
-        new_dir_path = os.path.join(config.MOUNT_POINT, directory_name)
+        new_dir_path = os.path.join(mount_point, directory_name)
 
         if os.path.exists(new_dir_path):
             update.message.reply_text(f"Ошибка: директория {directory_name} уже существует.")
@@ -467,7 +812,7 @@ def mkdir(update: Update, context: CallbackContext):
             user_id = update.message.from_user.id
             logger.info(
                 f"Directory {directory_name} created successfully at {new_dir_path} from chat_id {chat_id} and user_id {user_id}.")
-            save_metadata_to_storage(config.MOUNT_POINT, STORAGE_PATH, BACKUP_FILE)
+            metadata_changed(config.MOUNT_POINT, STORAGE_PATH, BACKUP_FILE)
         except Exception as e:
             logger.error(f"Ошибка при создании директории {directory_name}: {e}")
             update.message.reply_text(f"Ошибка при создании директории.")
@@ -482,6 +827,8 @@ def move(update: Update, context: CallbackContext):
     if check_fuse(update) is ConversationHandler.END:
         return ConversationHandler.END
 
+    mount_point = session_mount(update)
+
     message_text = update.message.text
     bot_username = context.bot.username
     pattern = fr'@{bot_username}\s+/mv\s+(?:"([^"]+)"|(\S+))\s+(?:"([^"]+)"|(\S+))'
@@ -494,8 +841,8 @@ def move(update: Update, context: CallbackContext):
         source = match.group(1) or match.group(2)
         destination = match.group(3) or match.group(4)
 
-        source_path = os.path.join(config.MOUNT_POINT, source.lstrip('/'))
-        destination_path = os.path.join(config.MOUNT_POINT, destination.lstrip('/'))
+        source_path = os.path.join(mount_point, source.lstrip('/'))
+        destination_path = os.path.join(mount_point, destination.lstrip('/'))
 
         if source_path == destination_path:
             update.message.reply_text(f"Ошибка: Исходный путь {source} и путь назначения {destination} равны.")
@@ -510,13 +857,16 @@ def move(update: Update, context: CallbackContext):
             return ConversationHandler.END
 
         try:
+            moved_path = os.path.join(destination_path, os.path.basename(source_path)) \
+                if os.path.isdir(destination_path) else destination_path
             shutil.move(source_path, destination_path)
+            move_path(source_path, moved_path)
             update.message.reply_text(f"{source} успешно перемещен(а) в {destination}.")
 
             chat_id = update.message.chat_id
             user_id = update.message.from_user.id
             logger.info(f"{source} перемещен(а) в {destination} от chat_id {chat_id} и user_id {user_id}.")
-            save_metadata_to_storage(config.MOUNT_POINT, STORAGE_PATH, BACKUP_FILE)
+            metadata_changed(config.MOUNT_POINT, STORAGE_PATH, BACKUP_FILE)
         except Exception as e:
             logger.error(f"Ошибка при перемещении {source} в {destination}: {e}")
             update.message.reply_text(f"Ошибка при перемещении")
@@ -534,8 +884,16 @@ def copy_path_with_suffix(src, dst):
     while os.path.exists(dst):
         dst = add_suffix(original_dst, counter, os.path.isdir(src))
         counter += 1
+    copied = 0
+
+    def copy_file(source, destination):
+        nonlocal copied
+        copied += 1
+        report_progress(f"скопировано файлов: {copied}")
+        return shutil.copy2(source, destination)
+
     if os.path.isdir(src):
-        shutil.copytree(src, dst)
+        shutil.copytree(src, dst, copy_function=copy_file)
     else:
         shutil.copy(src, dst)
 
@@ -556,6 +914,8 @@ def cp(update: Update, context: CallbackContext):
     if check_fuse(update) is ConversationHandler.END:
         return ConversationHandler.END
 
+    mount_point = session_mount(update)
+
     bot_username = context.bot.username
     pattern = fr'@{bot_username}\s+/cp\s+(?:"([^"]+)"|(\S+))\s+(?:"([^"]+)"|(\S+))'
     match = re.search(pattern, update.message.text)
@@ -571,8 +931,8 @@ def cp(update: Update, context: CallbackContext):
             src = src.lstrip('/')
             dst = dst.lstrip('/')
 
-            src_path = os.path.join(config.MOUNT_POINT, src)
-            dst_path = os.path.join(config.MOUNT_POINT, dst)
+            src_path = os.path.join(mount_point, src)
+            dst_path = os.path.join(mount_point, dst)
 
             if not os.path.exists(src_path):
                 update.message.reply_text(f"Ошибка: исходный путь {src} не существует.")
@@ -580,13 +940,13 @@ def cp(update: Update, context: CallbackContext):
 
             try:
                 new_dst_path = copy_path_with_suffix(src_path, dst_path)
-                relative_new_dst_path = os.path.relpath(new_dst_path, config.MOUNT_POINT)
+                relative_new_dst_path = os.path.relpath(new_dst_path, mount_point)
                 update.message.reply_text(f"{src} успешно скопирован в {relative_new_dst_path}.")
                 chat_id = update.message.chat_id
                 user_id = update.message.from_user.id
                 logger.info(
                     f"Path {src} copied to {relative_new_dst_path} from chat_id {chat_id} and user_id {user_id}.")
-                save_metadata_to_storage(config.MOUNT_POINT, STORAGE_PATH, BACKUP_FILE)
+                metadata_changed(config.MOUNT_POINT, STORAGE_PATH, BACKUP_FILE)
             except Exception as e:
                 logger.error(f"Error copying {src} to {dst}: {e}")
                 update.message.reply_text(f"Ошибка при копировании {src} в {dst}.")
@@ -600,53 +960,37 @@ def cp(update: Update, context: CallbackContext):
     return ConversationHandler.END
 
 
-def file_list() -> list[str]:
-    files_list = []
+def tree(directory: str) -> str:
+    return '\n'.join(iter_tree(directory))
+
+
+def render_files_page(mount_point, cursors, visited, page):
+    if page >= len(cursors):
+        return None, False
+    lines, next_cursor = files_page(mount_point, cursors[page], visited, LS_PAGE_SIZE, LS_PAGE_CHARS)
+    if not lines:
+        return None, False
+    del cursors[page + 1:]
+    if next_cursor is not None:
+        cursors.append(next_cursor)
+    return f"```\n{escape_markdown(chr(10).join(lines))}\n```", next_cursor is not None
 
-    for root, dirs, files in os.walk(config.MOUNT_POINT, followlinks=True):
-        for file in files:
-            file_path = os.path.join(root, file)
-            relative_path = os.path.relpath(root, config.MOUNT_POINT)
-            if relative_path == '.':
-                relative_path = '/'
-            else:
-                relative_path = f"/{relative_path}"
-            if os.path.islink(file_path):
-                files_list.append(f"<{relative_path}> {file} ->")
-            else:
-                files_list.append(f"<{relative_path}> {file}")
-    return files_list
-
-
-def tree(directory: str, prefix: str = '') -> str:
-    result = []
-    contents = os.listdir(directory)
-    contents = sorted(contents, key=lambda s: s.lower())
-    pointers = ['├── '] * (len(contents) - 1) + ['└── ']
-
-    for pointer, path in zip(pointers, contents):
-        full_path = os.path.join(directory, path)
-        if os.path.isdir(full_path) and not os.path.islink(full_path):
-            result.append(f"{prefix}{pointer}{path}/")
-            if pointer == '└── ':
-                extension = '    '
-            else:
-                extension = '│   '
-            result.append(tree(full_path, prefix=prefix + extension))
-        else:
-            if os.path.islink(full_path):
-                result.append(f"{prefix}{pointer}{path} ->")
-            else:
-                result.append(f"{prefix}{pointer}{path}")
-    return '\n'.join(result)
 
+def list_files_markup(token, page, has_next):
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton('« Назад', callback_data=f"ls:{token}:{page - 1}"))
+    if has_next:
+        buttons.append(InlineKeyboardButton('Далее »', callback_data=f"ls:{token}:{page + 1}"))
+    return InlineKeyboardMarkup([buttons]) if buttons else None
 
-def list_path_check(update, directory_path):
+
+def list_path_check(update, mount_point, directory_path):
     if '/' != directory_path[0]:
         update.message.reply_text("Ошибка: имя директории должно начинаться с `/`.")
         return ConversationHandler.END
 
-    check_dir_path = os.path.join(config.MOUNT_POINT, directory_path[1:])
+    check_dir_path = os.path.join(mount_point, directory_path[1:])
 
     if not os.path.exists(check_dir_path):
         update.message.reply_text(f"Ошибка: директории {directory_path} не существует")
@@ -657,6 +1001,8 @@ def list_files(update, context):
     if check_fuse(update) is ConversationHandler.END:
         return ConversationHandler.END
 
+    mount_point = session_mount(update)
+
     directory_path = '/'
     match = re.search(r'/ls\s+(?:"([^"]+)"|(\S+))', update.message.text)
 
@@ -666,29 +1012,68 @@ def list_files(update, context):
             update.message.reply_text("Ошибка: используйте /ls или /ls <dir>.")
             return ConversationHandler.END
 
-        if list_path_check(update, directory_path) is ConversationHandler.END:
+        if list_path_check(update, mount_point, directory_path) is ConversationHandler.END:
             return ConversationHandler.END
 
-    files_list = file_list()
-
-    filtered_files = [file for file in files_list if file.startswith(f"<{directory_path}")]
+    cursors = [files_cursor(mount_point, directory_path)]
+    visited = {}
+    page_text, has_next = render_files_page(mount_point, cursors, visited, 0)
+    if page_text is None:
+        split_and_send_message(update, f"Директория {directory_path} и все поддиректории пусты.")
+        return ConversationHandler.END
 
-    if filtered_files:
-        files_output = '\n'.join(filtered_files)
-        message = files_output
-    else:
-        message = f"Директория {directory_path} и все поддиректории пусты."
+    markup = None
+    if has_next:
+        token = uuid.uuid4().hex[:8]
+        listings = context.chat_data.setdefault('ls_listings', {})
+        listings[token] = (mount_point, cursors, visited)
+        while len(listings) > LS_LISTINGS_LIMIT:
+            del listings[next(iter(listings))]
+        markup = list_files_markup(token, 0, has_next)
 
-    split_and_send_message(update, message)
+    update.message.reply_text(page_text, parse_mode='MarkdownV2', reply_markup=markup)
     return ConversationHandler.END
 
 
+def list_files_page(update, context):
+    query = update.callback_query
+    _, token, page = query.data.split(':')
+    listing = context.chat_data.get('ls_listings', {}).get(token)
+    if listing is None:
+        query.answer('Листинг устарел, повторите /ls.')
+        return
+
+    page = int(page)
+    page_text, has_next = render_files_page(*listing, page)
+    if page_text is None:
+        query.answer('Страница не найдена.')
+        return
+
+    query.answer()
+    query.edit_message_text(page_text, parse_mode='MarkdownV2', reply_markup=list_files_markup(token, page, has_next))
+
+
 def tree_list_files(update, context):
     if check_fuse(update) is ConversationHandler.END:
         return ConversationHandler.END
 
+    mount_point = session_mount(update)
+
+    message_text = update.message.text
+    max_depth = None
+    depth_match = re.search(r'\s--depth[\s=](\d+)', message_text)
+    if depth_match:
+        max_depth = int(depth_match.group(1))
+        message_text = message_text.replace(depth_match.group(0), '')
+    dirs_only = re.search(r'\s--dirs-only(?=\s|$)', message_text) is not None
+    message_text = re.sub(r'\s--dirs-only(?=\s|$)', '', message_text)
+
+    if max_depth == 0:
+        update.message.reply_text("Ошибка: глубина должна быть больше нуля.")
+        return ConversationHandler.END
+
     directory_path = '/'
-    match = re.search(r'/trls\s+(?:"([^"]+)"|(\S+))', update.message.text)
+    match = re.search(r'/trls\s+(?:"([^"]+)"|(\S+))', message_text)
 
     if match:
         directory_path = match.group(1) or match.group(2)
@@ -696,43 +1081,59 @@ def tree_list_files(update, context):
             update.message.reply_text("Ошибка: используйте /trls или /trls <dir>.")
             return ConversationHandler.END
 
-        if list_path_check(update, directory_path) is ConversationHandler.END:
+        if list_path_check(update, mount_point, directory_path) is ConversationHandler.END:
             return ConversationHandler.END
 
-    tree_output = tree(os.path.join(config.MOUNT_POINT, directory_path.strip('/')))
-    tree_lines = [line for line in tree_output.split('\n') if line.strip()]
-    if tree_lines:
-        message = '\n'.join(tree_lines)
+    tree_lines = iter_tree(os.path.join(mount_point, directory_path.strip('/')), max_depth, dirs_only)
+    first_line = next(tree_lines, None)
+    if first_line is None:
+        split_and_send_message(update, f"Директория {directory_path} и все поддиректории пусты.")
     else:
-        message = f"Директория {directory_path} и все поддиректории пусты."
-
-    split_and_send_message(update, message)
+        send_lines(update, chain([first_line], tree_lines))
     return ConversationHandler.END
 
 
+def store_changed(path):
+    custom_root = os.path.abspath(custom_mount_point) if custom_mount_point else None
+    if custom_root and os.path.commonpath([os.path.abspath(path), custom_root]) == custom_root:
+        metadata_changed(custom_mount_point, CUSTOM_STORAGE_PATH, CUSTOM_BACKUP_FILE)
+    else:
+        metadata_changed(config.MOUNT_POINT, STORAGE_PATH, BACKUP_FILE)
+
+
 def remove_file(update, context, target_path):
+    mount_point = session_mount(update)
+
     if target_path.startswith('/'):
         update.message.reply_text("Ошибка: путь не должен начинаться с `/`.")
         return ConversationHandler.END
 
-    full_path = os.path.join(config.MOUNT_POINT, target_path)
+    full_path = os.path.join(mount_point, target_path)
 
-    if not os.path.exists(full_path):
+    if not os.path.exists(full_path) or in_trash(full_path, mount_point):
         update.message.reply_text(f"Ошибка: путь {target_path} не существует.")
         return ConversationHandler.END
 
+    chat_id = update.message.chat_id
+    user_id = update.message.from_user.id
     try:
-        if os.path.isdir(full_path):
-            logger.info("in dir")
-            shutil.rmtree(full_path)
+        try:
+            entry = move_to_trash(full_path, target_path, (chat_id, user_id), mount_point)
+        except OSError as e:
+            logger.warning(f"Could not move {target_path} to trash, removing in place: {e}")
+            entry = None
+            if os.path.isdir(full_path):
+                shutil.rmtree(full_path)
+            else:
+                os.remove(full_path)
+            forget_path(full_path)
+        if entry is not None and TRASH_UNDO_WINDOW > 0:
+            update.message.reply_text(f"{target_path} удален(а). Восстановить в течение {TRASH_UNDO_WINDOW:g} с: "
+                                      f"/undo {entry.entry_id}")
         else:
-            logger.info("in file")
-            os.remove(full_path)
-        update.message.reply_text(f"{target_path} успешно удален(а).")
-        chat_id = update.message.chat_id
-        user_id = update.message.from_user.id
+            update.message.reply_text(f"{target_path} успешно удален(а).")
         logger.info(f"{target_path} удален(а) от chat_id {chat_id} и user_id {user_id}.")
-        save_metadata_to_storage(config.MOUNT_POINT, STORAGE_PATH, BACKUP_FILE)
+        store_changed(full_path)
     except Exception as e:
         logger.error(f"Ошибка при удалении {target_path}: {e}")
         update.message.reply_text(f"Ошибка при удалении {target_path}.")
@@ -770,6 +1171,59 @@ def remove(update, context):
     return ConversationHandler.END
 
 
+def undo_command(update, context):
+    match = re.search(r'/undo(?:@\S+)?(?:\s+(\d+))?\s*$', update.message.text)
+    if not match:
+        update.message.reply_text("Ошибка: используйте /undo или /undo <номер>.")
+        return ConversationHandler.END
+
+    entry_id = int(match.group(1)) if match.group(1) else None
+    owner = (update.message.chat_id, update.message.from_user.id)
+    try:
+        entry = restore_from_trash(owner, entry_id)
+    except FileExistsError:
+        update.message.reply_text("Ошибка: на месте удаленного пути уже есть файл или директория.")
+        return ConversationHandler.END
+    except OSError as e:
+        logger.error(f"Error restoring from trash for {owner}: {e}")
+        update.message.reply_text("Ошибка при восстановлении.")
+        return ConversationHandler.END
+
+    if entry is None:
+        update.message.reply_text("Ошибка: нечего восстанавливать, удаление уже выполнено или не найдено.")
+    else:
+        update.message.reply_text(f"{entry.original} восстановлен(а).")
+        logger.info(f"{entry.original} восстановлен(а) из корзины для chat_id {owner[0]} и user_id {owner[1]}.")
+        store_changed(entry.source)
+    return ConversationHandler.END
+
+
+def df_command(update, context):
+    if check_fuse(update) is ConversationHandler.END:
+        return ConversationHandler.END
+
+    mount_point = session_mount(update)
+    try:
+        disk = os.statvfs(mount_point)
+    except OSError as e:
+        logger.error(f"Error reading free space of {mount_point}: {e}")
+        update.message.reply_text("Ошибка: не удалось получить свободное место.")
+        return ConversationHandler.END
+
+    total = disk.f_blocks * disk.f_frsize
+    free = disk.f_bavail * disk.f_frsize
+    trash = trash_stats(mount_point)
+    lines = [f"Всего: {total / 1024 / 1024:.1f} МиБ", f"Свободно: {free / 1024 / 1024:.1f} МиБ"]
+    if trash['pending_entries']:
+        lines.append(f"Ожидает удаления: {trash['pending_bytes'] / 1024 / 1024:.1f} МиБ "
+                     f"({trash['pending_entries']} объектов)")
+        lines.append(f"Свободно после очистки: {(free + trash['pending_bytes']) / 1024 / 1024:.1f} МиБ")
+        if trash['unmeasured_entries']:
+            lines.append(f"Размер еще подсчитывается для {trash['unmeasured_entries']} объектов.")
+    update.message.reply_text("\n".join(lines))
+    return ConversationHandler.END
+
+
 def ctime_command(update, context):
     message_text = update.message.text
     match = re.search(r'/ctime\s+(?:"([^"]+)"|(\S+))', message_text)
@@ -801,9 +1255,9 @@ def start_command(update: Update, context: CallbackContext):
     fuse_thread.start()
 
     fuse_stopped = False
+    start_watcher(config.MOUNT_POINT, STORAGE_PATH, BACKUP_FILE, wait_for=check_mount)
 
     update.message.reply_text('Готов принимать команды для работы с файловой системой.')
-    save_metadata_to_storage(config.MOUNT_POINT, STORAGE_PATH, BACKUP_FILE)
     return ConversationHandler.END
 
 
@@ -818,11 +1272,11 @@ def stop_command(update: Update, context: CallbackContext):
 
     update.message.reply_text('Останавливаю работу файловой системы...')
 
+    stop_watcher(config.MOUNT_POINT)
     unmount_fs()
     fuse_stopped = True
 
     logger.info("Fuse stopped")
-    save_metadata_to_storage(config.MOUNT_POINT, STORAGE_PATH, BACKUP_FILE)
     return ConversationHandler.END
 
 
@@ -880,6 +1334,8 @@ def process_overwrites(update: Update, context: CallbackContext):
     if check_fuse(update) is ConversationHandler.END:
         return ConversationHandler.END
 
+    mount_point = session_mount(update)
+
     overwritten_files = []
     conflicting_files = context.user_data['conflicting_files']
     overwrite_confirmation = context.user_data['overwrite_confirmation']
@@ -888,7 +1344,7 @@ def process_overwrites(update: Update, context: CallbackContext):
     for i, (filename, conflicting_filename, message) in enumerate(conflicting_files):
         if overwrite_confirmation[i]:
             source_path = os.path.join(path, filename)
-            destination_path = os.path.join(config.MOUNT_POINT, conflicting_filename)
+            destination_path = os.path.join(mount_point, conflicting_filename)
 
             if os.path.exists(destination_path):
                 os.remove(destination_path)
@@ -896,7 +1352,7 @@ def process_overwrites(update: Update, context: CallbackContext):
             if filename.endswith(".png"):
                 output_filename_jpg = filename[:-4] + '.jpg'
                 overwritten_files.append(f"{filename} -> {output_filename_jpg}")
-                output_path_png = os.path.join(config.MOUNT_POINT, filename)
+                output_path_png = os.path.join(mount_point, filename)
 
                 shutil.copy(source_path, output_path_png)
                 create_empty_jpg(output_path_png)
@@ -904,7 +1360,7 @@ def process_overwrites(update: Update, context: CallbackContext):
             elif filename.endswith(".jpg"):
                 output_filename_png = filename[:-4] + '.png'
                 output_filename_jpg = filename[:-4] + '.jpg'
-                output_path_png = os.path.join(config.MOUNT_POINT, output_filename_png)
+                output_path_png = os.path.join(mount_point, output_filename_png)
                 overwritten_files.append(f"{filename} -> {output_filename_jpg}")
 
                 shutil.copy(source_path, output_path_png)
@@ -918,6 +1374,8 @@ def convert_command(update: Update, context: CallbackContext):
     if check_fuse(update) is ConversationHandler.END:
         return ConversationHandler.END
 
+    mount_point = session_mount(update)
+
     message_text = update.message.text
     match = re.search(r'/convert\s+(\S+)$', message_text)
 
@@ -933,14 +1391,15 @@ def convert_command(update: Update, context: CallbackContext):
             moved_files = []
             existing_files = []
             conflicting_files = []
+            copies = []
 
             for filename in os.listdir(path):
                 source_path = os.path.join(path, filename)
 
                 if filename.endswith(".png"):
                     output_filename_jpg = filename[:-4] + '.jpg'
-                    output_path_jpg = os.path.join(config.MOUNT_POINT, output_filename_jpg)
-                    output_path_png = os.path.join(config.MOUNT_POINT, filename)
+                    output_path_jpg = os.path.join(mount_point, output_filename_jpg)
+                    output_path_png = os.path.join(mount_point, filename)
 
                     if os.path.exists(output_path_jpg) and os.path.exists(output_path_png):
                         existing_files.append(f"{filename} - PNG и JPG файлы уже существуют")
@@ -949,14 +1408,13 @@ def convert_command(update: Update, context: CallbackContext):
                     elif os.path.exists(output_path_png):
                         conflicting_files.append((filename, filename, "PNG файл уже существует"))
                     else:
-                        create_empty_jpg(output_path_jpg)
-                        shutil.copy(source_path, output_path_png)
+                        copies.append((source_path, output_path_png, output_path_jpg))
                         converted_files.append(f"{filename} -> {output_filename_jpg}")
 
                 elif filename.endswith(".jpg"):
                     output_filename_png = filename[:-4] + '.png'
-                    output_path_png = os.path.join(config.MOUNT_POINT, output_filename_png)
-                    output_path_jpg = os.path.join(config.MOUNT_POINT, filename)
+                    output_path_png = os.path.join(mount_point, output_filename_png)
+                    output_path_jpg = os.path.join(mount_point, filename)
 
                     if os.path.exists(output_path_png) and os.path.exists(output_path_jpg):
                         existing_files.append(f"{filename} - JPG и PNG файлы уже существуют")
@@ -965,25 +1423,29 @@ def convert_command(update: Update, context: CallbackContext):
                     elif os.path.exists(output_path_jpg):
                         conflicting_files.append((filename, filename, "JPG файл уже существует"))
                     else:
-                        shutil.copy(source_path, output_path_jpg)
+                        copies.append((source_path, output_path_jpg, None))
                         converted_files.append(f"{filename} -> {output_filename_png}")
 
                 else:
-                    output_path = os.path.join(config.MOUNT_POINT, filename)
-                    shutil.copy(source_path, output_path)
+                    output_path = os.path.join(mount_point, filename)
+                    copies.append((source_path, output_path, None))
                     moved_files.append(filename)
 
-            response_message = f"Файлы в директории {path} успешно обработаны:\n\n"
-
-            if converted_files:
-                response_message += "Конвертированные файлы:\n" + "\n".join(converted_files) + "\n\n"
+            if copies:
+                job = submit_job(update, context, 'convert',
+                                 partial(copy_converted_files, path=path, copies=copies,
+                                         converted_files=converted_files, moved_files=moved_files))
+                if job is None:
+                    update.message.reply_text(JOB_QUEUE_FULL_MESSAGE)
+                    return ConversationHandler.END
+                response_message = (f"Копирование файлов из директории {path} поставлено в очередь (задача #{job.id}), "
+                                    f"результат придет отдельным сообщением.\n\n")
+            else:
+                response_message = f"Файлы в директории {path} обработаны:\n\n"
 
             if existing_files:
                 response_message += "Файлы, которые уже существуют:\n" + "\n".join(existing_files) + "\n\n"
 
-            if moved_files:
-                response_message += "Перемещенные файлы:\n" + "\n".join(moved_files) + "\n\n"
-
             if conflicting_files:
                 response_message += "Конфликтующие файлы:\n"
 
@@ -1004,8 +1466,6 @@ def convert_command(update: Update, context: CallbackContext):
 
             chat_id = update.message.chat_id
             user_id = update.message.from_user.id
-            save_metadata_to_storage(config.MOUNT_POINT, STORAGE_PATH, BACKUP_FILE)
-
             logger.info(
                 f"Files in directory {path} processed successfully from chat_id {chat_id} and user_id {user_id}.")
         except Exception as e:
@@ -1017,10 +1477,42 @@ def convert_command(update: Update, context: CallbackContext):
     return ConversationHandler.END
 
 
+def copy_converted_files(update, context, path, copies, converted_files, moved_files):
+    try:
+        for index, (source_path, output_path, empty_jpg_path) in enumerate(copies, start=1):
+            report_progress(f"скопировано файлов: {index - 1} из {len(copies)}")
+            if empty_jpg_path is not None:
+                create_empty_jpg(empty_jpg_path)
+            shutil.copy(source_path, output_path)
+    except JobCancelled:
+        update.message.reply_text(f"Копирование файлов из директории {path} отменено.")
+        raise
+    except Exception as e:
+        logger.error(f"Error copying files from directory {path}: {e}")
+        update.message.reply_text(f"Ошибка при копировании файлов из директории {path}")
+        raise
+    finally:
+        metadata_changed(config.MOUNT_POINT, STORAGE_PATH, BACKUP_FILE)
+
+    response_message = f"Файлы в директории {path} успешно обработаны:\n\n"
+    if converted_files:
+        response_message += "Конвертированные файлы:\n" + "\n".join(converted_files) + "\n\n"
+    if moved_files:
+        response_message += "Перемещенные файлы:\n" + "\n".join(moved_files) + "\n\n"
+    update.message.reply_text(response_message)
+
+
 def group_mp3_files(src_directory, dest_directory):
-    for root, _, files in os.walk(src_directory):
+    from mutagen.easyid3 import EasyID3
+    from mutagen.id3 import error
+
+    processed = 0
+    for root, dirs, files in os.walk(src_directory):
+        dirs[:] = [name for name in dirs if name != TRASH_DIR]
         for file in files:
             if file.endswith('.mp3'):
+                processed += 1
+                report_progress(f"обработано mp3 файлов: {processed}")
                 file_path = os.path.join(root, file)
                 try:
                     audio = EasyID3(file_path)
@@ -1056,6 +1548,8 @@ def group_files(update: Update, context: CallbackContext):
     if check_fuse(update) is ConversationHandler.END:
         return ConversationHandler.END
 
+    mount_point = session_mount(update)
+
     message_text = update.message.text
     bot_username = context.bot.username
     pattern = fr'@{bot_username}\s+/group\s+(?:"([^"]+)"|(\S+))'
@@ -1068,8 +1562,8 @@ def group_files(update: Update, context: CallbackContext):
         src_directory = match.group(1) or match.group(2)
         src_directory = src_directory.lstrip('/')
 
-        src_path = os.path.join(config.MOUNT_POINT, src_directory)
-        dest_path = os.path.join(config.MOUNT_POINT, 'grouped_mp3')
+        src_path = os.path.join(mount_point, src_directory)
+        dest_path = os.path.join(mount_point, 'grouped_mp3')
 
         if not os.path.exists(src_path) and not os.path.exists('/' + src_directory):
             update.message.reply_text(f"Ошибка: директория {src_directory} не существует.")
@@ -1083,7 +1577,7 @@ def group_files(update: Update, context: CallbackContext):
         try:
             group_mp3_files(src_path, dest_path)
             update.message.reply_text(f"Файлы из {src_directory} успешно сгруппированы в grouped_mp3.")
-            save_metadata_to_storage(config.MOUNT_POINT, STORAGE_PATH, BACKUP_FILE)
+            metadata_changed(config.MOUNT_POINT, STORAGE_PATH, BACKUP_FILE)
         except Exception as e:
             logger.error(f"Ошибка при группировке файлов из {src_directory}: {e}")
             update.message.reply_text(f"Ошибка при группировке файлов.")
@@ -1097,23 +1591,25 @@ def rm_group(update: Update, context: CallbackContext):
     if check_fuse(update) is ConversationHandler.END:
         return ConversationHandler.END
 
+    mount_point = session_mount(update)
+
     if re.search(r'/ungroup\s+(\S+)', update.message.text):
         update.message.reply_text("Ошибка: используйте /rmgroup без аргументов")
         return ConversationHandler.END
 
-    dest_path = os.path.join(config.MOUNT_POINT, 'grouped_mp3')
+    dest_path = os.path.join(mount_point, 'grouped_mp3')
 
     if os.path.exists(dest_path):
         try:
             shutil.rmtree(dest_path)
-            relative_path = os.path.relpath(dest_path, config.MOUNT_POINT)
+            relative_path = os.path.relpath(dest_path, mount_point)
             update.message.reply_text(f"Директория {relative_path} успешно удалена.")
-            save_metadata_to_storage(config.MOUNT_POINT, STORAGE_PATH, BACKUP_FILE)
+            metadata_changed(config.MOUNT_POINT, STORAGE_PATH, BACKUP_FILE)
         except Exception as e:
             logger.error(f"Ошибка при удалении директории {dest_path}: {e}")
             update.message.reply_text("Ошибка при удалении директории.")
     else:
-        relative_path = os.path.relpath(dest_path, config.MOUNT_POINT)
+        relative_path = os.path.relpath(dest_path, mount_point)
         update.message.reply_text(f"Ошибка: директория {relative_path} не существует.")
 
     return ConversationHandler.END
@@ -1124,6 +1620,8 @@ def custom_start_command(update, context):
     global custom_mount_point
     global custom_config_path
 
+    mount_point = session_mount(update)
+
     message_text = update.message.text
     bot_username = context.bot.username
     pattern = fr'@{bot_username}\s+/c_start\s+(?:"([^"]+)"|(\S+))\s+(?:"([^"]+)"|(\S+))'
@@ -1136,7 +1634,7 @@ def custom_start_command(update, context):
         mount = match.group(1) or match.group(2)
         config_in = match.group(3) or match.group(4)
 
-        config_path = os.path.join(config.MOUNT_POINT, config_in.lstrip('/'))
+        config_path = os.path.join(mount_point, config_in.lstrip('/'))
 
         if mount == config_path:
             update.message.reply_text(f"Ошибка: Точка монтирования {mount} и путь конфига {config} равны.")
@@ -1152,9 +1650,11 @@ def custom_start_command(update, context):
         custom_mount_point = mount
         custom_config_path = config_path
         custom_fuse_stopped = False
+        start_watcher(custom_mount_point, CUSTOM_STORAGE_PATH, CUSTOM_BACKUP_FILE,
+                      wait_for=partial(custom_check_mount, custom_mount_point))
+        recover_trash(custom_mount_point, wait_for=partial(custom_check_mount, custom_mount_point))
 
         update.message.reply_text('Готов принимать команды для работы с кастомной файловой системой.')
-        save_metadata_to_storage(custom_mount_point, CUSTOM_STORAGE_PATH, CUSTOM_BACKUP_FILE)
 
     return ConversationHandler.END
 
@@ -1172,11 +1672,11 @@ def custom_stop_command(update: Update, context: CallbackContext):
 
     update.message.reply_text('Останавливаю работу кастомной файловой системы...')
 
+    stop_watcher(custom_mount_point)
     custom_unmount_fs(custom_mount_point)
     custom_fuse_stopped = True
 
     logger.info("Fuse stopped")
-    save_metadata_to_storage(config.MOUNT_POINT, STORAGE_PATH, BACKUP_FILE)
     custom_mount_point = ''
     custom_config_path = ''
     return ConversationHandler.END
@@ -1195,7 +1695,7 @@ def custom_list_files(update, context):
             update.message.reply_text("Ошибка: используйте /c_ls")
             return ConversationHandler.END
 
-        if list_path_check(update, directory_path) is ConversationHandler.END:
+        if list_path_check(update, session_mount(update), directory_path) is ConversationHandler.END:
             return ConversationHandler.END
 
     commands = parse_directory_listing(custom_config_path)
@@ -1242,6 +1742,8 @@ def custom_list_files(update, context):
 
 
 def load_rules(yaml_file):
+    import yaml
+
     with open(yaml_file, 'r') as file:
         rules = yaml.safe_load(file)
     return rules
@@ -1378,9 +1880,7 @@ def custom_save_file(update, context):
             file_id = file_info.file_id
             chat_id = update.message.chat_id
             user_id = update.message.from_user.id
-            logger.info(f"Received file from chat_id: {chat_id}")
-            logger.info(f"Received file from user_id: {user_id}")
-            logger.info(f"File received: file_id={file_id}, filename={filename}")
+            logger.info(f"File received: file_id={file_id}, filename={filename}, chat_id={chat_id}, user_id={user_id}")
 
             save_dir = context.user_data.get('custom_save_dir', custom_mount_point)
             local_path = os.path.join(custom_mount_point, save_dir, filename)
@@ -1392,12 +1892,10 @@ def custom_save_file(update, context):
                     f"Файл с именем {filename} уже существует. Пожалуйста, отправьте файл с другим именем.")
                 return context.user_data['custom_save_context']
 
-            file = context.bot.get_file(file_id)
-            file.download(local_path)
-            logger.info(f"File downloaded to: {local_path}")
+            download_file(context.bot, file_id, local_path)
 
             update.message.reply_text(f"Файл {filename} загружен и сохранен на вашем сервере.")
-            save_metadata_to_storage(custom_mount_point, CUSTOM_STORAGE_PATH, CUSTOM_BACKUP_FILE)
+            metadata_changed(custom_mount_point, CUSTOM_STORAGE_PATH, CUSTOM_BACKUP_FILE)
             return ConversationHandler.END
         else:
             context.user_data['custom_attempt_count'] += 1
@@ -1406,7 +1904,7 @@ def custom_save_file(update, context):
                 return ConversationHandler.END
             else:
                 if context.user_data['custom_save_context'] == 'custom_waiting_for_file_mention':
-                    bot_username = context.user_data['bot_username']
+                    bot_username = bot_mention(context)
                     update.message.reply_text(f'Отправьте файл или введите /cancel_save{bot_username} для отмены.')
                 else:
                     update.message.reply_text('Отправьте файл или введите /cancel_save для отмены.')
@@ -1432,7 +1930,7 @@ def custom_get_document(update, context):
 
     absolute_path = os.path.join(custom_mount_point, relative_path)
 
-    if not os.path.exists(absolute_path) or not os.path.isfile(absolute_path):
+    if not os.path.isfile(absolute_path) or in_trash(absolute_path, custom_mount_point):
         update.message.reply_text(f"Ошибка: файл {relative_path} не найден.")
         return
 
@@ -1470,8 +1968,7 @@ def custom_get_document(update, context):
                         update.message.reply_text(f"Ошибка при чтении файла {relative_path}")
                         return ConversationHandler.END
 
-    with open(absolute_path, 'rb') as file:
-        update.message.reply_document(document=file)
+    send_document(update, CUSTOM_STORAGE_PATH, absolute_path)
 
 
 def set_mount_dir(update: Update, context: CallbackContext):
@@ -1491,7 +1988,8 @@ def set_mount_dir(update: Update, context: CallbackContext):
                 update.message.reply_text("Ошибка: неправильный формат команды. Используйте /cd <путь>.")
                 return ConversationHandler.END
 
-            full_path = os.path.join(config.MOUNT_POINT, new_mount_point)
+            session = get_session(update)
+            full_path = os.path.join(session.current(), new_mount_point)
 
             if not os.path.exists(full_path):
                 update.message.reply_text(f"Ошибка: Путь {full_path} не существует.")
@@ -1501,17 +1999,10 @@ def set_mount_dir(update: Update, context: CallbackContext):
                 update.message.reply_text(f"Ошибка: Путь {full_path} не является каталогом.")
                 return ConversationHandler.END
 
-            if full_path != config.MOUNT_POINT:
-                if config.IS_RESERVED:
-                    config.MOUNT_POINT = full_path
-                    update.message.reply_text(f"Новый путь для монтирования установлен: {full_path}")
-                    logger.info(f"Mount point changed to {full_path} by user {update.message.from_user.id}")
-                else:
-                    config.RESERVED_MOUNT_POINT = config.MOUNT_POINT
-                    config.MOUNT_POINT = full_path
-                    config.IS_RESERVED = True
-                    update.message.reply_text(f"Новый путь для монтирования установлен: {full_path}")
-                    logger.info(f"Mount point changed to {full_path} by user {update.message.from_user.id}")
+            if full_path != session.current():
+                session.change(full_path)
+                update.message.reply_text(f"Новый путь для монтирования установлен: {full_path}")
+                logger.info(f"Mount point changed to {full_path} by user {update.message.from_user.id}")
             else:
                 update.message.reply_text(f"Ошибка: Указанный путь не может быть установлен.")
                 logger.warning(
@@ -1538,22 +2029,13 @@ def revert_mount_dir(update: Update, context: CallbackContext):
         return ConversationHandler.END
 
     try:
-        if config.MOUNT_POINT == config.RESERVED_MOUNT_POINT or not config.RESERVED_MOUNT_POINT:
+        if get_session(update).reset() in (None, config.MOUNT_POINT):
             update.message.reply_text(f"Вы уже находитесь в текущем маунт поинте. Ваш текущий путь: {config.MOUNT_POINT}")
-            config.RESERVED_MOUNT_POINT = None
-            config.IS_RESERVED = False
             logger.info(f"User {update.message.from_user.id} attempted to revert mount point but is already there or no reserved mount point exists.")
             return ConversationHandler.END
 
-        if config.IS_RESERVED and config.RESERVED_MOUNT_POINT:
-            config.MOUNT_POINT = config.RESERVED_MOUNT_POINT
-            config.RESERVED_MOUNT_POINT = None
-            config.IS_RESERVED = False
-            update.message.reply_text(f"Путь для монтирования возвращен к: {config.MOUNT_POINT}")
-            logger.info(f"Mount point reverted to {config.MOUNT_POINT} by user {update.message.from_user.id}")
-        else:
-            update.message.reply_text("Ошибка: Нет резервного пути для восстановления.")
-            logger.warning("Attempt to revert mount point failed: either no reserved path or reserve flag is not set.")
+        update.message.reply_text(f"Путь для монтирования возвращен к: {config.MOUNT_POINT}")
+        logger.info(f"Mount point reverted to {config.MOUNT_POINT} by user {update.message.from_user.id}")
 
     except FileNotFoundError as e:
         update.message.reply_text(f"Ошибка: Путь не найден.")
@@ -1572,6 +2054,8 @@ def get_archive(update: Update, context: CallbackContext):
     if check_fuse(update) is ConversationHandler.END:
         return ConversationHandler.END
 
+    mount_point = session_mount(update)
+
     message_text = update.message.text
     match = re.search(r'/archget\s+(?:"([^"]+)"|(\S+))', message_text)
     if not match:
@@ -1585,7 +2069,7 @@ def get_archive(update: Update, context: CallbackContext):
 
     absolute_directory_path = os.path.abspath(directory_path)
 
-    if not os.path.exists(absolute_directory_path) or not os.path.isdir(absolute_directory_path):
+    if not os.path.isdir(absolute_directory_path) or in_trash(absolute_directory_path, mount_point):
         update.message.reply_text(f"Ошибка: директория {directory_path} не найдена.")
         return
 
@@ -1597,16 +2081,20 @@ def get_archive(update: Update, context: CallbackContext):
             counter += 1
         return unique_path
 
+    extracted = 0
     for root, dirs, files in os.walk(absolute_directory_path):
+        dirs[:] = [name for name in dirs if name != TRASH_DIR]
         for file in files:
             file_path = os.path.join(root, file)
             if file.endswith('.zip') or file.endswith('.tar'):
+                report_progress(f"распаковано архивов: {extracted}, текущий: {file}")
+                extracted += 1
                 file_path = os.path.join(root, file)
-                destination_path = os.path.join(config.MOUNT_POINT, file)
+                destination_path = os.path.join(mount_point, file)
                 unique_destination_path = get_unique_name(destination_path)
                 shutil.copy(file_path, unique_destination_path)
 
-                extract_dir = os.path.join(config.MOUNT_POINT, os.path.splitext(file)[0])
+                extract_dir = os.path.join(mount_point, os.path.splitext(file)[0])
                 unique_extract_dir = get_unique_name(extract_dir)
                 if file.endswith('.zip'):
                     unzip_file(unique_destination_path, unique_extract_dir)
@@ -1614,7 +2102,7 @@ def get_archive(update: Update, context: CallbackContext):
                     untar_file(unique_destination_path, unique_extract_dir)
 
     original_tree_structure = tree(absolute_directory_path)
-    extracted_tree_structure = tree(config.MOUNT_POINT)
+    extracted_tree_structure = tree(mount_point)
 
     response = f"Директория: {absolute_directory_path}\n"
     response += f"{original_tree_structure}\n\nРазархивированные файлы:\n\n"
@@ -1643,6 +2131,8 @@ def archive_file_deliter(update: Update, context: CallbackContext):
     if check_fuse(update) is ConversationHandler.END:
         return ConversationHandler.END
 
+    mount_point = session_mount(update)
+
     message_text = update.message.text
     match = re.search(r'/archdel\s+("([^"]+)"|(\S+))\s+("([^"]+)"|(\S+))', message_text)
     if not match:
@@ -1655,12 +2145,13 @@ def archive_file_deliter(update: Update, context: CallbackContext):
         update.message.reply_text("Ошибка: используйте /archdel <file_name> <archive_path>.")
         return
 
-    absolute_archive_path = os.path.abspath(os.path.join(config.MOUNT_POINT, archive_path))
+    absolute_archive_path = os.path.abspath(os.path.join(mount_point, archive_path))
     if not os.path.exists(absolute_archive_path) or not (absolute_archive_path.endswith('.zip') or absolute_archive_path.endswith('.tar')):
         update.message.reply_text(f"Ошибка: архив {archive_path} не найден или не является архивом.")
         return
 
     try:
+        report_progress(f"удаление {file_name} из архива")
         delete_file_from_archive(absolute_archive_path, file_name)
         update.message.reply_text(f"Файл {file_name} удален из архива.")
         logger.info(f"File {file_name} deleted from archive {absolute_archive_path} by user {update.message.from_user.id}")
@@ -0,0 +1,247 @@
+import errno
+import itertools
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from config import logger, TRASH_DIR, TRASH_UNDO_WINDOW, TRASH_REAP_BATCH, TRASH_REAP_INTERVAL
+from bot.dedup import forget_path, move_path
+from bot.listing import invalidate
+
+RECOVER_TIMEOUT = 120
+
+reaper = None
+reaper_lock = threading.Lock()
+trash_lock = threading.Lock()
+sequence = itertools.count(1)
+
+
+class TrashEntry:
+    def __init__(self, entry_id, original, source, path, owner, deleted_at=None):
+        self.entry_id = entry_id
+        self.original = original
+        self.source = source
+        self.path = path
+        self.owner = owner
+        self.deleted_at = time.time() if deleted_at is None else deleted_at
+        self.total = None
+        self.size = None
+        self.files = None
+        self.reaping = False
+
+
+class Reaper(threading.Thread):
+    def __init__(self, window=TRASH_UNDO_WINDOW, batch=TRASH_REAP_BATCH, interval=TRASH_REAP_INTERVAL):
+        super(Reaper, self).__init__(daemon=True)
+        self.window = window
+        self.batch = batch
+        self.interval = interval
+        self.entries = {}
+        self.condition = threading.Condition()
+        self.reaped = 0
+        self.reclaimed = 0
+
+    def add(self, entry):
+        with self.condition:
+            self.entries[entry.entry_id] = entry
+            self.condition.notify()
+
+    def take(self, owner, entry_id=None):
+        with self.condition:
+            candidates = [entry for entry in self.entries.values()
+                          if entry.owner == owner and not entry.reaping
+                          and (entry_id is None or entry.entry_id == entry_id)]
+            if not candidates:
+                return None
+            entry = max(candidates, key=lambda entry: entry.deleted_at)
+            del self.entries[entry.entry_id]
+            return entry
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.entries:
+                    self.condition.wait()
+                unmeasured = [entry for entry in self.entries.values() if entry.size is None]
+            for entry in unmeasured:
+                self.measure(entry)
+
+            with self.condition:
+                now = time.time()
+                due = [entry for entry in self.entries.values() if entry.deleted_at + self.window <= now]
+                if not due:
+                    if self.entries and all(entry.size is not None for entry in self.entries.values()):
+                        deadline = min(entry.deleted_at for entry in self.entries.values()) + self.window
+                        self.condition.wait(max(0.0, deadline - now))
+                    continue
+                entry = min(due, key=lambda entry: entry.deleted_at)
+                entry.reaping = True
+            try:
+                self.reap(entry)
+            except Exception as e:
+                logger.error(f"Error reaping {entry.path}: {e}")
+                with self.condition:
+                    self.entries.pop(entry.entry_id, None)
+
+    def measure(self, entry):
+        size = 0
+        files = 0
+        try:
+            if os.path.isdir(entry.path) and not os.path.islink(entry.path):
+                for root, dirs, names in os.walk(entry.path):
+                    for name in names:
+                        try:
+                            size += os.lstat(os.path.join(root, name)).st_size
+                        except OSError:
+                            pass
+                    files += len(names) + len(dirs)
+            else:
+                size = os.lstat(entry.path).st_size
+            files += 1
+        except OSError as e:
+            logger.error(f"Error measuring {entry.path} in trash: {e}")
+        entry.total = entry.size = size
+        entry.files = files
+
+    def reap(self, entry):
+        started = time.perf_counter()
+        removed = 0
+        try:
+            if os.path.isdir(entry.path) and not os.path.islink(entry.path):
+                for root, dirs, names in os.walk(entry.path, topdown=False):
+                    for name in names:
+                        path = os.path.join(root, name)
+                        size = os.lstat(path).st_size
+                        os.unlink(path)
+                        entry.size = max(0, entry.size - size)
+                        removed += 1
+                        self.throttle(removed)
+                    for name in dirs:
+                        path = os.path.join(root, name)
+                        if os.path.islink(path):
+                            os.unlink(path)
+                        else:
+                            os.rmdir(path)
+                        removed += 1
+                        self.throttle(removed)
+                os.rmdir(entry.path)
+            else:
+                os.unlink(entry.path)
+            removed += 1
+        except OSError as e:
+            logger.error(f"Error reaping {entry.path}, removing the rest at once: {e}")
+            shutil.rmtree(entry.path, ignore_errors=True)
+        forget_path(entry.path)
+
+        with self.condition:
+            self.entries.pop(entry.entry_id, None)
+            self.reaped += 1
+            self.reclaimed += entry.total or 0
+        logger.info(f"Reaped {entry.original} from trash: {removed} entries "
+                    f"in {time.perf_counter() - started:.3f}s")
+
+    def throttle(self, removed):
+        if self.interval > 0 and removed % self.batch == 0:
+            time.sleep(self.interval)
+
+    def stats(self, mount_point=None):
+        with self.condition:
+            entries = list(self.entries.values())
+            if mount_point is not None:
+                root = trash_root(mount_point) + os.sep
+                entries = [entry for entry in entries if entry.path.startswith(root)]
+            return {
+                'pending_entries': len(entries),
+                'pending_bytes': sum(entry.size or 0 for entry in entries),
+                'unmeasured_entries': sum(1 for entry in entries if entry.size is None),
+                'reaped': self.reaped,
+                'reclaimed_bytes': self.reclaimed,
+            }
+
+
+def trash_root(mount_point):
+    return os.path.join(mount_point, TRASH_DIR)
+
+
+def in_trash(full_path, mount_point):
+    relative_path = os.path.relpath(os.path.abspath(full_path), os.path.abspath(mount_point))
+    return relative_path.split(os.sep)[0] == TRASH_DIR
+
+
+def get_reaper():
+    global reaper
+    with reaper_lock:
+        if reaper is None:
+            reaper = Reaper()
+            reaper.start()
+        return reaper
+
+
+def recover(reaper, mount_point):
+    root = trash_root(mount_point)
+    with trash_lock:
+        try:
+            names = os.listdir(root)
+        except OSError:
+            return
+        with reaper.condition:
+            tracked = {entry.path for entry in reaper.entries.values()}
+        paths = [os.path.join(root, name) for name in names if os.path.join(root, name) not in tracked]
+        for path in paths:
+            reaper.add(TrashEntry(f"old-{path}", os.path.basename(path), None, path, None, deleted_at=0))
+    if paths:
+        logger.info(f"Found {len(paths)} entries left in {root}, reaping them")
+
+
+def recover_trash(mount_point, wait_for=None):
+    def run():
+        deadline = time.monotonic() + RECOVER_TIMEOUT
+        while not (os.path.isdir(mount_point) and (wait_for is None or wait_for())):
+            if time.monotonic() > deadline:
+                logger.warning(f"{mount_point} is not mounted, leftover trash is not recovered")
+                return
+            time.sleep(0.5)
+        recover(get_reaper(), mount_point)
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def move_to_trash(full_path, target_path, owner, mount_point):
+    reaper = get_reaper()
+    root = trash_root(mount_point)
+    os.makedirs(root, exist_ok=True)
+    entry_id = next(sequence)
+    path = os.path.join(root, f"{entry_id}-{uuid.uuid4().hex[:8]}-{os.path.basename(full_path)}")
+    with trash_lock:
+        os.rename(full_path, path)
+        entry = TrashEntry(entry_id, target_path, full_path, path, owner)
+        reaper.add(entry)
+    move_path(full_path, path)
+    invalidate(os.path.dirname(full_path))
+    return entry
+
+
+def restore_from_trash(owner, entry_id=None):
+    reaper = get_reaper()
+    with trash_lock:
+        entry = reaper.take(owner, entry_id)
+        if entry is None:
+            return None
+        try:
+            if os.path.lexists(entry.source):
+                raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), entry.source)
+            os.rename(entry.path, entry.source)
+        except OSError:
+            reaper.add(entry)
+            raise
+    move_path(entry.path, entry.source)
+    invalidate(os.path.dirname(entry.source))
+    return entry
+
+
+def trash_stats(mount_point=None):
+    if reaper is None:
+        return {'pending_entries': 0, 'pending_bytes': 0, 'unmeasured_entries': 0, 'reaped': 0, 'reclaimed_bytes': 0}
+    return reaper.stats(mount_point)
@@ -2,11 +2,18 @@ import os
 import logging
 from dotenv import load_dotenv
 
+from bot.log_queue import setup_logging
+
 load_dotenv()
 
-logging.basicConfig(
-    filename='logfile.log', format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO
-)
+LOG_FILE = os.getenv('LOG_FILE', 'logfile.log')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+LOG_DEBUG_SAMPLE = int(os.getenv('LOG_DEBUG_SAMPLE', '1'))
+
+setup_logging(LOG_FILE, LOG_FORMAT, LOG_LEVEL, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_DEBUG_SAMPLE)
 logger = logging.getLogger(__name__)
 
 TOKEN = os.getenv('TOKEN')
@@ -15,6 +22,45 @@ STORAGE_PATH = os.getenv('STORAGE_PATH')
 BACKUP_FILE = os.getenv('BACKUP_FILE')
 CUSTOM_STORAGE_PATH = os.getenv('CUSTOM_STORAGE_PATH')
 CUSTOM_BACKUP_FILE = os.getenv('CUSTOM_BACKUP_FILE')
-
-RESERVED_MOUNT_POINT = ""
-IS_RESERVED = False
\ No newline at end of file
+METADATA_FLUSH_INTERVAL = float(os.getenv('METADATA_FLUSH_INTERVAL', '5'))
+PERSIST_DEBOUNCE_WINDOW = float(os.getenv('PERSIST_DEBOUNCE_WINDOW', '2'))
+SCAN_WORKERS = int(os.getenv('SCAN_WORKERS', '1'))
+RESTORE_PREFETCH_COUNT = int(os.getenv('RESTORE_PREFETCH_COUNT', '100'))
+LS_PAGE_SIZE = int(os.getenv('LS_PAGE_SIZE', '50'))
+LISTING_CACHE_SIZE = int(os.getenv('LISTING_CACHE_SIZE', '10000'))
+OUTBOUND_CHAT_INTERVAL = float(os.getenv('OUTBOUND_CHAT_INTERVAL', '1'))
+OUTBOUND_GLOBAL_RATE = int(os.getenv('OUTBOUND_GLOBAL_RATE', '25'))
+OUTBOUND_DOCUMENT_THRESHOLD = int(os.getenv('OUTBOUND_DOCUMENT_THRESHOLD', '20000'))
+UPDATER_WORKERS = int(os.getenv('UPDATER_WORKERS', '8'))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_PROGRESS_INTERVAL = float(os.getenv('JOB_PROGRESS_INTERVAL', '3'))
+JOB_USER_CONCURRENCY = int(os.getenv('JOB_USER_CONCURRENCY', '1'))
+JOB_USER_QUEUE_LIMIT = int(os.getenv('JOB_USER_QUEUE_LIMIT', '5'))
+JOB_USER_WEIGHTS = os.getenv('JOB_USER_WEIGHTS', '')
+SAVE_DOWNLOAD_WORKERS = int(os.getenv('SAVE_DOWNLOAD_WORKERS', '4'))
+GET_ARCHIVE_THRESHOLD = int(os.getenv('GET_ARCHIVE_THRESHOLD', '50'))
+GETDIR_PART_SIZE = int(os.getenv('GETDIR_PART_SIZE', str(49 * 1024 * 1024)))
+GETDIR_COMPRESS_WORKERS = int(os.getenv('GETDIR_COMPRESS_WORKERS', str(os.cpu_count() or 1)))
+DOWNLOAD_CONCURRENCY = int(os.getenv('DOWNLOAD_CONCURRENCY', '4'))
+DOWNLOAD_CHUNK_SIZE = int(os.getenv('DOWNLOAD_CHUNK_SIZE', str(1024 * 1024)))
+DOWNLOAD_RETRIES = int(os.getenv('DOWNLOAD_RETRIES', '5'))
+DOWNLOAD_TIMEOUT = float(os.getenv('DOWNLOAD_TIMEOUT', '30'))
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '')
+SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT', '30'))
+BOT_API_BASE_URL = os.getenv('BOT_API_BASE_URL', '').rstrip('/')
+METRICS_FILE = os.getenv('METRICS_FILE', '')
+METRICS_INTERVAL = float(os.getenv('METRICS_INTERVAL', '15'))
+METRICS_LISTEN = os.getenv('METRICS_LISTEN', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+SLOW_COMMAND_THRESHOLD = float(os.getenv('SLOW_COMMAND_THRESHOLD', '2'))
+SLOW_COMMAND_LOG = os.getenv('SLOW_COMMAND_LOG', 'slow_commands.log')
+ADMIN_IDS = {int(user_id) for user_id in os.getenv('ADMIN_IDS', '').replace(',', ' ').split()}
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_COMMANDS = os.getenv('PROFILE_COMMANDS', '')
+TRASH_DIR = os.getenv('TRASH_DIR', '.fsbot_trash')
+TRASH_UNDO_WINDOW = float(os.getenv('TRASH_UNDO_WINDOW', '300'))
+TRASH_REAP_BATCH = int(os.getenv('TRASH_REAP_BATCH', '500'))
+TRASH_REAP_INTERVAL = float(os.getenv('TRASH_REAP_INTERVAL', '0.05'))
@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'bot')]
+
+workdir = tempfile.mkdtemp(prefix='fsbot-tests-')
+os.environ.update({
+    'TOKEN': '123456:test',
+    'MOUNT_POINT': os.path.join(workdir, 'mount'),
+    'STORAGE_PATH': os.path.join(workdir, 'storage.json'),
+    'BACKUP_FILE': os.path.join(workdir, 'backup.json'),
+    'CUSTOM_STORAGE_PATH': os.path.join(workdir, 'custom_storage.json'),
+    'CUSTOM_BACKUP_FILE': os.path.join(workdir, 'custom_backup.json'),
+    'LOG_FILE': os.path.join(workdir, 'test.log'),
+    'SLOW_COMMAND_LOG': '',
+    'METRICS_FILE': '',
+    'METRICS_PORT': '0',
+})
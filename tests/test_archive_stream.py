@@ -0,0 +1,67 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from config import TRASH_DIR
+from bot.archive_stream import PartWriter, directory_signature, write_archive, write_files_archive
+
+
+def test_files_archive_is_streamed_in_parts(tmp_path):
+    paths = []
+    for name in ('a.bin', 'sub/b.bin', 'sub/c.bin'):
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(name.encode() * 4000)
+        paths.append(str(path))
+    parts = []
+    chunks = []
+    progress = []
+
+    def send_part(number, data, last):
+        parts.append((number, len(data), last))
+        chunks.append(data)
+
+    output = PartWriter(16 * 1024, send_part)
+    write_files_archive(paths, str(tmp_path), output, lambda index, path: progress.append(index))
+    output.close()
+
+    assert len(parts) > 1
+    assert all(size == 16 * 1024 for _, size, _ in parts[:-1])
+    assert [last for _, _, last in parts] == [False] * (len(parts) - 1) + [True]
+    assert progress == [1, 2, 3]
+    with tarfile.open(fileobj=io.BytesIO(b''.join(chunks))) as tar:
+        assert tar.getnames() == ['a.bin', 'sub/b.bin', 'sub/c.bin']
+        assert tar.extractfile('sub/b.bin').read() == b'sub/b.bin' * 4000
+
+
+@pytest.mark.parametrize('archive_format', ['tar', 'gz', 'zip'])
+def test_directory_archive_skips_trash(tmp_path, archive_format):
+    directory = tmp_path / 'mount'
+    for name in ('a.txt', f"{TRASH_DIR}/old/b.txt", f"sub/{TRASH_DIR}/c.txt"):
+        (directory / name).parent.mkdir(parents=True, exist_ok=True)
+        (directory / name).write_text(name)
+    output = io.BytesIO()
+
+    write_archive(str(directory), archive_format, output, 2)
+
+    output.seek(0)
+    if archive_format == 'zip':
+        with zipfile.ZipFile(output) as archive:
+            names = archive.namelist()
+    else:
+        with tarfile.open(fileobj=output) as tar:
+            names = tar.getnames()
+    assert 'mount/a.txt' in names
+    assert not [name for name in names if TRASH_DIR in name.split('/')]
+
+
+def test_directory_signature_ignores_trash(tmp_path):
+    (tmp_path / 'a.txt').write_text('a')
+    (tmp_path / TRASH_DIR).mkdir()
+    signature = directory_signature(str(tmp_path))
+
+    (tmp_path / TRASH_DIR / 'deleted.txt').write_text('deleted')
+
+    assert directory_signature(str(tmp_path)) == signature
@@ -0,0 +1,136 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+
+import pytest
+
+from bot import downloads
+from bot.downloads import download_url
+
+CONTENT = bytes(range(256)) * 64
+
+
+class FlakyServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, failures):
+        super(FlakyServer, self).__init__(('127.0.0.1', 0), FlakyHandler)
+        self.failures = list(failures)
+        self.ranges = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/file.bin"
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.ranges.append(self.headers.get('Range'))
+        failure = self.server.failures.pop(0) if self.server.failures else None
+        if isinstance(failure, int):
+            self.send_error(failure)
+            return
+
+        offset = int(self.headers['Range'][len('bytes='):].rstrip('-')) if self.headers.get('Range') else 0
+        body = CONTENT[offset:]
+        self.send_response(206 if offset else 200)
+        if offset:
+            self.send_header('Content-Range', f"bytes {offset}-{len(CONTENT) - 1}/{len(CONTENT)}")
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if failure == 'cut':
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(*failures):
+        server = FlakyServer(failures)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def slots(monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(downloads, 'slots', slots)
+    monkeypatch.setattr(downloads, 'DOWNLOAD_CHUNK_SIZE', 1024)
+    monkeypatch.setattr(downloads, 'DOWNLOAD_RETRIES', 3)
+    return slots
+
+
+@pytest.fixture
+def sleeps(monkeypatch, slots):
+    sleeps = []
+
+    def backoff(retries):
+        free = slots.acquire(blocking=False)
+        if free:
+            slots.release()
+        sleeps.append(free)
+        return 0
+
+    monkeypatch.setattr(downloads, 'backoff', backoff)
+    return sleeps
+
+
+def test_interrupted_download_resumes_from_offset(serve, sleeps, tmp_path):
+    server = serve('cut', 'cut')
+    local_path = str(tmp_path / 'file.bin')
+
+    download_url(server.url, local_path, len(CONTENT))
+
+    assert open(local_path, 'rb').read() == CONTENT
+    first, second, third = server.ranges
+    assert first is None
+    assert second == f"bytes={len(CONTENT) // 2}-"
+    assert third == f"bytes={len(CONTENT) - len(CONTENT) // 4}-"
+    assert sleeps == [True, True]
+
+
+def test_server_errors_are_retried_without_holding_a_slot(serve, sleeps, tmp_path):
+    server = serve(503, 429, 'cut')
+    local_path = str(tmp_path / 'file.bin')
+
+    download_url(server.url, local_path, len(CONTENT))
+
+    assert open(local_path, 'rb').read() == CONTENT
+    assert server.ranges == [None, None, None, f"bytes={len(CONTENT) // 2}-"]
+    assert sleeps == [True, True, True]
+
+
+def test_client_errors_are_not_retried(serve, sleeps, tmp_path):
+    server = serve(404)
+    local_path = tmp_path / 'file.bin'
+
+    with pytest.raises(HTTPError):
+        download_url(server.url, str(local_path), len(CONTENT))
+
+    assert server.ranges == [None]
+    assert sleeps == []
+    assert not local_path.exists()
+    assert not (tmp_path / 'file.bin.part').exists()
+
+
+def test_gives_up_after_retries(serve, sleeps, tmp_path):
+    server = serve(503, 503, 503, 503, 503)
+
+    with pytest.raises(HTTPError):
+        download_url(server.url, str(tmp_path / 'file.bin'), len(CONTENT))
+
+    assert len(server.ranges) == 4
+    assert sleeps == [True, True, True]
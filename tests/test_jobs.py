@@ -0,0 +1,46 @@
+import time
+from types import SimpleNamespace
+
+from bot.jobs import JobManager, parse_weights
+
+
+def test_parse_weights():
+    assert parse_weights('1:2, 2:0.5,,3') == {1: 2.0, 2: 0.5}
+
+
+def test_parse_weights_rejects_non_positive():
+    assert parse_weights('1:0,2:-1,3:1.5') == {3: 1.5}
+
+
+def make_update(user_id):
+    message = SimpleNamespace(chat_id=user_id, from_user=SimpleNamespace(id=user_id), reply_text=lambda text: None)
+    return SimpleNamespace(message=message)
+
+
+def run_next(manager):
+    job = manager.next_job()
+    manager.running[job.user_id] -= 1
+    job.finished = time.time()
+    manager.forget_idle()
+    return job
+
+
+def test_idle_users_are_forgotten():
+    manager = JobManager(workers=0, weights={2: 0.5})
+    for user_id in (1, 1, 2):
+        manager.submit(make_update(user_id), None, 'job', None)
+
+    assert run_next(manager).user_id == 1
+    assert run_next(manager).user_id == 2
+    assert set(manager.queues) == {1} and set(manager.virtual_time) == {1, 2}
+
+    assert run_next(manager).user_id == 1
+    assert manager.queues == {} and manager.running == {} and manager.virtual_time == {}
+
+
+def test_cancelling_the_last_queued_job_forgets_the_user():
+    manager = JobManager(workers=0, weights={})
+    job = manager.submit(make_update(1), None, 'job', None)
+
+    assert manager.cancel(job.id, 1)
+    assert manager.queues == {} and manager.virtual_time == {}
@@ -0,0 +1,70 @@
+import os
+from collections import OrderedDict
+
+import pytest
+
+from config import TRASH_DIR
+from bot import listing
+from bot.listing import files_cursor, files_page, glob_files, scan_dir
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    monkeypatch.setattr(listing, 'cache', OrderedDict())
+    for path in ('docs/a.txt', 'docs/b.txt', 'docs/.hidden.txt', 'docs/notes.md', 'other/a.txt',
+                 f"{TRASH_DIR}/old.txt"):
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(path)
+    return str(tmp_path)
+
+
+def matches(tree, pattern):
+    return [os.path.relpath(path, tree) for path in glob_files(os.path.join(tree, pattern))]
+
+
+def test_glob_files_matches_like_glob(tree):
+    assert matches(tree, 'docs/*.txt') == ['docs/a.txt', 'docs/b.txt']
+    assert matches(tree, 'docs/.*') == ['docs/.hidden.txt']
+    assert matches(tree, '*/a.txt') == ['docs/a.txt', 'other/a.txt']
+    assert matches(tree, 'missing/*.txt') == []
+
+
+def test_glob_files_skips_trash(tree):
+    assert matches(tree, '*/old.txt') == []
+
+
+def test_glob_files_sees_new_files_at_once(tree):
+    assert matches(tree, 'docs/*.txt') == ['docs/a.txt', 'docs/b.txt']
+    with open(os.path.join(tree, 'docs', 'c.txt'), 'w') as f:
+        f.write('new')
+    os.utime(os.path.join(tree, 'docs'), ns=(0, 1))
+    assert matches(tree, 'docs/*.txt') == ['docs/a.txt', 'docs/b.txt', 'docs/c.txt']
+
+
+def all_pages(tree, cursor, visited, max_lines):
+    pages = []
+    while cursor is not None:
+        lines, cursor = files_page(tree, cursor, visited, max_lines, 4096)
+        pages.append((lines, cursor))
+    return pages
+
+
+def test_files_pages_resume_from_their_cursor(tree):
+    os.symlink(os.path.join(tree, 'docs'), os.path.join(tree, 'other', 'loop'))
+    pages = all_pages(tree, files_cursor(tree), {}, 2)
+    lines = [line for page, _ in pages for line in page]
+
+    assert lines == ['</docs> .hidden.txt', '</docs> a.txt', '</docs> b.txt', '</docs> notes.md', '</other> a.txt']
+    assert [len(page) for page, _ in pages] == [2, 2, 1]
+    assert pages[-1][1] is None
+
+    visited = {}
+    all_pages(tree, files_cursor(tree), visited, 2)
+    assert files_page(tree, pages[0][1], visited, 2, 4096) == pages[1]
+
+
+def test_scan_cache_keeps_the_most_recent_directories(tree, monkeypatch):
+    monkeypatch.setattr(listing, 'LISTING_CACHE_SIZE', 2)
+    for name in ('docs', 'other', 'docs', tree):
+        scan_dir(os.path.join(tree, name))
+    assert list(listing.cache) == [os.path.join(tree, 'docs'), tree]
@@ -0,0 +1,73 @@
+import pytest
+
+from bot import metadata_store
+from bot.collect_metadata import save_metadata_to_storage
+from bot.metadata_store import ContentStore
+
+llfuse = pytest.importorskip('llfuse')
+from memory_fs import MemoryFS  # noqa: E402
+
+FILES = {
+    'docs/a.txt': b'a' * 1024,
+    'docs/sub/b.txt': b'b' * 2048,
+    'other.txt': b'other',
+}
+
+
+@pytest.fixture
+def fs(tmp_path, monkeypatch):
+    source = tmp_path / 'source'
+    for path, content in FILES.items():
+        (source / path).parent.mkdir(parents=True, exist_ok=True)
+        (source / path).write_bytes(content)
+    storage_path, backup_path = str(tmp_path / 'storage.json'), str(tmp_path / 'backup.json')
+    save_metadata_to_storage(str(source), storage_path, backup_path)
+    monkeypatch.setattr(llfuse, 'fuse_decode_inode', lambda inode: inode, raising=False)
+
+    fs = MemoryFS(storage_path, backup_path)
+    fs.prefetch = lambda: None
+    fs.restore()
+    yield fs
+    metadata_store.stores.clear()
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    loads = []
+    get = ContentStore.get
+
+    def counting_get(self, path):
+        loads.append(path)
+        return get(self, path)
+
+    monkeypatch.setattr(ContentStore, 'get', counting_get)
+    return loads
+
+
+def test_rename_does_not_load_contents(fs, loads):
+    fs.rename('/', b'docs', '/', b'moved')
+
+    assert loads == []
+    assert '/docs/a.txt' not in fs.files
+    assert fs.load_content('/moved/a.txt') == FILES['docs/a.txt']
+    assert fs.load_content('/moved/sub/b.txt') == FILES['docs/sub/b.txt']
+    assert fs.aliases == {}
+
+
+def test_chained_renames_keep_the_stored_key(fs, loads):
+    fs.rename('/', b'docs', '/', b'first')
+    fs.rename('/first', b'sub', '/', b'second')
+
+    assert loads == []
+    assert fs.load_content('/second/b.txt') == FILES['docs/sub/b.txt']
+    assert loads == ['docs/sub/b.txt']
+
+
+def test_rename_over_file_and_unlink_drop_aliases(fs):
+    fs.rename('/', b'docs', '/', b'moved')
+    fs.rename('/moved', b'a.txt', '/', b'other.txt')
+    assert fs.load_content('/other.txt') == FILES['docs/a.txt']
+
+    fs.rename('/moved/sub', b'b.txt', '/', b'b.txt')
+    fs.unlink('/', b'b.txt')
+    assert '/b.txt' not in fs.aliases
@@ -0,0 +1,16 @@
+from bot import metrics
+from bot.metrics import register_gauges, render
+
+
+def test_monotonic_stats_are_rendered_as_counters(monkeypatch):
+    monkeypatch.setattr(metrics, 'gauges', {})
+    register_gauges('outbound', lambda: {'queue_depth': 2, 'sent': 10, 'send_latency_p50': None},
+                    counters=('sent',))
+
+    lines = render().splitlines()
+
+    assert '# TYPE fsbot_outbound_sent_total counter' in lines
+    assert 'fsbot_outbound_sent_total 10' in lines
+    assert '# TYPE fsbot_outbound_queue_depth gauge' in lines
+    assert 'fsbot_outbound_queue_depth 2' in lines
+    assert not [line for line in lines if 'send_latency_p50' in line or line.startswith('fsbot_outbound_sent ')]
@@ -0,0 +1,90 @@
+import threading
+import time
+
+from bot import outbound
+from bot.outbound import OutboundQueue, wait_for_chat
+
+
+class RecordingBot:
+    def __init__(self):
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def send_message(self, chat_id, text, **kwargs):
+        with self.lock:
+            self.sent.append((chat_id, text))
+
+
+def test_direct_reply_waits_for_queued_chunks(monkeypatch):
+    bot = RecordingBot()
+    queue = OutboundQueue(chat_interval=0.1, global_rate=100)
+    queue.start()
+    monkeypatch.setattr(outbound, 'outbound', queue)
+    for text in ('first', 'second', 'third'):
+        queue.put(dict(bot=bot, chat_id=1, reply_to=None, kind='text', text=text))
+
+    wait_for_chat(1)
+    bot.send_message(1, 'direct')
+
+    assert [text for _, text in bot.sent] == ['first', 'second', 'third', 'direct']
+
+
+def test_other_chats_are_not_delayed(monkeypatch):
+    bot = RecordingBot()
+    queue = OutboundQueue(chat_interval=10, global_rate=100)
+    monkeypatch.setattr(outbound, 'outbound', queue)
+    queue.put(dict(bot=bot, chat_id=1, reply_to=None, kind='text', text='queued'))
+
+    assert queue.wait_for_chat(2, timeout=0.1)
+    assert not queue.wait_for_chat(1, timeout=0.1)
+
+
+def test_dispatcher_thread_never_waits(monkeypatch):
+    queue = OutboundQueue(chat_interval=10, global_rate=100)
+    monkeypatch.setattr(outbound, 'outbound', queue)
+    queue.put(dict(bot=RecordingBot(), chat_id=1, reply_to=None, kind='text', text='queued'))
+    elapsed = []
+
+    def dispatch():
+        started = time.monotonic()
+        wait_for_chat(1, timeout=5)
+        elapsed.append(time.monotonic() - started)
+
+    thread = threading.Thread(target=dispatch, name='Bot:1:dispatcher')
+    thread.start()
+    thread.join(10)
+
+    assert elapsed and elapsed[0] < 1
+
+
+def test_reserve_keeps_chat_interval_and_queue_order(monkeypatch):
+    bot = RecordingBot()
+    queue = OutboundQueue(chat_interval=0.2, global_rate=100)
+    queue.start()
+    queue.put(dict(bot=bot, chat_id=1, reply_to=None, kind='text', text='queued'))
+
+    queue.reserve(1)
+    reserved = time.monotonic()
+    assert [text for _, text in bot.sent] == ['queued']
+    queue.reserve(1)
+    assert time.monotonic() - reserved >= 0.15
+
+    started = time.monotonic()
+    queue.reserve(2)
+    assert time.monotonic() - started < 0.1
+
+
+def test_idle_chats_are_forgotten():
+    bot = RecordingBot()
+    queue = OutboundQueue(chat_interval=0.05, global_rate=100)
+    queue.start()
+    for chat_id in range(10):
+        queue.put(dict(bot=bot, chat_id=chat_id, reply_to=None, kind='text', text='hello'))
+    assert queue.drain(5)
+    queue.reserve(100)
+    queue.defer(101, 0.01)
+    assert 100 in queue.next_allowed and 101 in queue.next_allowed
+
+    time.sleep(0.1)
+    queue.reserve(102)
+    assert list(queue.next_allowed) == [102]
@@ -0,0 +1,53 @@
+import os
+import shutil
+
+import pytest
+
+from bot import metadata_store
+from bot.collect_metadata import save_metadata_to_storage
+from bot.metadata_store import get_store, get_content_store
+
+FILES = {
+    'docs/kept.txt': b'kept',
+    'docs/removed.txt': b'removed',
+    'old/nested/file.bin': b'old',
+}
+
+
+@pytest.fixture
+def storage(tmp_path):
+    mount_point = tmp_path / 'mount'
+    for path, content in FILES.items():
+        (mount_point / path).parent.mkdir(parents=True, exist_ok=True)
+        (mount_point / path).write_bytes(content)
+    yield str(mount_point), str(tmp_path / 'storage.json'), str(tmp_path / 'backup.json')
+    metadata_store.stores.clear()
+
+
+def remove_and_restart(mount_point, storage_path, backup_path):
+    save_metadata_to_storage(mount_point, storage_path, backup_path)
+    os.remove(os.path.join(mount_point, 'docs', 'removed.txt'))
+    shutil.rmtree(os.path.join(mount_point, 'old'))
+    save_metadata_to_storage(mount_point, storage_path, backup_path)
+    metadata_store.stores.clear()
+
+
+def test_removed_files_stay_gone_after_restart(storage):
+    mount_point, storage_path, backup_path = storage
+    remove_and_restart(mount_point, storage_path, backup_path)
+
+    assert set(get_store(storage_path).all_files()) == {'docs', 'docs/kept.txt'}
+    assert get_content_store(backup_path).paths() == {'docs/kept.txt'}
+
+
+def test_memory_fs_restore_skips_removed_files(storage):
+    pytest.importorskip('llfuse')
+    from memory_fs import MemoryFS
+
+    mount_point, storage_path, backup_path = storage
+    remove_and_restart(mount_point, storage_path, backup_path)
+
+    fs = MemoryFS(storage_path, backup_path)
+    fs.restore()
+    assert set(fs.files) == {'/', '/docs', '/docs/kept.txt'}
+    assert fs.load_content('/docs/kept.txt') == b'kept'
@@ -0,0 +1,52 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from bot import metadata_store, outbound
+from bot.outbound import OutboundQueue
+from bot.sent_files import MEDIA_GROUP_SIZE, send_media_groups
+
+
+class Message:
+    def __init__(self, queue):
+        self.chat_id = 1
+        self.queue = queue
+        self.groups = []
+        self.lock = threading.Lock()
+
+    def reply_media_group(self, media):
+        with self.lock:
+            assert not self.queue.chats
+            self.groups.append([item.media.filename for item in media])
+            return [SimpleNamespace(document=SimpleNamespace(file_id=f"id{len(self.groups)}-{index}"))
+                    for index in range(len(media))]
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    queue = OutboundQueue(chat_interval=0.01, global_rate=1000)
+    queue.start()
+    monkeypatch.setattr(outbound, 'outbound', queue)
+    return queue
+
+
+def test_media_groups_go_out_in_order_through_the_rate_gate(queue, tmp_path):
+    paths = []
+    for index in range(MEDIA_GROUP_SIZE * 2 + 3):
+        path = tmp_path / f"file{index:02}.txt"
+        path.write_text(str(index))
+        paths.append(str(path))
+    message = Message(queue)
+    queue.put(dict(bot=SimpleNamespace(send_message=lambda *args, **kwargs: None), chat_id=1, reply_to=None,
+                   kind='text', text='before'))
+    progress = []
+
+    sent = send_media_groups(SimpleNamespace(message=message), str(tmp_path / 'storage.json'), paths,
+                             progress=progress.append)
+    metadata_store.stores.clear()
+
+    assert sent == len(paths)
+    assert progress == [10, 20, 23]
+    assert [len(group) for group in message.groups] == [10, 10, 3]
+    assert [group[0] for group in message.groups] == ['file00.txt', 'file10.txt', 'file20.txt']
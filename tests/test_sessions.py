@@ -0,0 +1,135 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import config
+from bot import sessions
+from bot.sessions import get_session, pinned_mount, serialized, session_mount
+
+
+def make_update(chat_id, user_id):
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id), effective_user=SimpleNamespace(id=user_id))
+
+
+@pytest.fixture(autouse=True)
+def clean_sessions(monkeypatch):
+    monkeypatch.setattr(sessions, 'sessions', {})
+    monkeypatch.setattr(sessions, 'pending', {})
+
+
+def run_in_threads(*targets):
+    errors = []
+
+    def run(target):
+        try:
+            target()
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(target,)) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    if errors:
+        raise errors[0]
+
+
+def test_chats_keep_their_own_mount():
+    first, second = make_update(1, 10), make_update(2, 10)
+    barrier = threading.Barrier(2, timeout=5)
+
+    def chat(update, mount_point):
+        for _ in range(200):
+            get_session(update).change(mount_point)
+            barrier.wait()
+            assert session_mount(update) == mount_point
+            barrier.wait()
+            assert get_session(update).reset() == mount_point
+            assert session_mount(update) == config.MOUNT_POINT
+            barrier.wait()
+
+    run_in_threads(lambda: chat(first, '/mnt/first'), lambda: chat(second, '/mnt/second'))
+    assert set(sessions.sessions) == {(1, 10), (2, 10)}
+
+
+def test_users_in_one_chat_have_separate_sessions():
+    first, second = make_update(1, 10), make_update(1, 20)
+    get_session(first).change('/mnt/custom')
+    assert session_mount(first) == '/mnt/custom'
+    assert session_mount(second) == config.MOUNT_POINT
+
+
+def test_pinned_mount_is_per_thread():
+    first, second = make_update(1, 10), make_update(2, 20)
+    get_session(second).change('/mnt/second')
+    barrier = threading.Barrier(2, timeout=5)
+
+    def pinned_chat():
+        with pinned_mount('/mnt/pinned'):
+            barrier.wait()
+            assert session_mount(first) == '/mnt/pinned'
+            barrier.wait()
+        assert session_mount(first) == config.MOUNT_POINT
+
+    def other_chat():
+        barrier.wait()
+        assert session_mount(second) == '/mnt/second'
+        get_session(second).change('/mnt/changed')
+        barrier.wait()
+        assert session_mount(second) == '/mnt/changed'
+
+    run_in_threads(pinned_chat, other_chat)
+    assert session_mount(first) == config.MOUNT_POINT
+
+
+def test_pinned_mount_restores_outer_pin():
+    update = make_update(1, 10)
+    with pinned_mount('/mnt/outer'):
+        with pinned_mount('/mnt/inner'):
+            assert session_mount(update) == '/mnt/inner'
+        assert session_mount(update) == '/mnt/outer'
+    assert session_mount(update) == config.MOUNT_POINT
+
+
+def test_serialized_runs_one_update_per_session_in_order():
+    first, second = make_update(1, 10), make_update(2, 20)
+    started = threading.Event()
+    release = threading.Event()
+    handled = []
+
+    @serialized
+    def handler(update, context):
+        if context == 'slow':
+            started.set()
+            assert release.wait(5)
+        handled.append((update.effective_chat.id, context))
+
+    slow = threading.Thread(target=handler, args=(first, 'slow'))
+    slow.start()
+    assert started.wait(5)
+    for index in range(3):
+        handler(first, index)
+    handler(second, 'other')
+    assert handled == [(2, 'other')]
+
+    release.set()
+    slow.join(5)
+    assert handled == [(2, 'other'), (1, 'slow'), (1, 0), (1, 1), (1, 2)]
+    assert sessions.pending == {}
+
+
+def test_serialized_keeps_going_after_an_error():
+    update = make_update(1, 10)
+    handled = []
+
+    @serialized
+    def handler(update, context):
+        handled.append(context)
+        raise ValueError(context)
+
+    handler(update, 'first')
+    handler(update, 'second')
+    assert handled == ['first', 'second']
+    assert sessions.pending == {}
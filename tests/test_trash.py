@@ -0,0 +1,78 @@
+import os
+import time
+
+import pytest
+
+from config import TRASH_DIR
+from bot import trash
+from bot.trash import Reaper, in_trash, move_to_trash, recover, recover_trash, restore_from_trash, trash_stats
+
+
+@pytest.fixture
+def reaper(monkeypatch):
+    reaper = Reaper(window=3600)
+    monkeypatch.setattr(trash, 'reaper', reaper)
+    return reaper
+
+
+@pytest.fixture
+def mounts(tmp_path):
+    mounts = []
+    for name in ('main', 'custom'):
+        mount_point = tmp_path / name
+        (mount_point / 'docs').mkdir(parents=True)
+        (mount_point / 'docs' / 'file.txt').write_bytes(b'content')
+        mounts.append(str(mount_point))
+    return mounts
+
+
+def test_each_mount_gets_its_own_trash(reaper, mounts):
+    for mount_point in mounts:
+        full_path = os.path.join(mount_point, 'docs')
+        entry = move_to_trash(full_path, 'docs', (1, 1), mount_point)
+
+        assert os.path.dirname(entry.path) == os.path.join(mount_point, TRASH_DIR)
+        assert in_trash(entry.path, mount_point)
+        assert not os.path.exists(full_path)
+
+    assert len(reaper.entries) == 2
+    restored = restore_from_trash((1, 1))
+    assert os.path.isfile(os.path.join(restored.source, 'file.txt'))
+
+
+def test_recover_picks_up_leftovers_once(reaper, mounts):
+    mount_point = mounts[0]
+    move_to_trash(os.path.join(mount_point, 'docs'), 'docs', (1, 1), mount_point)
+    leftover = os.path.join(mount_point, TRASH_DIR, 'left-over')
+    os.mkdir(leftover)
+
+    recover(reaper, mount_point)
+    recover(reaper, mount_point)
+
+    paths = sorted(entry.path for entry in reaper.entries.values())
+    assert len(paths) == 2 and leftover in paths
+    assert [entry.owner for entry in reaper.entries.values() if entry.path == leftover] == [None]
+
+
+def test_leftovers_show_up_in_stats_before_any_removal(monkeypatch, mounts):
+    monkeypatch.setattr(trash, 'reaper', None)
+    monkeypatch.setattr(Reaper, 'start', lambda self: None)
+    mount_point = mounts[1]
+    os.makedirs(os.path.join(mount_point, TRASH_DIR, 'old'))
+
+    recover_trash(mount_point)
+
+    deadline = time.monotonic() + 5
+    while trash_stats()['pending_entries'] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert trash_stats()['pending_entries'] == 1
+
+
+def test_stats_can_be_limited_to_one_mount(reaper, mounts):
+    for mount_point in mounts:
+        move_to_trash(os.path.join(mount_point, 'docs'), 'docs', (1, 1), mount_point)
+
+    assert trash_stats()['pending_entries'] == 2
+    for mount_point in mounts:
+        assert trash_stats(mount_point)['pending_entries'] == 1
+    assert trash_stats(os.path.join(mounts[0], 'docs'))['pending_entries'] == 0